@@ -0,0 +1,9 @@
+"""Offline benchmarks for src.llm_client.
+
+The benchmarks run the adapters against StubServer, a local imitation of
+the OpenAI chat-completions and Anthropic messages endpoints, so the
+library's own overhead and throughput can be measured without network
+variance or API credits:
+
+    python -m benchmarks.run --quick
+"""
@@ -0,0 +1,119 @@
+"""Measure how long it takes to import src.llm_client and build a client.
+
+Short-lived workers and CLI commands pay the import cost on every start.
+The provider SDKs are imported lazily, so importing src.llm_client should
+load neither openai nor anthropic; the SDK cost moves to the first
+get_client() call and only for the provider in use.
+
+Each measurement runs in a fresh interpreter. The script exits with status
+1 if importing src.llm_client loads a provider SDK or takes longer than
+--max-import-ms (median), so it can guard the improvement in CI:
+
+    python -m benchmarks.import_time
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.report import DEFAULT_OUTPUT, append_run
+from src.stream_metrics import percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SDK_MODULES = ("openai", "anthropic", "httpx", "dotenv")
+
+# Timed in a child process; prints a JSON line with the measurements
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import src.llm_client as llm_client
+imported = time.perf_counter()
+if {build_client}:
+    llm_client.get_client("{provider}")
+finished = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - started,
+    "first_client_s": finished - imported,
+    "loaded": [name for name in {modules!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(provider, build_client, runs):
+    """Run the probe in fresh interpreters and return the parsed results."""
+    code = _PROBE.format(
+        build_client=build_client, provider=provider, modules=SDK_MODULES
+    )
+    # A dummy key is enough: creating a client sends no request
+    env = {
+        **os.environ,
+        "LLM_PROVIDER": provider,
+        f"{provider.upper()}_API_KEY": "import-benchmark",
+    }
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=ROOT,
+            env=env,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return samples
+
+
+def summarize(name, provider, samples):
+    """Reduce probe samples to medians in milliseconds."""
+    imports = [sample["import_s"] * 1e3 for sample in samples]
+    clients = [sample["first_client_s"] * 1e3 for sample in samples]
+    return {
+        "benchmark": "import_time",
+        "case": name,
+        "provider": provider,
+        "runs": len(samples),
+        "import_ms_p50": percentile(imports, 50),
+        "import_ms_min": min(imports),
+        "first_client_ms_p50": percentile(clients, 50),
+        "loaded_modules": samples[-1]["loaded"],
+    }
+
+
+def main():
+    """Measure import and first-client cost; fail if the import regressed."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    results = [summarize("import", "openai", measure("openai", False, args.runs))]
+    for provider in ("openai", "anthropic"):
+        samples = measure(provider, True, args.runs)
+        results.append(summarize("import_and_get_client", provider, samples))
+    append_run(results, args.output, suite="import_time")
+
+    bare_import = results[0]
+    problems = []
+    if set(bare_import["loaded_modules"]) & {"openai", "anthropic"}:
+        problems.append(
+            "importing src.llm_client loaded "
+            + ", ".join(bare_import["loaded_modules"])
+        )
+    if bare_import["import_ms_p50"] > args.max_import_ms:
+        problems.append(
+            f"import took {bare_import['import_ms_p50']:.0f} ms "
+            f"(limit {args.max_import_ms:.0f} ms)"
+        )
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Machine-readable benchmark output shared by the benchmark scripts.
+
+Every run appends one JSON line with the git commit, Python and package
+versions and the list of measurements, so results from different versions
+of the library can be compared side by side.
+"""
+
+import json
+import platform
+import subprocess
+import sys
+from datetime import UTC, datetime
+from importlib import metadata
+from pathlib import Path
+
+DEFAULT_OUTPUT = Path(__file__).parent / "results.jsonl"
+
+PACKAGES = ("llm-basics", "openai", "anthropic", "httpx")
+
+
+def _git_commit():
+    """Return the current git commit, or None outside a checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _version(package):
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def append_run(results, output=DEFAULT_OUTPUT, **fields):
+    """Append one run to a JSON Lines file and echo the results.
+
+    Args:
+        results: List of measurement dicts
+        output: JSON Lines file to append to
+        **fields: Extra run-level fields (e.g. suite="import_time")
+
+    """
+    run = {
+        "timestamp": datetime.now(UTC).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": {package: _version(package) for package in PACKAGES},
+        **fields,
+        "results": results,
+    }
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("a", encoding="utf-8") as file:
+        file.write(json.dumps(run) + "\n")
+
+    for result in results:
+        print(json.dumps(result))
+    print(f"\nResults appended to {output}", file=sys.stderr)
@@ -0,0 +1,328 @@
+"""Benchmark the llm_client adapters against the local stub server.
+
+Measures, for each provider:
+
+- adapter overhead: time per call of the adapters compared with a bare
+  httpx POST of the same request to the same stub,
+- throughput: requests/sec at several concurrency levels, with threads
+  (create_completion) and asyncio (acreate_completion),
+- streaming: how fast create_streaming_completion consumes an unthrottled
+  stream, and time-to-first-token against a paced one,
+- resilience: throughput and success rate with injected server errors and
+  a RetryPolicy.
+
+Each run appends one JSON line to the output file (benchmarks/results.jsonl
+by default) with the git commit, package versions and all measurements, so
+runs from different versions can be compared. The stub shares this
+process, so absolute numbers are a lower bound; compare runs made on the
+same machine:
+
+    python -m benchmarks.run            # full suite
+    python -m benchmarks.run --quick    # fewer requests, for a smoke check
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+from anthropic import Anthropic, AsyncAnthropic
+from openai import AsyncOpenAI, OpenAI
+
+from benchmarks.report import DEFAULT_OUTPUT, append_run
+from benchmarks.stub_server import StubServer
+from src.llm_client import (
+    acreate_completion,
+    create_completion,
+    create_completion_with_tools,
+    create_streaming_completion,
+    extract_tool_calls,
+)
+from src.retry import RetryPolicy
+from src.stream_metrics import percentile
+
+PROVIDERS = ("openai", "anthropic")
+MODEL = "stub-model"
+MESSAGES = [
+    {"role": "system", "content": "You are a concise assistant."},
+    {"role": "user", "content": "Summarize the evidence on cash transfers."},
+]
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_studies",
+            "description": "Search the evidence database",
+            "parameters": {
+                "type": "object",
+                "properties": {"query": {"type": "string"}},
+                "required": ["query"],
+            },
+        },
+    }
+]
+
+
+def make_client(server, provider, max_connections=100, use_async=False):
+    """Build an SDK client pointed at the stub (SDK retries disabled)."""
+    limits = httpx.Limits(
+        max_connections=max_connections, max_keepalive_connections=max_connections
+    )
+    http_client = (httpx.AsyncClient if use_async else httpx.Client)(limits=limits)
+    if provider == "openai":
+        cls = AsyncOpenAI if use_async else OpenAI
+        base_url = server.openai_base_url
+    else:
+        cls = AsyncAnthropic if use_async else Anthropic
+        base_url = server.anthropic_base_url
+    return cls(
+        api_key="benchmark",
+        base_url=base_url,
+        max_retries=0,
+        http_client=http_client,
+    )
+
+
+def _latency_stats(samples):
+    """Summarize per-call durations (seconds) in microseconds."""
+    return {
+        "calls": len(samples),
+        "mean_us": sum(samples) / len(samples) * 1e6,
+        "p50_us": percentile(samples, 50) * 1e6,
+        "p95_us": percentile(samples, 95) * 1e6,
+    }
+
+
+def _time_calls(fn, count):
+    """Call fn count times (after a short warm-up) and return durations."""
+    for _ in range(min(10, count)):
+        fn()
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_overhead(server, provider, count):
+    """Compare adapter calls with raw HTTP requests to the stub."""
+    client = make_client(server, provider)
+    if provider == "openai":
+        url = f"{server.openai_base_url}/chat/completions"
+        body = {"model": MODEL, "messages": MESSAGES}
+    else:
+        url = f"{server.url}/v1/messages"
+        body = {
+            "model": MODEL,
+            "system": MESSAGES[0]["content"],
+            "messages": MESSAGES[1:],
+            "max_tokens": 4096,
+        }
+
+    with httpx.Client() as raw:
+        baseline = _latency_stats(
+            _time_calls(lambda: raw.post(url, json=body).json(), count)
+        )
+    completion = _latency_stats(
+        _time_calls(lambda: create_completion(client, provider, MODEL, MESSAGES), count)
+    )
+    tools = _latency_stats(
+        _time_calls(
+            lambda: extract_tool_calls(
+                create_completion_with_tools(client, provider, MODEL, MESSAGES, TOOLS),
+                provider,
+            ),
+            count,
+        )
+    )
+    client.close()
+    return [
+        {"benchmark": "overhead", "provider": provider, "call": name, **stats}
+        | {"overhead_p50_us": stats["p50_us"] - baseline["p50_us"]}
+        for name, stats in (
+            ("raw_httpx", baseline),
+            ("create_completion", completion),
+            ("create_completion_with_tools", tools),
+        )
+    ]
+
+
+def bench_threaded_throughput(server, provider, concurrency, count):
+    """Requests/sec of create_completion from a thread pool."""
+    client = make_client(server, provider, max_connections=concurrency)
+    samples = []
+
+    def call():
+        started = time.perf_counter()
+        create_completion(client, provider, MODEL, MESSAGES)
+        samples.append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda _: call(), range(concurrency)))  # warm-up
+        samples.clear()
+        started = time.perf_counter()
+        list(executor.map(lambda _: call(), range(count)))
+        elapsed = time.perf_counter() - started
+    client.close()
+    return {
+        "benchmark": "throughput",
+        "mode": "threads",
+        "provider": provider,
+        "concurrency": concurrency,
+        "server_latency_s": server.latency,
+        "requests_per_second": count / elapsed,
+        **_latency_stats(samples),
+    }
+
+
+async def _async_throughput(server, provider, concurrency, count):
+    client = make_client(server, provider, max_connections=concurrency, use_async=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def call():
+        async with semaphore:
+            started = time.perf_counter()
+            await acreate_completion(client, provider, MODEL, MESSAGES)
+            samples.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(call() for _ in range(concurrency)))  # warm-up
+    samples.clear()
+    started = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(count)))
+    elapsed = time.perf_counter() - started
+    await client.close()
+    return elapsed, samples
+
+
+def bench_async_throughput(server, provider, concurrency, count):
+    """Requests/sec of acreate_completion on one event loop."""
+    elapsed, samples = asyncio.run(
+        _async_throughput(server, provider, concurrency, count)
+    )
+    return {
+        "benchmark": "throughput",
+        "mode": "asyncio",
+        "provider": provider,
+        "concurrency": concurrency,
+        "server_latency_s": server.latency,
+        "requests_per_second": count / elapsed,
+        **_latency_stats(samples),
+    }
+
+
+def bench_streaming(server, provider, count):
+    """Time-to-first-token and token rate of create_streaming_completion."""
+    client = make_client(server, provider)
+    ttfts, rates = [], []
+    for _ in range(count):
+        started = time.perf_counter()
+        first = None
+        chunks = 0
+        for _chunk in create_streaming_completion(client, provider, MODEL, MESSAGES):
+            if first is None:
+                first = time.perf_counter()
+            chunks += 1
+        finished = time.perf_counter()
+        ttfts.append(first - started)
+        if finished > first:
+            rates.append((chunks - 1) / (finished - first))
+    client.close()
+    return {
+        "benchmark": "streaming",
+        "provider": provider,
+        "streams": count,
+        "server_tokens_per_second": server.tokens_per_second,
+        "output_tokens": server.output_tokens,
+        "ttft_p50_ms": percentile(ttfts, 50) * 1e3,
+        "ttft_p95_ms": percentile(ttfts, 95) * 1e3,
+        "tokens_per_second_p50": percentile(rates, 50),
+    }
+
+
+def bench_errors(server, provider, concurrency, count):
+    """Throughput and success rate with injected errors and retries."""
+    client = make_client(server, provider, max_connections=concurrency)
+    retry = RetryPolicy(
+        max_attempts=5, base_delay=0.01, max_delay=0.1, use_circuit_breaker=False
+    )
+
+    def call(_):
+        try:
+            create_completion(client, provider, MODEL, MESSAGES, retry=retry)
+            return True
+        except Exception:
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        succeeded = sum(executor.map(call, range(count)))
+    elapsed = time.perf_counter() - started
+    client.close()
+    return {
+        "benchmark": "errors",
+        "provider": provider,
+        "concurrency": concurrency,
+        "error_rate": server.error_rate,
+        "requests_per_second": count / elapsed,
+        "success_rate": succeeded / count,
+        "retries": retry.stats["retries"],
+    }
+
+
+def run_suite(providers=PROVIDERS, quick=False):
+    """Run every benchmark and return the list of measurements."""
+    scale = 0.2 if quick else 1
+    calls = max(20, int(500 * scale))
+    levels = (1, 8, 32) if quick else (1, 4, 16, 64, 128)
+    results = []
+
+    for provider in providers:
+        print(f"[{provider}] adapter overhead", file=sys.stderr)
+        with StubServer() as server:
+            results.extend(bench_overhead(server, provider, calls))
+
+        print(f"[{provider}] throughput", file=sys.stderr)
+        with StubServer(latency=0.05) as server:
+            for concurrency in levels:
+                count = max(concurrency * 4, int(200 * scale))
+                results.append(
+                    bench_threaded_throughput(server, provider, concurrency, count)
+                )
+                results.append(
+                    bench_async_throughput(server, provider, concurrency, count)
+                )
+
+        print(f"[{provider}] streaming", file=sys.stderr)
+        with StubServer(output_tokens=1000) as server:
+            results.append(bench_streaming(server, provider, max(5, int(50 * scale))))
+        with StubServer(latency=0.1, tokens_per_second=200) as server:
+            results.append(bench_streaming(server, provider, max(3, int(10 * scale))))
+
+        print(f"[{provider}] error injection", file=sys.stderr)
+        with StubServer(latency=0.01, error_rate=0.2, seed=0) as server:
+            results.append(bench_errors(server, provider, 16, calls))
+
+    return results
+
+
+def main():
+    """Run the suite and append the results to a JSON Lines file."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="fewer requests")
+    parser.add_argument(
+        "--provider", choices=PROVIDERS, action="append", help="default: both"
+    )
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    results = run_suite(args.provider or PROVIDERS, quick=args.quick)
+    append_run(results, args.output, suite="adapters", quick=args.quick)
+
+
+if __name__ == "__main__":
+    main()
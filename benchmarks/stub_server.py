@@ -0,0 +1,412 @@
+"""In-process HTTP stub of the OpenAI and Anthropic chat endpoints.
+
+StubServer answers POST /v1/chat/completions (OpenAI) and POST /v1/messages
+(Anthropic), with or without SSE streaming, in the shapes the official SDKs
+expect. Responses are synthetic: the reply is a run of filler words, one
+per output token, and requests carrying tools get a tool call to the first
+tool. Server behavior is configurable:
+
+- latency: seconds before the response starts (time to first token),
+- tokens_per_second: pace of streamed tokens (None streams them at once),
+- error_rate / error_status: fraction of requests that fail, and how.
+
+    with StubServer(latency=0.05, tokens_per_second=200) as server:
+        client = OpenAI(api_key="stub", base_url=server.openai_base_url)
+        create_completion(client, "openai", "stub-model", messages)
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.rate_limit import estimate_request_tokens
+
+FILLER_WORDS = [
+    "the",
+    "quick",
+    "brown",
+    "fox",
+    "jumps",
+    "over",
+    "the",
+    "lazy",
+    "dog",
+    "while",
+    "randomized",
+    "trials",
+    "measure",
+    "what",
+    "works",
+    "in",
+    "development",
+    "economics",
+]
+
+
+def _filler_tokens(count):
+    """Return count filler words, each standing in for one output token."""
+    return [
+        ("" if index == 0 else " ") + FILLER_WORDS[index % len(FILLER_WORDS)]
+        for index in range(count)
+    ]
+
+
+class StubServer:
+    """Threaded local server imitating the provider chat endpoints.
+
+    Thread-safe; request counters are available as ``requests`` and
+    ``errors`` while the server runs.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        tokens_per_second=None,
+        output_tokens=32,
+        error_rate=0.0,
+        error_status=500,
+        seed=None,
+        host="127.0.0.1",
+        port=0,
+    ):
+        """Configure the stub (call start() or use it as a context manager).
+
+        Args:
+            latency: Seconds to wait before sending any response
+            tokens_per_second: Streaming pace; None sends all tokens at once
+            output_tokens: Tokens per reply (a request's max_tokens caps it)
+            error_rate: Fraction of requests answered with error_status
+            error_status: HTTP status for injected errors (429 and 529 also
+                          send a retry-after header)
+            seed: Random seed for reproducible error injection
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _make_handler(self))
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL of the server, e.g. http://127.0.0.1:50123."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_base_url(self):
+        """base_url to pass to OpenAI()/AsyncOpenAI()."""
+        return f"{self.url}/v1"
+
+    @property
+    def anthropic_base_url(self):
+        """base_url to pass to Anthropic()/AsyncAnthropic()."""
+        return self.url
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="stub-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _next_request_fails(self):
+        """Count a request and decide whether to inject an error."""
+        with self._lock:
+            self.requests += 1
+            fails = self.error_rate > 0 and self._random.random() < self.error_rate
+            if fails:
+                self.errors += 1
+            return fails
+
+
+class _Server(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under concurrent load
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled connections is normal, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _make_handler(stub):
+    """Build a request handler class bound to a StubServer."""
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep connections alive so pooled clients behave as against the API
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; Nagle would delay the body
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_HEAD(self):
+            # Used by warm_client() to open connections
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            if self.path.endswith("/chat/completions"):
+                provider = "openai"
+            elif self.path.endswith("/messages"):
+                provider = "anthropic"
+            else:
+                self._send_json(404, {"error": {"message": "Not found"}})
+                return
+
+            if stub.latency:
+                time.sleep(stub.latency)
+            if stub._next_request_fails():
+                self._send_error(provider)
+                return
+
+            reply = _Reply(stub, provider, body)
+            if body.get("stream"):
+                self._send_stream(reply.events())
+            else:
+                self._send_json(200, reply.message())
+
+        def _send_json(self, status, payload, headers=None):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("x-request-id", f"req_stub_{stub.requests}")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_error(self, provider):
+            status = stub.error_status
+            headers = {"retry-after": "0"} if status in (429, 529) else None
+            if provider == "openai":
+                payload = {
+                    "error": {
+                        "message": "Injected error",
+                        "type": "server_error",
+                        "code": None,
+                    }
+                }
+            else:
+                payload = {
+                    "type": "error",
+                    "error": {"type": "api_error", "message": "Injected error"},
+                }
+            self._send_json(status, payload, headers)
+
+        def _send_stream(self, events):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("x-request-id", f"req_stub_{stub.requests}")
+            self.end_headers()
+            for delay, event in events:
+                if delay:
+                    time.sleep(delay)
+                data = event.encode()
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+class _Reply:
+    """Synthetic reply to one request, in either provider's format."""
+
+    def __init__(self, stub, provider, body):
+        self.stub = stub
+        self.provider = provider
+        self.model = body.get("model", "stub-model")
+        self.input_tokens = estimate_request_tokens({**body, "max_tokens": 0})
+        limit = body.get("max_tokens") or body.get("max_completion_tokens")
+        count = stub.output_tokens if limit is None else min(stub.output_tokens, limit)
+        self.tokens = _filler_tokens(count)
+        self.truncated = limit is not None and limit < stub.output_tokens
+        self.tool = (body.get("tools") or [None])[0]
+        self.include_usage = bool(
+            (body.get("stream_options") or {}).get("include_usage")
+        )
+
+    @property
+    def tool_name(self):
+        """Name of the tool to call, in either provider's tool format."""
+        if "function" in self.tool:
+            return self.tool["function"]["name"]
+        return self.tool["name"]
+
+    def message(self):
+        """Return the complete (non-streamed) response body."""
+        text = "".join(self.tokens)
+        if self.provider == "openai":
+            message = {"role": "assistant", "content": None if self.tool else text}
+            finish_reason = "length" if self.truncated else "stop"
+            if self.tool:
+                message["tool_calls"] = [
+                    {
+                        "id": "call_stub",
+                        "type": "function",
+                        "function": {"name": self.tool_name, "arguments": "{}"},
+                    }
+                ]
+                finish_reason = "tool_calls"
+            return {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": self.model,
+                "choices": [
+                    {"index": 0, "message": message, "finish_reason": finish_reason}
+                ],
+                "usage": self._openai_usage(),
+            }
+
+        content = [{"type": "text", "text": text}]
+        stop_reason = "max_tokens" if self.truncated else "end_turn"
+        if self.tool:
+            content = [
+                {
+                    "type": "tool_use",
+                    "id": "toolu_stub",
+                    "name": self.tool_name,
+                    "input": {},
+                }
+            ]
+            stop_reason = "tool_use"
+        return {
+            "id": "msg_stub",
+            "type": "message",
+            "role": "assistant",
+            "model": self.model,
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": self._anthropic_usage(len(self.tokens)),
+        }
+
+    def events(self):
+        """Yield (delay, SSE event text) pairs for a streamed response."""
+        pace = self.stub.tokens_per_second
+        delay = 1 / pace if pace else 0
+        if self.provider == "openai":
+            yield 0, self._openai_chunk({"role": "assistant", "content": ""})
+            for token in self.tokens:
+                yield delay, self._openai_chunk({"content": token})
+            finish_reason = "length" if self.truncated else "stop"
+            yield 0, self._openai_chunk({}, finish_reason)
+            if self.include_usage:
+                yield 0, _sse(None, self._openai_chunk_body([], self._openai_usage()))
+            yield 0, "data: [DONE]\n\n"
+            return
+
+        start = {**self.message(), "content": [], "stop_reason": None}
+        start["usage"] = self._anthropic_usage(1)
+        yield 0, _sse("message_start", {"type": "message_start", "message": start})
+        yield (
+            0,
+            _sse(
+                "content_block_start",
+                {
+                    "type": "content_block_start",
+                    "index": 0,
+                    "content_block": {"type": "text", "text": ""},
+                },
+            ),
+        )
+        for token in self.tokens:
+            yield (
+                delay,
+                _sse(
+                    "content_block_delta",
+                    {
+                        "type": "content_block_delta",
+                        "index": 0,
+                        "delta": {"type": "text_delta", "text": token},
+                    },
+                ),
+            )
+        yield 0, _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+        yield (
+            0,
+            _sse(
+                "message_delta",
+                {
+                    "type": "message_delta",
+                    "delta": {
+                        "stop_reason": "max_tokens" if self.truncated else "end_turn",
+                        "stop_sequence": None,
+                    },
+                    "usage": {"output_tokens": len(self.tokens)},
+                },
+            ),
+        )
+        yield 0, _sse("message_stop", {"type": "message_stop"})
+
+    def _openai_usage(self):
+        return {
+            "prompt_tokens": self.input_tokens,
+            "completion_tokens": len(self.tokens),
+            "total_tokens": self.input_tokens + len(self.tokens),
+        }
+
+    def _anthropic_usage(self, output_tokens):
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": output_tokens,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+        }
+
+    def _openai_chunk_body(self, choices, usage=None):
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": self.model,
+            "choices": choices,
+            "usage": usage,
+        }
+
+    def _openai_chunk(self, delta, finish_reason=None):
+        choice = {"index": 0, "delta": delta, "finish_reason": finish_reason}
+        return _sse(None, self._openai_chunk_body([choice]))
+
+
+def _sse(event, data):
+    """Format one server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
@@ -0,0 +1,73 @@
+"""Demonstrates sending many requests concurrently with asyncio.
+
+This script shows how to:
+- Get an async client (AsyncOpenAI or AsyncAnthropic)
+- Run several chat completions at the same time on one event loop
+- Stream a response with ``async for``
+
+Works with both OpenAI and Anthropic based on which API key is configured.
+"""
+
+import asyncio
+
+from src.llm_client import (
+    aclose_clients,
+    acreate_completion,
+    acreate_streaming_completion,
+    get_async_client,
+    get_provider,
+)
+
+
+async def main():
+    """Ask several questions concurrently, then stream one answer."""
+    # Get the provider and async client (auto-detected from env vars)
+    provider = get_provider()
+    client = get_async_client()
+
+    # Select model based on provider
+    model = "gpt-4o-mini" if provider == "openai" else "claude-haiku-4-5"
+
+    print(f"\nUsing {provider} with model: {model}\n")
+
+    questions = [
+        "What is a randomized controlled trial? Answer in one sentence.",
+        "What is a cash transfer program? Answer in one sentence.",
+        "What is microfinance? Answer in one sentence.",
+    ]
+
+    # All requests are in flight at once; gather returns them in order
+    answers = await asyncio.gather(
+        *(
+            acreate_completion(
+                client=client,
+                provider=provider,
+                model=model,
+                messages=[{"role": "user", "content": question}],
+                temperature=0.7,
+            )
+            for question in questions
+        )
+    )
+
+    print("✅ Concurrent completions:\n")
+    for question, answer in zip(questions, answers, strict=True):
+        print(f"Q: {question}\nA: {answer}\n")
+
+    # Stream a response as it arrives
+    print("✅ Streaming response:\n")
+    async for text_chunk in acreate_streaming_completion(
+        client=client,
+        provider=provider,
+        model=model,
+        messages=[{"role": "user", "content": "Say hello in three languages."}],
+    ):
+        print(text_chunk, end="", flush=True)
+
+    print("\n")
+
+    await aclose_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
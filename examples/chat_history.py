@@ -5,12 +5,14 @@ This script demonstrates:
 - How LLMs are stateless (you must send full history each time)
 - Interactive chat loop with user input
 - Building context over multiple exchanges
+- Keeping the history within a token budget by summarizing old turns
 
 Type 'quit' or 'exit' to end the conversation.
 
 Works with both OpenAI and Anthropic based on which API key is configured.
 """
 
+from src.conversation_history import ConversationHistory, make_llm_summarizer
 from src.llm_client import create_completion, get_client, get_provider
 
 
@@ -25,13 +27,14 @@ def main():
 
     print(f"\nUsing {provider} with model: {model}")
 
-    # Initialize conversation with system message
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a helpful assistant. Be concise and friendly.",
-        },
-    ]
+    # Initialize conversation with system message. The history keeps what is
+    # sent each turn under a token budget: older turns are summarized in the
+    # background so long sessions do not get slower and more expensive.
+    history = ConversationHistory(
+        system_prompt="You are a helpful assistant. Be concise and friendly.",
+        max_tokens=4000,
+        summarize=make_llm_summarizer(client, provider, model, temperature=0),
+    )
 
     print("✅ Chat session started!")
     print("Type 'quit' or 'exit' to end the conversation.\n")
@@ -44,25 +47,26 @@ def main():
         # Check for exit commands
         if user_input.lower() in ["quit", "exit"]:
             print("\nGoodbye!\n")
+            history.close()
             break
 
         if not user_input:
             continue
 
         # Add user message to history
-        messages.append({"role": "user", "content": user_input})
+        history.add("user", user_input)
 
         # Get response from API (sending full conversation history)
         bot_response = create_completion(
             client=client,
             provider=provider,
             model=model,
-            messages=messages,
+            messages=history.messages,
             temperature=0.7,
         )
 
         # Add assistant message to history
-        messages.append({"role": "assistant", "content": bot_response})
+        history.add("assistant", bot_response)
 
         # Print response
         print(f"\nAssistant: {bot_response}\n")
@@ -12,6 +12,7 @@ Type 'quit' or 'exit' to end the conversation.
 Works with both OpenAI and Anthropic based on which API key is configured.
 """
 
+from src.conversation_history import ConversationHistory, make_llm_summarizer
 from src.llm_client import (
     create_streaming_completion,
     get_client,
@@ -30,13 +31,14 @@ def main():
 
     print(f"\nUsing {provider} with model: {model}")
 
-    # Initialize conversation with system message
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a helpful assistant. Be concise and friendly.",
-        },
-    ]
+    # Initialize conversation with system message. The history keeps what is
+    # sent each turn under a token budget: older turns are summarized in the
+    # background so long sessions do not get slower and more expensive.
+    history = ConversationHistory(
+        system_prompt="You are a helpful assistant. Be concise and friendly.",
+        max_tokens=4000,
+        summarize=make_llm_summarizer(client, provider, model, temperature=0),
+    )
 
     print("✅ Chat session started (streaming mode)!")
     print("Type 'quit' or 'exit' to end the conversation.\n")
@@ -49,13 +51,14 @@ def main():
         # Check for exit commands
         if user_input.lower() in ["quit", "exit"]:
             print("\nGoodbye!\n")
+            history.close()
             break
 
         if not user_input:
             continue
 
         # Add user message to history
-        messages.append({"role": "user", "content": user_input})
+        history.add("user", user_input)
 
         # Stream and collect the response
         print("\nAssistant: ", end="", flush=True)
@@ -64,7 +67,7 @@ def main():
             client=client,
             provider=provider,
             model=model,
-            messages=messages,
+            messages=history.messages,
             temperature=0.7,
         ):
             print(text_chunk, end="", flush=True)
@@ -73,7 +76,7 @@ def main():
         print("\n")  # Add newline after streaming completes
 
         # Add assistant message to history
-        messages.append({"role": "assistant", "content": bot_response})
+        history.add("assistant", bot_response)
 
 
 if __name__ == "__main__":
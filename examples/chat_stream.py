@@ -4,15 +4,13 @@ This script demonstrates streaming responses, which:
 - Show tokens appearing progressively (like ChatGPT interface)
 - Provide better user experience for long responses
 - Use the same API call with stream=True parameter
+- Can be timed: time-to-first-token and tokens/second are printed at the end
 
 Works with both OpenAI and Anthropic based on which API key is configured.
 """
 
-from src.llm_client import (
-    create_streaming_completion,
-    get_client,
-    get_provider,
-)
+from src.llm_client import get_client, get_provider
+from src.stream_metrics import create_instrumented_streaming_completion
 
 
 def main():
@@ -37,17 +35,27 @@ def main():
 
     # Stream and print the response as it arrives
     print("✅ Streaming response:\n")
-    for text_chunk in create_streaming_completion(
+    timings = []
+    for text_chunk in create_instrumented_streaming_completion(
         client=client,
         provider=provider,
         model=model,
         messages=messages,
         temperature=0.7,
+        on_metrics=timings.append,
     ):
         print(text_chunk, end="", flush=True)
 
     print("\n")  # Add newline at the end
 
+    # Perceived latency: how long until text appears, and how fast it flows
+    metrics = timings[0]
+    if metrics.time_to_first_token is not None:
+        print(f"Time to first token: {metrics.time_to_first_token:.2f}s")
+    print(f"Total time: {metrics.duration:.2f}s")
+    if metrics.tokens_per_second:
+        print(f"Speed: {metrics.tokens_per_second:.0f} tokens/second\n")
+
 
 if __name__ == "__main__":
     main()
@@ -3,22 +3,16 @@
 This script shows how to:
 - Declare a function schema (lookup_weather)
 - Have the model decide when to call the function
-- Parse tool call responses
-- Actually execute the function that the model requested
+- Run the agent loop: execute the requested calls (in parallel), send the
+  results back to the model, and repeat until it answers
 
 This extends the basic example by executing the function call.
 
 Works with both OpenAI and Anthropic based on which API key is configured.
 """
 
-import json
-
-from src.llm_client import (
-    create_completion_with_tools,
-    extract_tool_calls,
-    get_client,
-    get_provider,
-)
+from src.agent import run_agent
+from src.llm_client import get_client, get_provider
 
 
 def lookup_weather(city_name=None, zip_code=None):
@@ -76,8 +70,9 @@ def main():
         }
     ]
 
-    # Make API call with tools parameter
-    response = create_completion_with_tools(
+    # Let the model call the tool as often as it needs; calls from the same
+    # turn run at the same time, and the results are sent back to the model
+    result = run_agent(
         client=client,
         provider=provider,
         model=model,
@@ -88,43 +83,24 @@ def main():
             },
             {
                 "role": "user",
-                "content": "What's the temperature in Celsius in Bogota?",
+                "content": "What's the temperature in Celsius in Bogota and in Lima?",
             },
         ],
         tools=tools,
+        functions={"lookup_weather": lookup_weather},
+        tool_timeout=10,  # seconds each lookup may take
         tool_choice="auto",
     )
 
-    # Check if the model chose to call a function
     print("✅ Function calling with execution:\n")
 
-    tool_calls = extract_tool_calls(response, provider)
-
-    if tool_calls:
-        # Model decided to call a function
-        for tool_call in tool_calls:
-            function_name = tool_call["name"]
-            arguments = tool_call["arguments"]
-
-            # For OpenAI, arguments come as JSON string
-            # For Anthropic, arguments come as dict
-            if isinstance(arguments, str):
-                arguments = json.loads(arguments)
-
-            print(f"Model chose to call: {function_name}")
-            print(f"Arguments: {arguments}\n")
-
-            # Execute the function
-            if function_name == "lookup_weather":
-                result = lookup_weather(**arguments)
-                print(f"Function result: {result}")
-    else:
-        # Model responded with text instead
-        print("Model responded with text instead of calling a function:")
-        if provider == "openai":
-            print(response.choices[0].message.content)
-        else:
-            print(response.content[0].text)
+    for tool_call in result["tool_calls"]:
+        print(f"Model chose to call: {tool_call['name']}")
+        print(f"Arguments: {tool_call['arguments']}")
+        print(f"Function result: {tool_call['content']}\n")
+
+    print(f"Final answer after {result['steps']} model calls:")
+    print(result["text"])
 
 
 if __name__ == "__main__":
@@ -2,58 +2,18 @@
 
 This script:
 - Reads the IPA Best Bets document in English
-- Translates it to Spanish using the LLM API
+- Splits it into sections and translates them to Spanish in parallel
 - Saves the Spanish version to the data folder
+- Keeps a manifest next to the translation, so re-running after an edit
+  only translates the sections that changed
 
 Works with both OpenAI and Anthropic based on which API key is configured.
 """
 
 from pathlib import Path
 
-from src.llm_client import create_completion, get_client, get_provider
-
-
-def translate_to_spanish(text: str, provider: str, client, model: str) -> str:
-    """Translate English text to Spanish using the LLM API.
-
-    Args:
-        text: The English text to translate
-        provider: The LLM provider ("openai" or "anthropic")
-        client: The authenticated client
-        model: The model to use for translation
-
-    Returns:
-        The translated Spanish text
-
-    """
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a professional translator specializing in "
-                "academic and policy documents. "
-                "Translate the following document from English to Spanish. "
-                "Maintain the markdown formatting exactly as it appears. "
-                "Use formal, professional Spanish appropriate for "
-                "policy and research documents. "
-                "Preserve all technical terms and proper nouns appropriately."
-            ),
-        },
-        {
-            "role": "user",
-            "content": f"Translate this document to Spanish:\n\n{text}",
-        },
-    ]
-
-    response_text = create_completion(
-        client=client,
-        provider=provider,
-        model=model,
-        messages=messages,
-        temperature=0.3,  # Lower temperature for more consistent translation
-    )
-
-    return response_text
+from src.llm_client import get_client, get_provider
+from src.markdown_translation import translate_markdown_file
 
 
 def main():
@@ -71,27 +31,24 @@ def main():
     input_file = Path("data/ipa-best-bets-2025.md")
     output_file = Path("data/ipa-best-bets-2025-es.md")
 
-    print(f"\nReading {input_file}...")
+    print(f"\nTranslating {input_file} to Spanish (this may take a moment)...")
 
-    # Read the English document
-    with open(input_file, encoding="utf-8") as f:
-        english_text = f.read()
-
-    print(f"✅ Document loaded ({len(english_text)} characters)")
-    print("\nTranslating to Spanish (this may take a moment)...")
-
-    # Translate to Spanish
-    spanish_text = translate_to_spanish(english_text, provider, client, model)
-
-    print(f"✅ Translation complete ({len(spanish_text)} characters)")
-
-    # Create data directory if it doesn't exist
-    output_file.parent.mkdir(parents=True, exist_ok=True)
-
-    # Save the Spanish translation
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(spanish_text)
+    # Translate section by section; unchanged sections are reused from the
+    # manifest saved alongside the output by the previous run
+    stats = translate_markdown_file(
+        input_file,
+        output_file,
+        client=client,
+        provider=provider,
+        model=model,
+        target_language="Spanish",
+        temperature=0.3,  # Lower temperature for more consistent translation
+    )
 
+    print(
+        f"✅ {stats['segments']} sections: {stats['translated']} translated, "
+        f"{stats['reused']} reused from the previous run"
+    )
     print(f"\nSpanish version saved to: {output_file}")
     print("\nTranslation complete!\n")
 
@@ -0,0 +1,475 @@
+"""Multi-step tool-calling loop with parallel tool execution.
+
+run_agent() sends the conversation with the tool definitions, executes the
+tool calls the model asks for, returns the results to the model, and
+repeats until the model answers in text:
+
+    result = run_agent(
+        client, provider, model, messages, tools,
+        functions={"lookup_weather": lookup_weather},
+    )
+    print(result["text"])
+
+With a ToolRegistry (see src/tools.py) as tools, functions can be omitted:
+the registry supplies them and validates each call's arguments first.
+
+All tool calls from one model turn run at the same time (threads for
+run_agent, the event loop for arun_agent), so three slow lookups cost the
+time of the slowest one rather than their sum. With stream=True each call
+starts as soon as its arguments have streamed in, overlapping the tools
+with the rest of the model's output. Each call has a timeout, and
+identical calls (same tool, same arguments) within a run are executed once
+and their result reused.
+
+Tool failures and timeouts are not raised: they are reported back to the
+model as error results so it can recover, and recorded in the returned
+"tool_calls" list.
+"""
+
+import asyncio
+import inspect
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from src.llm_client import (
+    acreate_completion_with_tools,
+    acreate_streaming_completion_with_tools,
+    create_completion_with_tools,
+    create_streaming_completion_with_tools,
+    extract_tool_calls,
+    response_to_message,
+    tool_results_to_messages,
+)
+from src.tools import ToolArgumentError
+
+DEFAULT_MAX_STEPS = 10
+DEFAULT_TOOL_TIMEOUT = 30.0
+DEFAULT_MAX_WORKERS = 8
+
+
+def _response_text(response, provider):
+    """Return the text content of a response (None if there is none)."""
+    if provider == "openai":
+        return response.choices[0].message.content
+    parts = [block.text for block in response.content if block.type == "text"]
+    return "".join(parts) if parts else None
+
+
+def _parse_arguments(arguments):
+    """Decode tool arguments: a JSON string (OpenAI) or a dict (Anthropic)."""
+    if isinstance(arguments, str):
+        return json.loads(arguments or "{}")
+    return arguments
+
+
+def _serialize(result):
+    """Turn a tool's return value into the text sent back to the model."""
+    if isinstance(result, str):
+        return result
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+
+class _ToolRun:
+    """Bookkeeping for the tool calls of one agent run.
+
+    Plans each turn's calls (parsing arguments, rejecting unknown tools and
+    deduplicating identical calls) and turns outcomes into tool results.
+    """
+
+    def __init__(self, tools, functions, tool_timeout, timeouts, memoize):
+        if functions is None:
+            functions = getattr(tools, "functions", None)
+            if functions is None:
+                raise ValueError("functions is required unless tools is a ToolRegistry")
+        self.functions = functions
+        self.registry = tools if hasattr(tools, "parse_arguments") else None
+        self.tool_timeout = tool_timeout
+        self.timeouts = timeouts or {}
+        self.memoize = memoize
+        self.memo = {}
+        self.records = []
+
+    def timeout_for(self, name):
+        return self.timeouts.get(name, self.tool_timeout)
+
+    def plan(self, tool_calls):
+        """Split a turn's calls into immediate outcomes and work to execute.
+
+        Returns:
+            tuple: (calls, jobs) where calls is a list of (call, key, outcome)
+                   with outcome set for calls that need no execution, and
+                   jobs maps a call key to (name, kwargs) to execute once
+
+        """
+        calls = []
+        jobs = {}
+        for call in tool_calls:
+            name = call["name"]
+            function = self.functions.get(name)
+            if function is None:
+                calls.append((call, None, _failure(f"Unknown tool: {name}")))
+                continue
+            try:
+                if self.registry is not None and name in self.registry:
+                    kwargs = self.registry.parse_arguments(name, call["arguments"])
+                else:
+                    kwargs = _parse_arguments(call["arguments"])
+            except ToolArgumentError as error:
+                calls.append((call, None, _failure(f"Invalid arguments: {error}")))
+                continue
+            except ValueError as error:
+                calls.append((call, None, _failure(f"Invalid JSON arguments: {error}")))
+                continue
+            key = (name, json.dumps(kwargs, sort_keys=True, default=str))
+            if not self.memoize:
+                # Every call runs, even when a tool is called twice alike
+                key = (*key, call["id"])
+            if self.memoize and key in self.memo:
+                calls.append((call, key, {**self.memo[key], "cached": True}))
+                continue
+            calls.append((call, key, None))
+            jobs.setdefault(key, (name, kwargs))
+        return calls, jobs
+
+    def finish(self, calls, outcomes):
+        """Record a turn's outcomes and return the tool results to send."""
+        results = []
+        executed = set()
+        for call, key, outcome in calls:
+            if outcome is None:
+                outcome = outcomes[key]
+                if key in executed:
+                    # Identical to an earlier call in this turn
+                    outcome = {**outcome, "cached": True}
+                executed.add(key)
+                if self.memoize and not outcome["is_error"]:
+                    self.memo.setdefault(key, outcome)
+            self.records.append(
+                {
+                    "name": call["name"],
+                    "arguments": call["arguments"],
+                    "content": outcome["content"],
+                    "is_error": outcome["is_error"],
+                    "duration": outcome.get("duration", 0.0),
+                    "cached": outcome.get("cached", False),
+                }
+            )
+            results.append(
+                {
+                    "id": call["id"],
+                    "content": outcome["content"],
+                    "is_error": outcome["is_error"],
+                }
+            )
+        return results
+
+
+def _success(result, duration):
+    return {"content": _serialize(result), "is_error": False, "duration": duration}
+
+
+def _failure(message, started=None):
+    duration = 0.0 if started is None else time.perf_counter() - started
+    return {"content": f"Error: {message}", "is_error": True, "duration": duration}
+
+
+def _describe_error(error):
+    return f"{type(error).__name__}: {error}"
+
+
+def _timed_call(function, kwargs, started):
+    """Call a tool in a worker thread, timing it there.
+
+    started is resolved with the start time as soon as a worker picks the
+    call up, so time spent queued behind other calls does not count.
+    """
+    started.set_result(time.perf_counter())
+    result = function(**kwargs)
+    return result, time.perf_counter() - started.result()
+
+
+def _submit(run, executor, jobs, pending):
+    """Start tool calls in threads; pending maps key -> (name, future, start).
+
+    start is a Future resolved when a worker begins the call. Calls already
+    in pending (identical to an earlier one) are not started.
+    """
+    for key, (name, kwargs) in jobs.items():
+        if key not in pending:
+            started = Future()
+            future = executor.submit(_timed_call, run.functions[name], kwargs, started)
+            pending[key] = (name, future, started)
+
+
+def _collect(run, pending):
+    """Wait for started tool calls, each within its own timeout.
+
+    The timeout runs from when a worker begins the call, as on the async
+    path. A call still queued gets its own timeout to start once the calls
+    before it are done, so tools that hang and hold every worker cannot
+    block the turn.
+    """
+    outcomes = {}
+    for key, (name, future, started) in pending.items():
+        timeout = run.timeout_for(name)
+        try:
+            start = started.result(timeout=timeout)
+            remaining = None
+            if timeout is not None:
+                remaining = max(0.0, start + timeout - time.perf_counter())
+            outcomes[key] = _success(*future.result(timeout=remaining))
+        except FutureTimeoutError:
+            future.cancel()
+            outcomes[key] = _failure(
+                f"{name} timed out after {timeout:g} seconds",
+                started.result() if started.done() else None,
+            )
+        except Exception as error:
+            outcomes[key] = _failure(_describe_error(error), started.result())
+    return outcomes
+
+
+def _execute(run, executor, jobs):
+    """Run a turn's tool calls in threads, each with its own timeout."""
+    pending = {}
+    _submit(run, executor, jobs, pending)
+    return _collect(run, pending)
+
+
+def _stream_turn(run, executor, events, on_text):
+    """Consume a streamed turn, starting each tool call once it is ready.
+
+    Returns:
+        tuple: (done event, calls as from _ToolRun.plan(), outcomes)
+
+    """
+    calls = []
+    pending = {}
+    for event in events:
+        if event["type"] == "tool_ready":
+            planned, jobs = run.plan([event])
+            calls.extend(planned)
+            _submit(run, executor, jobs, pending)
+        elif event["type"] == "text" and on_text is not None:
+            on_text(event["text"])
+        elif event["type"] == "done":
+            done = event
+    return done, calls, _collect(run, pending)
+
+
+def _result(text, response, messages, run, steps, finished):
+    return {
+        "text": text,
+        "messages": messages,
+        "tool_calls": run.records,
+        "steps": steps,
+        "finished": finished,
+        "response": response,
+    }
+
+
+def run_agent(
+    client,
+    provider,
+    model,
+    messages,
+    tools,
+    functions=None,
+    *,
+    max_steps=DEFAULT_MAX_STEPS,
+    tool_timeout=DEFAULT_TOOL_TIMEOUT,
+    timeouts=None,
+    memoize=True,
+    max_workers=DEFAULT_MAX_WORKERS,
+    stream=False,
+    on_text=None,
+    **kwargs,
+):
+    """Let the model call tools until it answers in text.
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        messages: List of message dicts with "role" and "content" (not
+                  modified; the full transcript is returned)
+        tools: List of tool/function definitions (OpenAI format) or a
+               ToolRegistry
+        functions: Dict mapping tool names to Python callables, which are
+                   called with the model's arguments as keyword arguments
+                   (optional when tools is a ToolRegistry)
+        max_steps: Maximum number of model calls
+        tool_timeout: Seconds each tool call may take (None for no limit).
+                      A timed-out call is reported to the model as an
+                      error; its thread is left to finish in the background.
+        timeouts: Optional dict of per-tool timeouts overriding tool_timeout
+        memoize: Reuse results of identical calls within this run
+        max_workers: Maximum tool calls running at the same time
+        stream: Stream each model turn and start every tool call as soon
+                as its arguments are complete, while the model is still
+                generating the rest of the turn
+        on_text: Optional callback receiving text chunks as they stream
+                 (with stream=True)
+        **kwargs: Additional parameters for create_completion_with_tools()
+                  (temperature, retry, prompt_cache, on_usage, ...)
+
+    Returns:
+        dict: {"text": final answer, "messages": transcript including tool
+               calls and results, "tool_calls": list of executed calls with
+               their "content", "is_error", "duration" and "cached",
+               "steps": number of model calls, "finished": False if
+               max_steps ran out before a text answer, "response": last
+               provider response, or the final "done" event of
+               create_streaming_completion_with_tools() with stream=True}
+
+    """
+    messages = list(messages)
+    run = _ToolRun(tools, functions, tool_timeout, timeouts, memoize)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for step in range(1, max_steps + 1):
+            if stream:
+                events = create_streaming_completion_with_tools(
+                    client, provider, model, messages, tools, **kwargs
+                )
+                response, calls, outcomes = _stream_turn(run, executor, events, on_text)
+                text, message = response["text"], response["message"]
+            else:
+                response = create_completion_with_tools(
+                    client, provider, model, messages, tools, **kwargs
+                )
+                text = _response_text(response, provider)
+                tool_calls = extract_tool_calls(response, provider)
+                calls = None
+                if tool_calls:
+                    message = response_to_message(response, provider)
+                    calls, jobs = run.plan(tool_calls)
+                    outcomes = _execute(run, executor, jobs)
+            if not calls:
+                return _result(text, response, messages, run, step, True)
+
+            messages.append(message)
+            results = run.finish(calls, outcomes)
+            messages.extend(tool_results_to_messages(results, provider))
+    finally:
+        # Do not wait for tool calls that timed out
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return _result(text, response, messages, run, max_steps, False)
+
+
+async def _arun_tool(run, semaphore, name, kwargs):
+    """Run one tool call on the event loop within its timeout.
+
+    Coroutine functions are awaited; plain functions run in worker threads.
+    """
+    function = run.functions[name]
+    timeout = run.timeout_for(name)
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            # Inside the try: bad arguments from the model raise TypeError
+            # here and go back to it as an error result
+            if inspect.iscoroutinefunction(function):
+                call = function(**kwargs)
+            else:
+                call = asyncio.to_thread(function, **kwargs)
+            result = await asyncio.wait_for(call, timeout)
+        except TimeoutError:
+            return _failure(f"{name} timed out after {timeout:g} seconds", started)
+        except Exception as error:
+            return _failure(_describe_error(error), started)
+        return _success(result, time.perf_counter() - started)
+
+
+async def _aexecute(run, jobs, max_workers):
+    """Run a turn's tool calls concurrently on the event loop."""
+    semaphore = asyncio.Semaphore(max_workers)
+    outcomes = await asyncio.gather(
+        *(_arun_tool(run, semaphore, name, kwargs) for name, kwargs in jobs.values())
+    )
+    return dict(zip(jobs, outcomes, strict=True))
+
+
+async def _astream_turn(run, events, on_text, max_workers):
+    """Async version of _stream_turn(); tool calls run as tasks."""
+    semaphore = asyncio.Semaphore(max_workers)
+    calls = []
+    tasks = {}
+    try:
+        async for event in events:
+            if event["type"] == "tool_ready":
+                planned, jobs = run.plan([event])
+                calls.extend(planned)
+                for key, (name, kwargs) in jobs.items():
+                    if key not in tasks:
+                        tasks[key] = asyncio.create_task(
+                            _arun_tool(run, semaphore, name, kwargs)
+                        )
+            elif event["type"] == "text" and on_text is not None:
+                on_text(event["text"])
+            elif event["type"] == "done":
+                done = event
+        outcomes = await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    return done, calls, dict(zip(tasks, outcomes, strict=True))
+
+
+async def arun_agent(
+    client,
+    provider,
+    model,
+    messages,
+    tools,
+    functions=None,
+    *,
+    max_steps=DEFAULT_MAX_STEPS,
+    tool_timeout=DEFAULT_TOOL_TIMEOUT,
+    timeouts=None,
+    memoize=True,
+    max_workers=DEFAULT_MAX_WORKERS,
+    stream=False,
+    on_text=None,
+    **kwargs,
+):
+    """Async version of run_agent().
+
+    Takes an async client from get_async_client(). Tools may be plain
+    functions (run in worker threads) or ``async def`` functions (awaited
+    directly, and cancelled when they time out).
+    """
+    messages = list(messages)
+    run = _ToolRun(tools, functions, tool_timeout, timeouts, memoize)
+    for step in range(1, max_steps + 1):
+        if stream:
+            events = acreate_streaming_completion_with_tools(
+                client, provider, model, messages, tools, **kwargs
+            )
+            response, calls, outcomes = await _astream_turn(
+                run, events, on_text, max_workers
+            )
+            text, message = response["text"], response["message"]
+        else:
+            response = await acreate_completion_with_tools(
+                client, provider, model, messages, tools, **kwargs
+            )
+            text = _response_text(response, provider)
+            tool_calls = extract_tool_calls(response, provider)
+            calls = None
+            if tool_calls:
+                message = response_to_message(response, provider)
+                calls, jobs = run.plan(tool_calls)
+                outcomes = await _aexecute(run, jobs, max_workers)
+        if not calls:
+            return _result(text, response, messages, run, step, True)
+
+        messages.append(message)
+        results = run.finish(calls, outcomes)
+        messages.extend(tool_results_to_messages(results, provider))
+
+    return _result(text, response, messages, run, max_steps, False)
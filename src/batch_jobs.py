@@ -0,0 +1,329 @@
+"""Submit, poll and collect provider batch jobs.
+
+Both providers offer an asynchronous batch endpoint (OpenAI Batch API and
+Anthropic Message Batches) that processes large sets of requests within 24
+hours at a lower price and with much higher throughput limits than
+individual calls. This is a good fit for offline work such as bulk
+translation or coding open-ended survey responses.
+
+Typical flow:
+
+    batch_id = submit_batch(client, provider, model, message_lists)
+    wait_for_batch(client, provider, batch_id)
+    for result in iter_batch_results(client, provider, batch_id):
+        print(result["custom_id"], result["text"])
+"""
+
+import io
+import json
+import re
+import time
+
+from src.llm_client import _build_anthropic_request, _tool_definitions
+
+# Statuses after which an OpenAI batch will not change any more
+_OPENAI_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Anthropic only accepts custom IDs made of these characters
+_CUSTOM_ID_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+
+
+def _default_custom_ids(count):
+    """Generate stable custom IDs ("request-0", "request-1", ...)."""
+    return [f"request-{index}" for index in range(count)]
+
+
+def _validate_custom_ids(custom_ids):
+    """Check that custom IDs are unique and accepted by both providers."""
+    seen = set()
+    for custom_id in custom_ids:
+        if not _CUSTOM_ID_PATTERN.match(custom_id):
+            raise ValueError(
+                f"Invalid custom_id: {custom_id!r}. Use 1-64 letters, digits, "
+                "'_' or '-'"
+            )
+        if custom_id in seen:
+            raise ValueError(f"Duplicate custom_id: {custom_id!r}")
+        seen.add(custom_id)
+
+
+def build_openai_batch_file(model, message_lists, custom_ids, tools=None, **kwargs):
+    """Serialize requests into the JSONL format of the OpenAI Batch API.
+
+    Args:
+        model: Model name
+        message_lists: List of message lists, one per request
+        custom_ids: List of custom IDs matching message_lists
+        tools: Optional list of tool definitions (OpenAI format) or a
+               ToolRegistry
+        **kwargs: Additional parameters applied to every request
+
+    Returns:
+        bytes: JSONL file content, one request per line
+
+    """
+    lines = []
+    for custom_id, messages in zip(custom_ids, message_lists, strict=True):
+        body = {"model": model, "messages": messages, **kwargs}
+        if tools is not None:
+            body["tools"] = _tool_definitions(tools, "openai")
+        lines.append(
+            json.dumps(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": body,
+                }
+            )
+        )
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def build_anthropic_batch_requests(
+    model, message_lists, custom_ids, tools=None, **kwargs
+):
+    """Convert requests into the format of Anthropic Message Batches.
+
+    Uses the same conversion as create_completion(), so system messages are
+    moved to the "system" parameter and tools are converted to Anthropic
+    format.
+
+    Args:
+        model: Model name
+        message_lists: List of message lists, one per request
+        custom_ids: List of custom IDs matching message_lists
+        tools: Optional list of tool definitions (OpenAI format) or a
+               ToolRegistry
+        **kwargs: Additional parameters applied to every request
+
+    Returns:
+        list: Request dicts with "custom_id" and "params" keys
+
+    """
+    return [
+        {
+            "custom_id": custom_id,
+            "params": _build_anthropic_request(model, messages, kwargs, tools),
+        }
+        for custom_id, messages in zip(custom_ids, message_lists, strict=True)
+    ]
+
+
+def submit_batch(
+    client, provider, model, message_lists, custom_ids=None, tools=None, **kwargs
+):
+    """Submit a list of conversations as one provider batch job.
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        message_lists: List of message lists, one per request
+        custom_ids: Optional list of IDs used to match results back to
+                    inputs. Defaults to "request-0", "request-1", ...
+        tools: Optional list of tool definitions (OpenAI format) or a
+               ToolRegistry
+        **kwargs: Additional parameters applied to every request
+                  (temperature, max_tokens, etc.)
+
+    Returns:
+        str: The batch ID, used with get_batch_status() and
+             iter_batch_results()
+
+    Raises:
+        ValueError: If custom IDs are invalid or provider is unknown
+
+    """
+    message_lists = list(message_lists)
+    if custom_ids is None:
+        custom_ids = _default_custom_ids(len(message_lists))
+    custom_ids = list(custom_ids)
+    if len(custom_ids) != len(message_lists):
+        raise ValueError("custom_ids must have one entry per message list")
+    _validate_custom_ids(custom_ids)
+
+    if provider == "openai":
+        content = build_openai_batch_file(
+            model, message_lists, custom_ids, tools=tools, **kwargs
+        )
+        input_file = client.files.create(
+            file=("batch.jsonl", io.BytesIO(content), "application/jsonl"),
+            purpose="batch",
+        )
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    if provider == "anthropic":
+        requests = build_anthropic_batch_requests(
+            model, message_lists, custom_ids, tools=tools, **kwargs
+        )
+        batch = client.messages.batches.create(requests=requests)
+        return batch.id
+
+    raise ValueError(f"Invalid provider: {provider}")
+
+
+def get_batch_status(client, provider, batch_id):
+    """Fetch the current state of a batch job.
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        batch_id: ID returned by submit_batch()
+
+    Returns:
+        dict: {"id": batch ID,
+               "status": provider status string,
+               "done": True once the batch will not change any more,
+               "counts": dict of request counts by state}
+
+    """
+    if provider == "openai":
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "id": batch.id,
+            "status": batch.status,
+            "done": batch.status in _OPENAI_FINAL_STATUSES,
+            "counts": {
+                "total": counts.total if counts else 0,
+                "completed": counts.completed if counts else 0,
+                "failed": counts.failed if counts else 0,
+            },
+        }
+
+    if provider == "anthropic":
+        batch = client.messages.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "id": batch.id,
+            "status": batch.processing_status,
+            "done": batch.processing_status == "ended",
+            "counts": {
+                "processing": counts.processing,
+                "succeeded": counts.succeeded,
+                "errored": counts.errored,
+                "canceled": counts.canceled,
+                "expired": counts.expired,
+            },
+        }
+
+    raise ValueError(f"Invalid provider: {provider}")
+
+
+def wait_for_batch(client, provider, batch_id, poll_interval=30, timeout=None):
+    """Poll a batch job until it finishes.
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        batch_id: ID returned by submit_batch()
+        poll_interval: Seconds to wait between status checks
+        timeout: Optional maximum number of seconds to wait
+
+    Returns:
+        dict: The final status, as returned by get_batch_status()
+
+    Raises:
+        TimeoutError: If the batch is still running after timeout seconds
+
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        status = get_batch_status(client, provider, batch_id)
+        if status["done"]:
+            return status
+        if deadline is not None and time.monotonic() + poll_interval > deadline:
+            raise TimeoutError(
+                f"Batch {batch_id} still {status['status']} after {timeout}s"
+            )
+        time.sleep(poll_interval)
+
+
+def iter_batch_results(client, provider, batch_id):
+    """Stream the results of a finished batch job.
+
+    Results are read incrementally, so very large batches never need to fit
+    in memory. They arrive in the provider's order, which is not necessarily
+    the submission order; use "custom_id" to match them to inputs.
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        batch_id: ID returned by submit_batch()
+
+    Yields:
+        dict: {"custom_id": ID given at submission,
+               "text": response text (None on failure),
+               "response": provider response object (ChatCompletion or
+                           Message) usable with extract_tool_calls(),
+               "error": error description (None on success)}
+
+    """
+    if provider == "openai":
+        yield from _iter_openai_results(client, batch_id)
+    elif provider == "anthropic":
+        yield from _iter_anthropic_results(client, batch_id)
+    else:
+        raise ValueError(f"Invalid provider: {provider}")
+
+
+def _iter_openai_results(client, batch_id):
+    """Yield normalized results from an OpenAI batch's output files."""
+    from openai.types.chat import ChatCompletion
+
+    batch = client.batches.retrieve(batch_id)
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        with client.files.with_streaming_response.content(file_id) as content:
+            for line in content.iter_lines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                body = response.get("body")
+                if record.get("error") or response.get("status_code") != 200:
+                    error = record.get("error") or (body or {}).get("error")
+                    yield {
+                        "custom_id": record["custom_id"],
+                        "text": None,
+                        "response": None,
+                        "error": json.dumps(error),
+                    }
+                    continue
+                completion = ChatCompletion.model_validate(body)
+                yield {
+                    "custom_id": record["custom_id"],
+                    "text": completion.choices[0].message.content,
+                    "response": completion,
+                    "error": None,
+                }
+
+
+def _iter_anthropic_results(client, batch_id):
+    """Yield normalized results from an Anthropic message batch."""
+    for entry in client.messages.batches.results(batch_id):
+        result = entry.result
+        if result.type != "succeeded":
+            error = getattr(result, "error", None)
+            yield {
+                "custom_id": entry.custom_id,
+                "text": None,
+                "response": None,
+                "error": str(error) if error is not None else result.type,
+            }
+            continue
+        message = result.message
+        text_blocks = [block.text for block in message.content if block.type == "text"]
+        yield {
+            "custom_id": entry.custom_id,
+            "text": "".join(text_blocks) if text_blocks else None,
+            "response": message,
+            "error": None,
+        }
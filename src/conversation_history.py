@@ -0,0 +1,252 @@
+"""Token-budgeted conversation history with automatic compaction.
+
+LLMs are stateless, so chat apps resend the whole conversation every turn.
+Without a limit, each turn costs more than the last and long sessions
+eventually overflow the context window. ConversationHistory keeps the
+messages sent to the model under a token budget:
+
+- the system message is always kept,
+- the most recent turns are kept while they fit the budget,
+- older turns are dropped, or, with a summarizer, folded into a running
+  summary in a background thread so the chat never waits for it.
+
+    history = ConversationHistory("You are a helpful assistant.", max_tokens=4000)
+    history.add("user", user_input)
+    reply = create_completion(client, provider, model, history.messages)
+    history.add("assistant", reply)
+
+Token counts are estimated locally (about four characters per token), which
+is accurate enough for budgeting and costs nothing.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.llm_client import create_completion
+from src.rate_limit import CHARS_PER_TOKEN
+
+# Approximate per-message overhead for role markers and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# When over budget, trim to this fraction of it to leave room for new turns
+COMPACT_RATIO = 0.75
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an "
+    "assistant. Update the summary with the new messages below. Keep every "
+    "fact, decision, name, number and open question that later turns might "
+    "rely on. Be concise and reply with the updated summary only."
+)
+
+
+def estimate_tokens(messages):
+    """Estimate the number of tokens in a list of messages.
+
+    Args:
+        messages: List of message dicts with "role" and "content"
+
+    Returns:
+        int: Estimated token count
+
+    """
+    total = 0
+    for message in messages:
+        content = message["content"]
+        if not isinstance(content, str):
+            content = str(content)
+        total += len(content) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+    return total
+
+
+def starts_turn(message):
+    """Return True if a message opens a user turn.
+
+    Anthropic tool results are user messages too, but a history must not
+    start with one: the API rejects a tool_result whose tool_use is gone.
+    """
+    if message["role"] != "user":
+        return False
+    content = message["content"]
+    return isinstance(content, str) or not any(
+        isinstance(block, dict) and block.get("type") == "tool_result"
+        for block in content
+    )
+
+
+def make_llm_summarizer(client, provider, model, **kwargs):
+    """Build a summarizer that uses an LLM to compact old turns.
+
+    A small, fast model is usually enough for this.
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        **kwargs: Additional parameters for create_completion()
+
+    Returns:
+        callable: summarize(previous_summary, messages) -> str
+
+    """
+
+    def summarize(previous_summary, messages):
+        transcript = "\n".join(
+            f"{message['role']}: {message['content']}" for message in messages
+        )
+        prompt = (
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        return create_completion(
+            client,
+            provider,
+            model,
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            **kwargs,
+        )
+
+    return summarize
+
+
+class ConversationHistory:
+    """Conversation messages kept within a token budget.
+
+    Thread-safe. ``messages`` returns a list in the usual llm_client format
+    that can be passed straight to any adapter.
+    """
+
+    def __init__(self, system_prompt=None, max_tokens=8000, summarize=None):
+        """Start a conversation.
+
+        Args:
+            system_prompt: Optional system message, always sent first
+            max_tokens: Token budget for the messages sent to the model
+            summarize: Optional callable(previous_summary, messages) -> str
+                       used to compact dropped turns (see
+                       make_llm_summarizer). Without it, old turns are
+                       simply dropped. If it fails, the dropped turns are
+                       kept for the next attempt and the error is raised
+                       by the next ``messages`` access.
+
+        """
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.summary = None
+
+        self._turns = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1) if summarize else None
+        self._pending = None
+        # Dropped turns not yet folded into the summary
+        self._unsummarized = []
+        self._summary_error = None
+
+    def add(self, role, content):
+        """Append a message and compact the history if it is over budget."""
+        with self._lock:
+            self._turns.append({"role": role, "content": content})
+            self._compact()
+
+    @property
+    def messages(self):
+        """Messages to send to the model: system, then the recent turns.
+
+        Raises:
+            Exception: Once, the error of a failed background summarization
+
+        """
+        with self._lock:
+            error, self._summary_error = self._summary_error, None
+            if error is not None:
+                raise error
+            return self._system_messages() + list(self._turns)
+
+    @property
+    def token_count(self):
+        """Estimated tokens of the messages currently sent to the model."""
+        return estimate_tokens(self.messages)
+
+    def wait(self):
+        """Block until any background summarization has finished."""
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def close(self):
+        """Finish background work and release the summarizer thread."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _system_messages(self):
+        """Build the pinned system message, including the running summary."""
+        parts = []
+        if self.system_prompt:
+            parts.append(self.system_prompt)
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        if not parts:
+            return []
+        return [{"role": "system", "content": "\n\n".join(parts)}]
+
+    def _compact(self):
+        """Drop the oldest turns until the history fits (lock held).
+
+        Turns are dropped whole (a user message and everything up to the
+        next user message, tool results included) so the history always
+        starts with a user turn, and the latest user turn is never dropped.
+        Once over budget, the history is trimmed to COMPACT_RATIO of the
+        budget so compaction (and summarization) happens in larger, less
+        frequent steps.
+        """
+        budget = self.max_tokens - estimate_tokens(self._system_messages())
+        if estimate_tokens(self._turns) <= budget:
+            return
+
+        dropped = []
+        while estimate_tokens(self._turns) > budget * COMPACT_RATIO:
+            cut = next(
+                (
+                    index
+                    for index in range(1, len(self._turns))
+                    if starts_turn(self._turns[index])
+                ),
+                None,
+            )
+            if cut is None:
+                # Only the current exchange is left
+                break
+            dropped.extend(self._turns[:cut])
+            del self._turns[:cut]
+
+        if dropped and self._executor is not None:
+            self._unsummarized.extend(dropped)
+            self._pending = self._executor.submit(self._fold_into_summary)
+
+    def _fold_into_summary(self):
+        """Summarize dropped turns into the running summary (background).
+
+        Turns stay queued until a summary of them succeeds, so a failed
+        attempt is retried with the next compaction instead of losing them.
+        """
+        with self._lock:
+            previous = self.summary
+            dropped = list(self._unsummarized)
+        if not dropped:
+            return
+        try:
+            summary = self.summarize(previous, dropped)
+        except Exception as error:
+            with self._lock:
+                self._summary_error = error
+            return
+        with self._lock:
+            self.summary = summary
+            self._summary_error = None
+            # Only this worker removes turns, so these are the ones summarized
+            del self._unsummarized[: len(dropped)]
+            # A longer summary may push the history over budget again
+            self._compact()
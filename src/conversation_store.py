@@ -0,0 +1,322 @@
+"""Conversation transcripts stored in DuckDB, one table for all sessions.
+
+ConversationHistory keeps a transcript in a Python list, which is lost when
+the process exits and costs memory for every open session. A server with
+thousands of concurrent chats can instead append each message to a
+ConversationStore and load only the recent window a request needs:
+
+    store = ConversationStore("data/conversations.duckdb")
+    chat = store.session(session_id, system_prompt="You are helpful.",
+                         max_tokens=4000)
+    chat.add("user", user_input)
+    reply = create_completion(client, provider, model, chat.messages)
+    chat.add("assistant", reply)
+
+Nothing but a small write buffer is held in memory, whatever the number or
+length of the sessions. Messages are indexed by session, and the window is
+selected in SQL (latest messages within a token budget), so a request never
+reads the whole transcript into Python. The full history stays on disk for
+analytics and can be exported to Parquet.
+"""
+
+import json
+import threading
+from datetime import UTC, datetime
+
+import duckdb
+
+from src.conversation_history import estimate_tokens, starts_turn
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id BIGINT,
+    session_id VARCHAR,
+    created_at TIMESTAMP,
+    role VARCHAR,
+    content VARCHAR,
+    data VARCHAR,
+    tokens INTEGER
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id)
+"""
+
+_COLUMNS = ("id", "session_id", "created_at", "role", "content", "data", "tokens")
+
+# Latest messages of one session that fit a message count and token budget
+_WINDOW = """
+SELECT role, content, data FROM (
+    SELECT id, role, content, data,
+           SUM(tokens) OVER (ORDER BY id DESC) AS running_tokens,
+           ROW_NUMBER() OVER (ORDER BY id DESC) AS position
+    FROM messages
+    WHERE session_id = ?
+)
+WHERE running_tokens <= ? AND position <= ?
+ORDER BY id
+"""
+
+# User messages of one session, newest first, to find where a turn starts
+_USER_MESSAGES = """
+SELECT id, role, content, data FROM messages
+WHERE session_id = ? AND role = 'user'
+ORDER BY id DESC
+"""
+
+_MESSAGES_FROM = """
+SELECT role, content, data FROM messages
+WHERE session_id = ? AND id >= ?
+ORDER BY id
+"""
+
+
+def _to_row(message_id, session_id, message, now):
+    """Build a table row; structured messages are kept whole as JSON."""
+    content = message["content"]
+    plain = isinstance(content, str) and message.keys() <= {"role", "content"}
+    return (
+        message_id,
+        session_id,
+        now,
+        message["role"],
+        content if isinstance(content, str) else None,
+        None if plain else json.dumps(message, ensure_ascii=False),
+        estimate_tokens([message]),
+    )
+
+
+def _from_row(role, content, data):
+    if data is not None:
+        return json.loads(data)
+    return {"role": role, "content": content}
+
+
+class ConversationStore:
+    """Append-only DuckDB store of chat messages by session. Thread-safe."""
+
+    def __init__(self, path="data/conversations.duckdb", flush_every=50):
+        """Open (or create) a store.
+
+        Args:
+            path: DuckDB database file (":memory:" for a temporary store)
+            flush_every: Number of buffered messages that triggers a write.
+                         Loading a session always writes the buffer first.
+
+        """
+        self.path = str(path)
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._rows = []
+        self._local = threading.local()
+        self._conn = duckdb.connect(self.path)
+        self._conn.execute(_SCHEMA)
+        (last_id,) = self._conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM messages"
+        ).fetchone()
+        self._next_id = last_id + 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, session_id, role, content):
+        """Append one message to a session."""
+        self.extend(session_id, [{"role": role, "content": content}])
+
+    def extend(self, session_id, messages):
+        """Append messages (dicts in llm_client format) to a session.
+
+        Messages with structured content or extra keys (tool calls, tool
+        results) are stored whole and loaded back unchanged.
+        """
+        now = datetime.now(UTC).replace(tzinfo=None)
+        with self._lock:
+            for message in messages:
+                self._rows.append(_to_row(self._next_id, session_id, message, now))
+                self._next_id += 1
+            if len(self._rows) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        """Write buffered messages to the database."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        """Write buffered messages (caller must hold the lock)."""
+        if not self._rows:
+            return
+        # One multi-row INSERT: executemany() runs a statement per row, which
+        # is several times slower
+        placeholders = f"({', '.join('?' for _ in _COLUMNS)})"
+        self._conn.execute(
+            f"INSERT INTO messages ({', '.join(_COLUMNS)}) "
+            f"VALUES {', '.join(placeholders for _ in self._rows)}",
+            [value for row in self._rows for value in row],
+        )
+        self._rows = []
+
+    def _cursor(self):
+        """Return this thread's connection, so reads can run concurrently."""
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._conn.cursor()
+        return cursor
+
+    def load(self, session_id, max_tokens=None, max_messages=None):
+        """Load the most recent messages of a session.
+
+        The window starts at a user message, so it never opens with an
+        assistant reply or a tool result cut off from its call. The latest
+        user turn is always returned, even if it alone exceeds the limits.
+
+        Args:
+            session_id: Session to load
+            max_tokens: Optional token budget for the returned messages
+                        (estimated as in ConversationHistory)
+            max_messages: Optional maximum number of messages
+
+        Returns:
+            list: Message dicts, oldest first
+
+        """
+        self.flush()
+        rows = (
+            self._cursor()
+            .execute(
+                _WINDOW,
+                [
+                    session_id,
+                    max_tokens if max_tokens is not None else 2**62,
+                    max_messages if max_messages is not None else 2**62,
+                ],
+            )
+            .fetchall()
+        )
+        messages = [_from_row(*row) for row in rows]
+        start = next(
+            (index for index, message in enumerate(messages) if starts_turn(message)),
+            None,
+        )
+        if start is None:
+            return self._latest_turn(session_id)
+        return messages[start:]
+
+    def _latest_turn(self, session_id):
+        """Load the session's latest user turn, whatever its size."""
+        cursor = self._cursor().execute(_USER_MESSAGES, [session_id])
+        while (row := cursor.fetchone()) is not None:
+            message_id, *message = row
+            if starts_turn(_from_row(*message)):
+                rows = (
+                    self._cursor()
+                    .execute(_MESSAGES_FROM, [session_id, message_id])
+                    .fetchall()
+                )
+                return [_from_row(*row) for row in rows]
+        return []
+
+    def session(self, session_id, system_prompt=None, max_tokens=8000):
+        """Return a ConversationHistory-like view of one session."""
+        return StoredConversation(self, session_id, system_prompt, max_tokens)
+
+    def delete(self, session_id):
+        """Delete all messages of a session."""
+        with self._lock:
+            self._flush()
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id = ?", [session_id]
+            )
+
+    def sessions(self):
+        """Message count, tokens and activity times per session.
+
+        Returns:
+            pandas.DataFrame: One row per session, most recently active first
+
+        """
+        return self.query(
+            """
+            SELECT session_id,
+                   COUNT(*) AS messages,
+                   SUM(tokens) AS tokens,
+                   MIN(created_at) AS started_at,
+                   MAX(created_at) AS last_active_at
+            FROM messages
+            GROUP BY session_id
+            ORDER BY last_active_at DESC
+            """
+        )
+
+    def query(self, sql, params=None):
+        """Run SQL against the store (the table is called "messages").
+
+        Returns:
+            pandas.DataFrame: The query result
+
+        """
+        self.flush()
+        return self._cursor().execute(sql, params or []).df()
+
+    def export_parquet(self, path):
+        """Write all messages to a Parquet file, ordered by session."""
+        with self._lock:
+            self._flush()
+            self._conn.execute(
+                "COPY (SELECT * FROM messages ORDER BY session_id, id) "
+                "TO ? (FORMAT parquet)",
+                [str(path)],
+            )
+
+    def close(self):
+        """Write buffered messages and close the database."""
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+
+class StoredConversation:
+    """One session of a ConversationStore, used like ConversationHistory.
+
+    Holds no messages itself: ``messages`` loads the latest window that
+    fits the token budget from the store on every call.
+    """
+
+    def __init__(self, store, session_id, system_prompt=None, max_tokens=8000):
+        """Bind a session.
+
+        Args:
+            store: The ConversationStore holding the messages
+            session_id: Session ID
+            system_prompt: Optional system message, always sent first (not
+                           stored)
+            max_tokens: Token budget for the messages sent to the model
+
+        """
+        self.store = store
+        self.session_id = session_id
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+
+    def add(self, role, content):
+        """Append a message to the session."""
+        self.store.append(self.session_id, role, content)
+
+    def extend(self, messages):
+        """Append messages, e.g. a tool-calling exchange, to the session."""
+        self.store.extend(self.session_id, messages)
+
+    @property
+    def messages(self):
+        """Messages to send to the model: system, then the recent turns."""
+        system = []
+        if self.system_prompt:
+            system = [{"role": "system", "content": self.system_prompt}]
+        budget = self.max_tokens - estimate_tokens(system)
+        return system + self.store.load(self.session_id, max_tokens=budget)
+
+    @property
+    def token_count(self):
+        """Estimated tokens of the messages currently sent to the model."""
+        return estimate_tokens(self.messages)
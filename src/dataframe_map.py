@@ -0,0 +1,272 @@
+"""Apply a prompt to every row of a Polars or pandas DataFrame column.
+
+Looping over rows and calling create_completion() one at a time leaves the
+connection pool idle and pays for repeated inputs again and again. llm_map()
+renders all prompts up front, sends each distinct prompt once through
+create_completions_batch(), and writes the answers back as a new column:
+
+    coded = llm_map(
+        answers, "response",
+        "Assign one topic to this survey answer: {value}",
+        client, provider, model,
+        parquet_dir="data/survey_topics",
+    )
+
+With parquet_dir, answers are written to numbered Parquet part files as they
+arrive. An interrupted run loses at most one part, and re-running the same
+call only sends the prompts that are not in the parts yet; the parts can
+also be read on their own (for example with DuckDB) while the job runs.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import string
+from pathlib import Path
+
+import pandas as pd
+import polars as pl
+
+from src.llm_client import create_completions_batch
+
+DEFAULT_PART_SIZE = 1000
+
+_PART_PATTERN = "part-*.parquet"
+
+# create_completion() options that do not change the answer, left out of
+# the key so a run with a different cache or retry policy reuses its parts
+_CLIENT_OPTIONS = frozenset(
+    {
+        "cache",
+        "cache_sampled",
+        "retry",
+        "prompt_cache",
+        "prompt_cache_messages",
+        "on_usage",
+        "ledger",
+        "single_flight",
+    }
+)
+
+
+def _column_values(df, column):
+    """Return a column as a Python list (Polars or pandas)."""
+    if isinstance(df, pl.DataFrame):
+        return df.get_column(column).to_list()
+    # pandas marks missing values with NaN, NaT or NA depending on the dtype
+    return [
+        None if pd.api.types.is_scalar(value) and pd.isna(value) else value
+        for value in df[column].tolist()
+    ]
+
+
+def _with_column(df, name, values):
+    """Return a copy of df with a new string column."""
+    if isinstance(df, pl.DataFrame):
+        return df.with_columns(pl.Series(name, values, dtype=pl.String))
+    return df.assign(**{name: values})
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def render_prompts(df, column, prompt_template):
+    """Render the prompt for every row.
+
+    Args:
+        df: Polars or pandas DataFrame
+        column: Column whose values fill the ``{value}`` field
+        prompt_template: str.format template. ``{value}`` is the column's
+                         value; any other named field is taken from the
+                         column of that name.
+
+    Returns:
+        list: One prompt per row, None where the value is missing
+
+    """
+    fields = {
+        re.split(r"[.\[]", name, maxsplit=1)[0]
+        for _, name, _, _ in string.Formatter().parse(prompt_template)
+        if name is not None
+    }
+    if "" in fields:
+        raise ValueError("prompt_template fields must be named, e.g. {value}")
+    others = {name: _column_values(df, name) for name in sorted(fields - {"value"})}
+    values = _column_values(df, column)
+    if not others:
+        return [
+            None if _is_missing(value) else prompt_template.format(value=value)
+            for value in values
+        ]
+    return [
+        None
+        if _is_missing(value)
+        else prompt_template.format(
+            value=value, **{name: other[row] for name, other in others.items()}
+        )
+        for row, value in enumerate(values)
+    ]
+
+
+def _prompt_key(provider, model, system_prompt, prompt, settings=None):
+    """Identify a request, so parts from other settings are never reused.
+
+    settings are the request parameters (temperature, max_tokens, ...).
+    """
+    request = [provider, model, system_prompt, prompt]
+    if settings:
+        request.append(settings)
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Parts:
+    """Numbered Parquet part files holding answers as they arrive."""
+
+    def __init__(self, directory, part_size):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.part_size = part_size
+        # After the highest part number, so a missing part cannot lead to
+        # an existing one being overwritten
+        numbers = [
+            int(path.stem.removeprefix("part-"))
+            for path in self.directory.glob(_PART_PATTERN)
+            if path.stem.removeprefix("part-").isdigit()
+        ]
+        self.next_part = max(numbers, default=-1) + 1
+        self.rows = []
+
+    def load(self):
+        """Return {key: response} from the existing parts."""
+        if self.next_part == 0:
+            return {}
+        parts = pl.read_parquet(self.directory / _PART_PATTERN)
+        return dict(zip(parts["key"], parts["response"], strict=True))
+
+    def add(self, key, prompt, response):
+        self.rows.append((key, prompt, response))
+        if len(self.rows) >= self.part_size:
+            self.flush()
+
+    def flush(self):
+        """Atomically write buffered rows as the next part."""
+        if not self.rows:
+            return
+        path = self.directory / f"part-{self.next_part:05d}.parquet"
+        temporary = path.with_name(path.name + ".tmp")
+        pl.DataFrame(
+            self.rows,
+            schema={"key": pl.String, "prompt": pl.String, "response": pl.String},
+            orient="row",
+        ).write_parquet(temporary)
+        os.replace(temporary, path)
+        self.next_part += 1
+        self.rows = []
+
+
+def llm_map(
+    df,
+    column,
+    prompt_template,
+    client,
+    provider,
+    model,
+    output_column=None,
+    system_prompt=None,
+    max_concurrency=8,
+    parquet_dir=None,
+    part_size=DEFAULT_PART_SIZE,
+    errors="raise",
+    on_progress=None,
+    **kwargs,
+):
+    """Run a prompt over a DataFrame column and add the answers as a column.
+
+    Args:
+        df: Polars or pandas DataFrame (not modified)
+        column: Input column, available as ``{value}`` in the template
+        prompt_template: str.format template for the user message (see
+                         render_prompts())
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        output_column: Name of the new column (default: column + "_llm")
+        system_prompt: Optional system message sent with every prompt
+        max_concurrency: Maximum number of requests in flight at once
+        parquet_dir: Optional directory for Parquet part files; answers
+                     already in it are reused instead of requested again
+        part_size: Answers per part file
+        errors: "raise" to stop at the first failed request, or "null" to
+                leave failed rows empty and carry on
+        on_progress: Optional callback(done, total) called after each
+                     request, where total counts distinct prompts to send
+        **kwargs: Additional parameters for create_completion()
+                  (temperature, cache, retry, ledger, etc.)
+
+    Returns:
+        DataFrame: A copy of df (same type) with the answers in
+                   output_column; rows with a missing input get None
+
+    Raises:
+        Exception: The first failed request's error, with errors="raise"
+
+    """
+    if errors not in ("raise", "null"):
+        raise ValueError(f"errors must be 'raise' or 'null', got {errors!r}")
+    if kwargs.get("return_result"):
+        raise ValueError("llm_map() stores answer text; return_result is unsupported")
+    output_column = output_column or f"{column}_llm"
+
+    prompts = render_prompts(df, column, prompt_template)
+    # Each distinct prompt is sent once; dict keeps first-seen order
+    distinct = dict.fromkeys(prompt for prompt in prompts if prompt is not None)
+
+    settings = {
+        name: value for name, value in kwargs.items() if name not in _CLIENT_OPTIONS
+    }
+    answers = {}
+    parts = None
+    if parquet_dir is not None:
+        parts = _Parts(parquet_dir, part_size)
+        known = parts.load()
+        for prompt in distinct:
+            key = _prompt_key(provider, model, system_prompt, prompt, settings)
+            if key in known:
+                answers[prompt] = known[key]
+
+    todo = [prompt for prompt in distinct if prompt not in answers]
+    system = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    message_lists = (system + [{"role": "user", "content": prompt}] for prompt in todo)
+
+    try:
+        results = create_completions_batch(
+            client,
+            provider,
+            model,
+            message_lists,
+            max_concurrency=max_concurrency,
+            ordered=False,
+            **kwargs,
+        )
+        for done, result in enumerate(results, start=1):
+            if result["error"] is not None:
+                if errors == "raise":
+                    raise result["error"]
+            else:
+                prompt = todo[result["index"]]
+                answers[prompt] = result["response"]
+                if parts is not None:
+                    key = _prompt_key(provider, model, system_prompt, prompt, settings)
+                    parts.add(key, prompt, result["response"])
+            if on_progress is not None:
+                on_progress(done, len(todo))
+    finally:
+        if parts is not None:
+            parts.flush()
+
+    values = [None if prompt is None else answers.get(prompt) for prompt in prompts]
+    return _with_column(df, output_column, values)
@@ -0,0 +1,689 @@
+"""OpenAI-compatible HTTP gateway in front of the adapters.
+
+Every service that embeds its own client opens its own connections, holds
+its own API keys and applies its own limits. The gateway is one asyncio
+process that does this for all of them:
+
+    python -m src.gateway --port 8080
+
+Consumers then use any OpenAI client, whichever provider serves the model:
+
+    client = OpenAI(base_url="http://localhost:8080/v1", api_key="unused")
+    client.chat.completions.create(model="claude-haiku-4-5", messages=...)
+
+POST /v1/chat/completions accepts the common OpenAI request fields and
+answers in the OpenAI format, streamed as server-sent events (SSE) when
+"stream" is true. The model picks the provider: "anthropic/<model>" or
+"openai/<model>", otherwise Anthropic for "claude-*" and OpenAI for the
+rest, or a Router alias when the gateway has a router. Fields the adapters
+cannot support (tools, response_format, stop, n > 1, ...) are rejected with
+a 400 rather than silently ignored.
+
+All requests share one pooled async client per provider, so many client
+streams reuse the same upstream connections. A stream is only read from the
+provider as fast as its client reads the gateway's response: when the
+client falls behind, the write buffer fills and upstream reads pause, and a
+client that stops reading for write_timeout seconds is disconnected. On
+stop() (SIGINT or SIGTERM from the command line) the gateway stops
+accepting connections and lets in-flight requests finish for up to
+drain_timeout seconds before cancelling them.
+
+GET /health reports "ok" or "draining" and the number of active requests.
+WebSocket transport is not provided; SSE is what OpenAI clients speak.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import http
+import json
+import signal
+import time
+import uuid
+
+from src.llm_client import (
+    DEFAULT_MAX_CONNECTIONS,
+    acreate_completion,
+    acreate_streaming_completion,
+    get_async_client,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_MAX_CONCURRENCY = 256
+DEFAULT_MAX_PENDING = 1024
+DEFAULT_WRITE_BUFFER = 64 * 1024
+DEFAULT_WRITE_TIMEOUT = 30.0
+DEFAULT_DRAIN_TIMEOUT = 30.0
+DEFAULT_MAX_BODY_SIZE = 4 * 1024 * 1024
+
+MAX_HEADERS = 100
+
+# Request fields passed on to the adapters
+_PASSTHROUGH = ("max_tokens", "temperature", "top_p")
+
+# Every other request field the gateway understands; "user" is only a label
+_SUPPORTED = frozenset(
+    {
+        "model",
+        "messages",
+        "stream",
+        "stream_options",
+        "max_completion_tokens",
+        "n",
+        "user",
+        *_PASSTHROUGH,
+    }
+)
+
+_FINISH_REASONS = {
+    "end_turn": "stop",
+    "stop_sequence": "stop",
+    "max_tokens": "length",
+    "tool_use": "tool_calls",
+}
+
+
+class GatewayError(Exception):
+    """An error answered with an HTTP status and an OpenAI error body."""
+
+    def __init__(self, status, message, error_type="invalid_request_error"):
+        """Create the error.
+
+        Args:
+            status: HTTP status code
+            message: Error message for the client
+            error_type: OpenAI error type
+
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.error_type = error_type
+
+
+def resolve_model(model):
+    """Return (provider, model name) for a requested model.
+
+    "anthropic/<model>" and "openai/<model>" name the provider explicitly;
+    otherwise "claude-*" models are Anthropic's and the rest OpenAI's.
+    """
+    provider, separator, name = model.partition("/")
+    if separator and provider in ("openai", "anthropic"):
+        return provider, name
+    if model.startswith("claude"):
+        return "anthropic", model
+    return "openai", model
+
+
+def _upstream_error(error):
+    """Convert an adapter error into a GatewayError."""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return GatewayError(status, str(error), "upstream_error")
+    if "Timeout" in type(error).__name__:
+        return GatewayError(504, "Upstream request timed out", "upstream_error")
+    return GatewayError(502, f"Upstream request failed: {error}", "upstream_error")
+
+
+_ROLES = frozenset({"system", "user", "assistant"})
+
+
+def _validate_messages(messages):
+    """Reject messages the adapters cannot send, before calling upstream."""
+    if not messages:
+        raise GatewayError(400, "'messages' must not be empty")
+    for index, message in enumerate(messages):
+        if not isinstance(message, dict):
+            raise GatewayError(400, f"messages[{index}] must be an object")
+        if message.get("role") not in _ROLES:
+            raise GatewayError(
+                400, f"messages[{index}].role must be one of {sorted(_ROLES)}"
+            )
+        content = message.get("content")
+        if not (
+            isinstance(content, str)
+            or isinstance(content, list)
+            and all(isinstance(part, dict) and "type" in part for part in content)
+        ):
+            raise GatewayError(
+                400,
+                f"messages[{index}].content must be a string or a list of "
+                "content parts",
+            )
+
+
+def _error_body(error):
+    return {"error": {"message": error.message, "type": error.error_type, "code": None}}
+
+
+class _Request:
+    """One parsed HTTP request."""
+
+    __slots__ = ("method", "path", "headers", "body", "keep_alive")
+
+    def __init__(self, method, path, headers, body, keep_alive):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+
+async def _read_request(reader, max_body_size):
+    """Read one request from a connection, or None at end of stream."""
+    try:
+        line = await reader.readline()
+    except ValueError as error:
+        raise GatewayError(431, "Request line too long") from error
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError as error:
+        raise GatewayError(400, "Malformed request line") from error
+
+    headers = {}
+    while True:
+        try:
+            line = await reader.readline()
+        except ValueError as error:
+            raise GatewayError(431, "Header line too long") from error
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > MAX_HEADERS:
+            raise GatewayError(431, "Too many headers")
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise GatewayError(411, "Chunked request bodies are not supported")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError as error:
+        raise GatewayError(400, "Invalid Content-Length") from error
+    if length > max_body_size:
+        raise GatewayError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        keep_alive = connection != "close"
+    else:
+        keep_alive = connection == "keep-alive"
+    return _Request(method, target.split("?", 1)[0], headers, body, keep_alive)
+
+
+def _head(status, headers, keep_alive):
+    lines = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _chat_completion(result, model):
+    """Build an OpenAI chat.completion object from a CompletionResult."""
+    return {
+        "id": result.response_id or f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": result.text},
+                "finish_reason": _FINISH_REASONS.get(
+                    result.stop_reason, result.stop_reason
+                ),
+            }
+        ],
+        "usage": {
+            "prompt_tokens": result.input_tokens,
+            "completion_tokens": result.output_tokens,
+            "total_tokens": result.input_tokens + result.output_tokens,
+        },
+    }
+
+
+class Gateway:
+    """asyncio HTTP server exposing the adapters as an OpenAI-style API."""
+
+    def __init__(
+        self,
+        host=DEFAULT_HOST,
+        port=DEFAULT_PORT,
+        *,
+        clients=None,
+        router=None,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        max_pending=DEFAULT_MAX_PENDING,
+        write_buffer=DEFAULT_WRITE_BUFFER,
+        write_timeout=DEFAULT_WRITE_TIMEOUT,
+        drain_timeout=DEFAULT_DRAIN_TIMEOUT,
+        max_body_size=DEFAULT_MAX_BODY_SIZE,
+        api_keys=None,
+        retry=None,
+        rate_limiter=None,
+        ledger=None,
+    ):
+        """Configure the gateway (call start() or serve()).
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            clients: Optional dict of provider -> async client. By default
+                     each provider's client comes from get_async_client().
+            router: Optional Router; its model aliases are served through
+                    it (streams use its fastest route, without failover)
+            max_connections: Upstream connections per provider
+            max_concurrency: Upstream requests in flight at once
+            max_pending: Requests allowed to wait for a slot; beyond this
+                         the gateway answers 429
+            write_buffer: Bytes buffered per client connection before
+                          upstream reads pause
+            write_timeout: Seconds a client may leave the buffer full
+                           before it is disconnected
+            drain_timeout: Seconds stop() waits for in-flight requests
+            max_body_size: Largest accepted request body in bytes
+            api_keys: Optional set of keys consumers must send as
+                      "Authorization: Bearer <key>"
+            retry: Optional RetryPolicy for upstream requests
+            rate_limiter: Optional RateLimiter pacing upstream requests
+                          (ignored for clients passed in)
+            ledger: Optional UsageLedger recording every upstream call
+
+        """
+        self.host = host
+        self.port = port
+        self.clients = clients
+        self.router = router
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.write_buffer = write_buffer
+        self.write_timeout = write_timeout
+        self.drain_timeout = drain_timeout
+        self.max_body_size = max_body_size
+        self.api_keys = set(api_keys) if api_keys is not None else None
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.ledger = ledger
+
+        self.active = 0
+        self.pending = 0
+        self.draining = False
+        self._server = None
+        self._slots = None
+        self._idle = None
+        # Open connections: writer -> [handler task, busy]
+        self._connections = {}
+
+    async def start(self):
+        """Start listening; returns once the socket is bound."""
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self, drain_timeout=None):
+        """Stop accepting requests and drain the ones in flight.
+
+        Args:
+            drain_timeout: Seconds to wait for in-flight requests before
+                           cancelling them (default: the gateway's)
+
+        """
+        if self._server is None:
+            return
+        drain_timeout = self.drain_timeout if drain_timeout is None else drain_timeout
+        self.draining = True
+        self._server.close()
+        for writer, (_, busy) in list(self._connections.items()):
+            if not busy:
+                writer.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), drain_timeout)
+        except TimeoutError:
+            for task, busy in list(self._connections.values()):
+                if busy:
+                    task.cancel()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def serve(self):
+        """Serve until SIGINT or SIGTERM, then drain and stop."""
+        await self.start()
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set)
+        try:
+            await stopping.wait()
+        finally:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+            await self.stop()
+
+    def _client(self, provider):
+        if self.clients is not None:
+            client = self.clients.get(provider)
+            if client is None:
+                raise GatewayError(503, f"Provider {provider} is not configured")
+            return client
+        kwargs = {"max_retries": 0} if self.retry is not None else {}
+        try:
+            return get_async_client(
+                provider,
+                max_connections=self.max_connections,
+                rate_limiter=self.rate_limiter,
+                **kwargs,
+            )
+        except ValueError as error:
+            raise GatewayError(503, str(error)) from error
+
+    async def _handle_connection(self, reader, writer):
+        """Serve requests on one connection until it closes."""
+        writer.transport.set_write_buffer_limits(high=self.write_buffer)
+        state = self._connections[writer] = [asyncio.current_task(), False]
+        try:
+            while not self.draining:
+                try:
+                    request = await _read_request(reader, self.max_body_size)
+                except GatewayError as error:
+                    await self._send_json(
+                        writer, error.status, _error_body(error), keep_alive=False
+                    )
+                    break
+                if request is None:
+                    break
+                state[1] = True
+                self._begin()
+                try:
+                    keep_alive = await self._handle_request(request, writer)
+                finally:
+                    state[1] = False
+                    self._end()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, TimeoutError):
+            # The client went away or stopped reading
+            pass
+        finally:
+            del self._connections[writer]
+            writer.close()
+            with contextlib.suppress(ConnectionError, TimeoutError):
+                await asyncio.wait_for(writer.wait_closed(), self.write_timeout)
+
+    def _begin(self):
+        self.active += 1
+        self._idle.clear()
+
+    def _end(self):
+        self.active -= 1
+        if self.active == 0:
+            self._idle.set()
+
+    async def _handle_request(self, request, writer):
+        """Answer one request; returns whether to keep the connection."""
+        keep_alive = request.keep_alive and not self.draining
+        try:
+            if request.path == "/health" and request.method == "GET":
+                body = {
+                    "status": "draining" if self.draining else "ok",
+                    "active": self.active,
+                    "pending": self.pending,
+                }
+                await self._send_json(writer, 200, body, keep_alive)
+                return keep_alive
+            if request.path != "/v1/chat/completions":
+                raise GatewayError(404, f"Unknown path {request.path}")
+            if request.method != "POST":
+                raise GatewayError(405, "Use POST")
+            self._authorize(request)
+            return await self._chat_completions(request, writer, keep_alive)
+        except GatewayError as error:
+            headers = {"Retry-After": "1"} if error.status in (429, 503) else None
+            await self._send_json(
+                writer, error.status, _error_body(error), keep_alive, headers
+            )
+            return keep_alive
+        except (ConnectionError, asyncio.IncompleteReadError, TimeoutError):
+            raise
+        except Exception as error:
+            # A bug must still get an answer rather than a dropped connection
+            error = GatewayError(
+                500, f"Internal gateway error: {type(error).__name__}", "server_error"
+            )
+            await self._send_json(writer, 500, _error_body(error), keep_alive=False)
+            return False
+
+    def _authorize(self, request):
+        if self.api_keys is None:
+            return
+        scheme, _, key = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or key not in self.api_keys:
+            raise GatewayError(401, "Invalid API key", "authentication_error")
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        """Hold one of the max_concurrency upstream slots."""
+        if self._slots.locked() and self.pending >= self.max_pending:
+            raise GatewayError(429, "Too many requests queued", "rate_limit_error")
+        self.pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.pending -= 1
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    async def _chat_completions(self, request, writer, keep_alive):
+        try:
+            body = json.loads(request.body)
+        except ValueError as error:
+            raise GatewayError(400, f"Invalid JSON: {error}") from error
+        if not isinstance(body, dict):
+            raise GatewayError(400, "Request body must be a JSON object")
+        model = body.get("model")
+        messages = body.get("messages")
+        if not isinstance(model, str) or not isinstance(messages, list):
+            raise GatewayError(400, "'model' and 'messages' are required")
+        _validate_messages(messages)
+
+        unsupported = sorted(
+            name
+            for name, value in body.items()
+            if name not in _SUPPORTED and value is not None
+        )
+        if unsupported:
+            raise GatewayError(400, f"Unsupported fields: {', '.join(unsupported)}")
+        if body.get("n") not in (None, 1):
+            raise GatewayError(400, "Only n=1 is supported")
+
+        params = {name: body[name] for name in _PASSTHROUGH if name in body}
+        if "max_completion_tokens" in body:
+            params["max_tokens"] = body["max_completion_tokens"]
+
+        if body.get("stream"):
+            include_usage = bool(
+                (body.get("stream_options") or {}).get("include_usage")
+            )
+            await self._stream(
+                writer, model, messages, params, include_usage, keep_alive
+            )
+        else:
+            result = await self._complete(model, messages, params)
+            await self._send_json(
+                writer, 200, _chat_completion(result, model), keep_alive
+            )
+        return keep_alive
+
+    def _is_alias(self, model):
+        """Return True if the router serves model; 503 if it has no routes."""
+        if self.router is None or model not in self.router.routes:
+            return False
+        if not self.router.routes[model]:
+            raise GatewayError(503, f"No provider is configured for {model!r}")
+        return True
+
+    def _route(self, model):
+        """Return (provider, model name) for a requested model."""
+        if self._is_alias(model):
+            route = self.router.ranked_routes(model)[0]
+            return route.provider, route.model
+        return resolve_model(model)
+
+    async def _complete(self, model, messages, params):
+        async with self._slot():
+            try:
+                if self._is_alias(model):
+                    return await self.router.acreate_completion(
+                        messages, model, return_result=True, **params
+                    )
+                provider, name = resolve_model(model)
+                return await acreate_completion(
+                    self._client(provider),
+                    provider,
+                    name,
+                    messages,
+                    retry=self.retry,
+                    ledger=self.ledger,
+                    return_result=True,
+                    **params,
+                )
+            except GatewayError:
+                raise
+            except Exception as error:
+                raise _upstream_error(error) from error
+
+    async def _stream(self, writer, model, messages, params, include_usage, keep_alive):
+        """Relay an upstream stream as OpenAI chat.completion.chunk events."""
+        provider, name = self._route(model)
+        usage = {}
+        stop = []
+        async with self._slot():
+            chunks = acreate_streaming_completion(
+                self._client(provider),
+                provider,
+                name,
+                messages,
+                retry=self.retry,
+                on_usage=usage.update if include_usage else None,
+                on_stop=stop.append,
+                **params,
+            )
+            async with contextlib.aclosing(chunks):
+                # Wait for the first chunk so upstream errors get a status
+                try:
+                    first = await anext(chunks, None)
+                except Exception as error:
+                    raise _upstream_error(error) from error
+
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                created = int(time.time())
+
+                def event(delta=None, finish_reason=None, **extra):
+                    choices = []
+                    if delta is not None:
+                        choices.append(
+                            {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                        )
+                    payload = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": choices,
+                        **extra,
+                    }
+                    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+                headers = {
+                    "Content-Type": "text/event-stream",
+                    "Cache-Control": "no-cache",
+                    "Transfer-Encoding": "chunked",
+                }
+                writer.write(_head(200, headers, keep_alive))
+                await self._write_chunk(writer, event({"role": "assistant"}))
+                if first is not None:
+                    await self._write_chunk(writer, event({"content": first}))
+                try:
+                    async for text in chunks:
+                        await self._write_chunk(writer, event({"content": text}))
+                except (ConnectionError, TimeoutError):
+                    raise
+                except Exception as error:
+                    # Headers are sent: report the error in the stream
+                    error = _upstream_error(error)
+                    await self._write_chunk(
+                        writer, f"data: {json.dumps(_error_body(error))}\n\n"
+                    )
+                else:
+                    reason = stop[-1] if stop else "stop"
+                    finish_reason = _FINISH_REASONS.get(reason, reason)
+                    await self._write_chunk(writer, event({}, finish_reason))
+                    if include_usage and usage:
+                        # The usage chunk has no choices, as in the OpenAI API
+                        await self._write_chunk(
+                            writer,
+                            event(
+                                usage={
+                                    "prompt_tokens": usage["input_tokens"],
+                                    "completion_tokens": usage["output_tokens"],
+                                    "total_tokens": usage["input_tokens"]
+                                    + usage["output_tokens"],
+                                },
+                            ),
+                        )
+                await self._write_chunk(writer, "data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await self._drain(writer)
+
+    async def _write_chunk(self, writer, text):
+        """Write one chunked-encoding chunk, waiting while the client lags."""
+        data = text.encode("utf-8")
+        writer.write(b"%X\r\n%s\r\n" % (len(data), data))
+        await self._drain(writer)
+
+    async def _drain(self, writer):
+        # drain() returns at once unless the write buffer is above its limit
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    async def _send_json(self, writer, status, body, keep_alive, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        head = {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(data)),
+            **(headers or {}),
+        }
+        writer.write(_head(status, head, keep_alive) + data)
+        await self._drain(writer)
+
+
+def main():
+    """Run the gateway until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--drain-timeout", type=float, default=DEFAULT_DRAIN_TIMEOUT)
+    args = parser.parse_args()
+
+    gateway = Gateway(
+        args.host,
+        args.port,
+        max_concurrency=args.max_concurrency,
+        drain_timeout=args.drain_timeout,
+    )
+    asyncio.run(gateway.serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,63 @@ This module provides a unified interface for working with multiple LLM providers
 while keeping the API differences visible for educational purposes.
 """
 
+import asyncio
+import contextlib
+import functools
+import hashlib
 import os
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-from anthropic import Anthropic
-from dotenv import load_dotenv
-from openai import OpenAI
+from src.response_cache import make_cache_key
+from src.tools import loads as json_loads
 
-# Load environment variables from .env file
-load_dotenv()
+# The provider SDKs (and httpx) take about a second to import, so they are
+# imported inside the functions that build clients: a process only pays
+# for the SDK it actually uses, and only when it first needs a client.
+
+# Connection pool defaults shared by every client built in get_client()
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_MAX_RETRIES = 2
+
+# Marker that makes Anthropic cache a prompt prefix for about five minutes
+_EPHEMERAL_CACHE = {"type": "ephemeral"}
+
+# Process-wide client registry: key -> (client, http_client)
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Async clients are tied to the event loop that opened their connections:
+# loop -> {key: (client, http_client)}. Clients created outside a running
+# loop are kept separately because None cannot be a weak key.
+_async_clients = weakref.WeakKeyDictionary()
+_async_clients_without_loop = {}
+
+
+@functools.cache
+def load_env():
+    """Load environment variables from the .env file (once per process).
+
+    Called automatically before provider detection and client creation;
+    variables already set in the environment take precedence.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
 
 
 def get_provider():
     """Detect and return which provider to use.
 
     Detection order:
-    1. Check LLM_PROVIDER environment variable ("openai" or "anthropic")
+    1. Check LLM_PROVIDER environment variable ("openai" or "anthropic";
+       "replay" serves recorded responses, see src/replay.py, and returns
+       the provider the recordings are for)
     2. Auto-detect based on available API keys:
        - Only ANTHROPIC_API_KEY → use Anthropic
        - Only OPENAI_API_KEY → use OpenAI
@@ -32,13 +74,19 @@ def get_provider():
         ValueError: If no API keys are found or invalid provider specified
 
     """
+    load_env()
+
     # Check for explicit provider selection
     explicit_provider = os.getenv("LLM_PROVIDER", "").lower()
+    if explicit_provider == "replay":
+        from src.replay import replay_provider
+
+        return replay_provider()
     if explicit_provider:
         if explicit_provider not in ["openai", "anthropic"]:
             raise ValueError(
                 f"Invalid LLM_PROVIDER: {explicit_provider}. "
-                "Must be 'openai' or 'anthropic'"
+                "Must be 'openai', 'anthropic' or 'replay'"
             )
         return explicit_provider
 
@@ -62,12 +110,84 @@ def get_provider():
     return "openai"
 
 
-def get_client(provider=None):
+def _get_api_key(provider):
+    """Return the API key for a provider, raising a helpful error if missing."""
+    if provider == "openai":
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "OPENAI_API_KEY not found. Get one from: "
+                "https://platform.openai.com/api-keys"
+            )
+        return api_key
+
+    if provider == "anthropic":
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "ANTHROPIC_API_KEY not found. Get one from: "
+                "https://console.anthropic.com/settings/keys"
+            )
+        return api_key
+
+    raise ValueError(f"Invalid provider: {provider}")
+
+
+def _get_credentials(provider):
+    """Return (api_key, replay settings) for building a client.
+
+    Replay settings are None unless LLM_PROVIDER=replay. Playing back
+    recordings needs no API key, so without one replay falls back to
+    playback-only mode.
+    """
+    load_env()
+    if os.getenv("LLM_PROVIDER", "").lower() != "replay":
+        return _get_api_key(provider), None
+
+    from src.replay import replay_settings
+
+    mode, path, timing = replay_settings()
+    if mode == "record":
+        return _get_api_key(provider), (mode, path, timing)
+    key_name = "OPENAI_API_KEY" if provider == "openai" else "ANTHROPIC_API_KEY"
+    api_key = os.getenv(key_name)
+    if not api_key:
+        return "replay", ("playback", path, timing)
+    return api_key, (mode, path, timing)
+
+
+def get_client(
+    provider=None,
+    *,
+    max_connections=DEFAULT_MAX_CONNECTIONS,
+    max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries=DEFAULT_MAX_RETRIES,
+    rate_limiter=None,
+    warm=False,
+):
     """Get an authenticated LLM client.
 
+    Clients are shared process-wide: calls with the same provider, API key and
+    connection settings return the same instance, so every caller reuses one
+    pool of keep-alive connections instead of paying a new TLS handshake.
+    Because the instance is shared, do not close it yourself; use
+    close_clients() at shutdown instead.
+
     Args:
         provider: Optional provider override ("openai" or "anthropic").
                  If not specified, uses get_provider() to auto-detect.
+        max_connections: Maximum number of concurrent HTTP connections
+        max_keepalive_connections: Maximum number of idle connections kept open
+        keepalive_expiry: Seconds an idle connection is kept before closing
+        timeout: Request timeout in seconds
+        max_retries: Retries performed by the SDK itself; set to 0 when
+                     using a RetryPolicy (see src/retry.py)
+        rate_limiter: Optional RateLimiter that paces every request sent
+                      through this client (see src/rate_limit.py)
+        warm: If True, open a connection to the API right away so the first
+              request does not pay for the handshake (see warm_client)
 
     Returns:
         OpenAI or Anthropic: An authenticated client instance
@@ -79,25 +199,316 @@ def get_client(provider=None):
     if provider is None:
         provider = get_provider()
 
-    if provider == "openai":
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError(
-                "OPENAI_API_KEY not found. Get one from: "
-                "https://platform.openai.com/api-keys"
+    api_key, replay = _get_credentials(provider)
+    limits = _make_limits(max_connections, max_keepalive_connections, keepalive_expiry)
+    key = _client_key(
+        provider, api_key, limits, timeout, max_retries, rate_limiter, replay
+    )
+
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is None:
+            event_hooks = rate_limiter.event_hooks(provider) if rate_limiter else None
+            entry = _create_client(
+                provider, api_key, limits, timeout, max_retries, event_hooks, replay
             )
-        return OpenAI(api_key=api_key)
+            _clients[key] = entry
 
-    if provider == "anthropic":
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError(
-                "ANTHROPIC_API_KEY not found. Get one from: "
-                "https://console.anthropic.com/settings/keys"
+    client, _ = entry
+    if warm:
+        warm_client(client)
+    return client
+
+
+def _make_limits(max_connections, max_keepalive_connections, keepalive_expiry):
+    """Build the httpx connection pool limits for a client."""
+    import httpx
+
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+
+
+def _client_key(
+    provider, api_key, limits, timeout, max_retries, rate_limiter, replay=None
+):
+    """Build a registry key; credentials are stored only as a digest."""
+    return (
+        provider,
+        hashlib.sha256(api_key.encode()).hexdigest(),
+        limits.max_connections,
+        limits.max_keepalive_connections,
+        limits.keepalive_expiry,
+        timeout,
+        max_retries,
+        rate_limiter,
+        replay,
+    )
+
+
+def _replay_transport(provider, replay, limits, use_async=False):
+    """Return the cassette transport for replay settings (None when off)."""
+    if replay is None:
+        return None
+
+    from src.replay import make_transport
+
+    return make_transport(provider, replay, limits, use_async=use_async)
+
+
+def _create_client(
+    provider, api_key, limits, timeout, max_retries, event_hooks=None, replay=None
+):
+    """Build a new SDK client on top of its own pooled HTTP client.
+
+    Returns:
+        tuple: (client, http_client)
+
+    """
+    transport = _replay_transport(provider, replay, limits)
+    if replay is not None and replay[0] == "playback":
+        # A recording does not change on retry
+        max_retries = 0
+    if provider == "openai":
+        from openai import DefaultHttpxClient, OpenAI
+
+        http_client = DefaultHttpxClient(
+            limits=limits, timeout=timeout, event_hooks=event_hooks, transport=transport
+        )
+        client = OpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=max_retries,
+        )
+    else:
+        from anthropic import Anthropic, DefaultHttpxClient
+
+        http_client = DefaultHttpxClient(
+            limits=limits, timeout=timeout, event_hooks=event_hooks, transport=transport
+        )
+        client = Anthropic(
+            api_key=api_key,
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=max_retries,
+        )
+    return client, http_client
+
+
+def warm_client(client, connections=1):
+    """Open connections to the provider ahead of the first request.
+
+    Sends lightweight unauthenticated HEAD requests to the API host so that
+    DNS lookup and the TLS handshake happen now and the resulting keep-alive
+    connections sit in the client's pool. Warm-up is best effort: network
+    errors are ignored and will surface on the first real request instead.
+
+    Args:
+        client: A client returned by get_client()
+        connections: Number of connections to open in parallel
+
+    """
+    http_client = _find_http_client(client)
+    if http_client is None:
+        raise ValueError("warm_client() only works with clients from get_client()")
+
+    import httpx
+
+    url = str(client.base_url)
+
+    def _ping():
+        with contextlib.suppress(httpx.HTTPError):
+            http_client.head(url)
+
+    if connections <= 1:
+        _ping()
+        return
+
+    threads = [threading.Thread(target=_ping) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _find_http_client(client):
+    """Return the pooled HTTP client behind a registry client, if any."""
+    with _clients_lock:
+        for registered, http_client in _clients.values():
+            if registered is client:
+                return http_client
+    return None
+
+
+def close_clients():
+    """Close every pooled client and empty the registry.
+
+    Call this at shutdown (or in tests) to release open connections. Later
+    calls to get_client() will build fresh clients.
+    """
+    with _clients_lock:
+        entries = list(_clients.values())
+        _clients.clear()
+
+    for client, _ in entries:
+        client.close()
+
+
+def get_async_client(
+    provider=None,
+    *,
+    max_connections=DEFAULT_MAX_CONNECTIONS,
+    max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries=DEFAULT_MAX_RETRIES,
+    rate_limiter=None,
+):
+    """Get an authenticated async LLM client for use with the a* adapters.
+
+    Async connections belong to the event loop that opened them, so clients
+    are shared per running loop (rather than process-wide like get_client()).
+    Call this from inside the loop that will use the client, e.g. within an
+    ``async def`` or a Jupyter cell.
+
+    Args:
+        provider: Optional provider override ("openai" or "anthropic").
+                 If not specified, uses get_provider() to auto-detect.
+        max_connections: Maximum number of concurrent HTTP connections
+        max_keepalive_connections: Maximum number of idle connections kept open
+        keepalive_expiry: Seconds an idle connection is kept before closing
+        timeout: Request timeout in seconds
+        max_retries: Retries performed by the SDK itself; set to 0 when
+                     using a RetryPolicy (see src/retry.py)
+        rate_limiter: Optional RateLimiter that paces every request sent
+                      through this client (see src/rate_limit.py)
+
+    Returns:
+        AsyncOpenAI or AsyncAnthropic: An authenticated async client instance
+
+    Raises:
+        ValueError: If provider is invalid or API key is missing
+
+    """
+    if provider is None:
+        provider = get_provider()
+
+    api_key, replay = _get_credentials(provider)
+    limits = _make_limits(max_connections, max_keepalive_connections, keepalive_expiry)
+    key = _client_key(
+        provider, api_key, limits, timeout, max_retries, rate_limiter, replay
+    )
+
+    with _clients_lock:
+        loop = _running_loop()
+        if loop is None:
+            loop_clients = _async_clients_without_loop
+        else:
+            loop_clients = _async_clients.setdefault(loop, {})
+        entry = loop_clients.get(key)
+        if entry is None:
+            event_hooks = (
+                rate_limiter.async_event_hooks(provider) if rate_limiter else None
             )
-        return Anthropic(api_key=api_key)
+            entry = _create_async_client(
+                provider, api_key, limits, timeout, max_retries, event_hooks, replay
+            )
+            loop_clients[key] = entry
+
+    return entry[0]
 
-    raise ValueError(f"Invalid provider: {provider}")
+
+def _running_loop():
+    """Return the running event loop, or None when called outside one."""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _create_async_client(
+    provider, api_key, limits, timeout, max_retries, event_hooks=None, replay=None
+):
+    """Build a new async SDK client on top of its own pooled HTTP client.
+
+    Returns:
+        tuple: (client, http_client)
+
+    """
+    transport = _replay_transport(provider, replay, limits, use_async=True)
+    if replay is not None and replay[0] == "playback":
+        max_retries = 0
+    if provider == "openai":
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        http_client = DefaultAsyncHttpxClient(
+            limits=limits, timeout=timeout, event_hooks=event_hooks, transport=transport
+        )
+        client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=max_retries,
+        )
+    else:
+        from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+
+        http_client = DefaultAsyncHttpxClient(
+            limits=limits, timeout=timeout, event_hooks=event_hooks, transport=transport
+        )
+        client = AsyncAnthropic(
+            api_key=api_key,
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=max_retries,
+        )
+    return client, http_client
+
+
+async def awarm_client(client, connections=1):
+    """Async version of warm_client() for clients from get_async_client().
+
+    Args:
+        client: A client returned by get_async_client()
+        connections: Number of connections to open concurrently
+
+    """
+    http_client = None
+    with _clients_lock:
+        for loop_clients in [_async_clients_without_loop, *_async_clients.values()]:
+            for registered, candidate in loop_clients.values():
+                if registered is client:
+                    http_client = candidate
+    if http_client is None:
+        raise ValueError(
+            "awarm_client() only works with clients from get_async_client()"
+        )
+
+    import httpx
+
+    url = str(client.base_url)
+
+    async def _ping():
+        with contextlib.suppress(httpx.HTTPError):
+            await http_client.head(url)
+
+    await asyncio.gather(*(_ping() for _ in range(max(connections, 1))))
+
+
+async def aclose_clients():
+    """Close the async clients created on the running event loop."""
+    with _clients_lock:
+        loop_clients = dict(_async_clients_without_loop)
+        _async_clients_without_loop.clear()
+        loop = _running_loop()
+        if loop is not None:
+            loop_clients.update(_async_clients.pop(loop, {}))
+
+    for client, _ in loop_clients.values():
+        await client.close()
 
 
 def _extract_system_message(messages):
@@ -156,7 +567,336 @@ def _convert_tools_to_anthropic(tools):
     return anthropic_tools
 
 
-def create_completion(client, provider, model, messages, **kwargs):
+def _tool_definitions(tools, provider):
+    """Return tool definitions in a provider's format.
+
+    A ToolRegistry (see src/tools.py) supplies payloads it built once;
+    plain lists are taken to be in OpenAI format and converted as needed.
+    """
+    payload = getattr(tools, "payload", None)
+    if payload is not None:
+        return payload(provider)
+    if provider == "anthropic":
+        return _convert_tools_to_anthropic(tools)
+    return tools
+
+
+def _build_anthropic_request(
+    model, messages, kwargs, tools=None, *, prompt_cache=False, prompt_cache_messages=0
+):
+    """Build Anthropic request parameters from OpenAI-style inputs.
+
+    Shared by the sync and async adapters so both send identical requests.
+
+    Args:
+        model: Model name
+        messages: List of message dicts with "role" and "content"
+        kwargs: Additional parameters (max_tokens, temperature, etc.)
+        tools: Optional list of tool definitions (OpenAI format) or a
+               ToolRegistry
+        prompt_cache: Mark the system prompt and tool definitions as
+                      cacheable (see _apply_prompt_cache)
+        prompt_cache_messages: Also cache this many leading conversation
+                               messages (after the system message)
+
+    Returns:
+        dict: Keyword arguments for client.messages.create()
+
+    """
+    kwargs = dict(kwargs)
+
+    # Extract system message
+    system_content, filtered_messages = _extract_system_message(messages)
+
+    # Build request parameters
+    request_params = {
+        "model": model,
+        "messages": filtered_messages,
+        "max_tokens": kwargs.pop("max_tokens", 1024),
+        **kwargs,
+    }
+
+    if tools is not None:
+        # Copied: prompt caching marks the last tool, and a registry's
+        # payload is shared between requests
+        request_params["tools"] = list(_tool_definitions(tools, "anthropic"))
+
+        # Remove tool_choice if present (different format in Anthropic)
+        request_params.pop("tool_choice", None)
+
+    if system_content:
+        request_params["system"] = system_content
+
+    if prompt_cache or prompt_cache_messages:
+        _apply_prompt_cache(request_params, prompt_cache, prompt_cache_messages)
+
+    return request_params
+
+
+def _apply_prompt_cache(request_params, cache_system, cache_messages):
+    """Add Anthropic cache_control breakpoints to a request.
+
+    Anthropic caches everything up to and including a block marked with
+    cache_control, in the order tools -> system -> messages. Later requests
+    that start with the same prefix read it from the cache, which is cheaper
+    and lowers time-to-first-token. Prefixes shorter than the model's
+    minimum (about 1024 tokens) are silently not cached.
+
+    Args:
+        request_params: Request built by _build_anthropic_request (modified)
+        cache_system: Mark the tool definitions and system prompt
+        cache_messages: Mark the first N conversation messages as a prefix
+
+    """
+    if cache_system:
+        tools = request_params.get("tools")
+        if tools:
+            tools[-1] = {**tools[-1], "cache_control": _EPHEMERAL_CACHE}
+
+        system = request_params.get("system")
+        if system:
+            request_params["system"] = _with_cache_control(system)
+
+    if cache_messages:
+        messages = list(request_params["messages"])
+        index = min(cache_messages, len(messages)) - 1
+        if index >= 0:
+            message = messages[index]
+            messages[index] = {
+                **message,
+                "content": _with_cache_control(message["content"]),
+            }
+            request_params["messages"] = messages
+
+
+def _with_cache_control(content):
+    """Return content as text blocks with a cache breakpoint on the last one."""
+    if isinstance(content, str):
+        return [{"type": "text", "text": content, "cache_control": _EPHEMERAL_CACHE}]
+    blocks = list(content)
+    blocks[-1] = {**blocks[-1], "cache_control": _EPHEMERAL_CACHE}
+    return blocks
+
+
+def extract_usage(response, provider):
+    """Extract token usage, including prompt-cache activity, from a response.
+
+    Args:
+        response: Provider-specific response object
+        provider: Provider name ("openai" or "anthropic")
+
+    Returns:
+        dict: {"input_tokens", "output_tokens",
+               "cache_read_tokens": input tokens served from the prompt cache,
+               "cache_write_tokens": input tokens written to the prompt cache}
+
+    """
+    usage = response.usage
+    if usage is None:
+        return {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_tokens": 0,
+            "cache_write_tokens": 0,
+        }
+
+    if provider == "openai":
+        # OpenAI caches long prompts automatically and never bills writes
+        details = usage.prompt_tokens_details
+        return {
+            "input_tokens": usage.prompt_tokens,
+            "output_tokens": usage.completion_tokens,
+            "cache_read_tokens": (details.cached_tokens or 0) if details else 0,
+            "cache_write_tokens": 0,
+        }
+
+    if provider == "anthropic":
+        return {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_read_tokens": usage.cache_read_input_tokens or 0,
+            "cache_write_tokens": usage.cache_creation_input_tokens or 0,
+        }
+
+    raise ValueError(f"Invalid provider: {provider}")
+
+
+class CompletionResult:
+    """Text of a completion together with its usage accounting.
+
+    Returned by the completion adapters when called with return_result=True.
+    str(result) is the text, so a result can stand in for the plain string.
+    """
+
+    __slots__ = (
+        "text",
+        "provider",
+        "model",
+        "input_tokens",
+        "output_tokens",
+        "cache_read_tokens",
+        "cache_write_tokens",
+        "stop_reason",
+        "request_id",
+        "response_id",
+        "latency",
+        "cached",
+    )
+
+    def __init__(
+        self,
+        text,
+        provider,
+        model,
+        *,
+        input_tokens=0,
+        output_tokens=0,
+        cache_read_tokens=0,
+        cache_write_tokens=0,
+        stop_reason=None,
+        request_id=None,
+        response_id=None,
+        latency=None,
+        cached=False,
+    ):
+        """Create a result.
+
+        Args:
+            text: The response text content
+            provider: Provider name ("openai" or "anthropic")
+            model: Model name (provider-specific)
+            input_tokens: Prompt tokens billed, including cache reads
+            output_tokens: Generated tokens
+            cache_read_tokens: Input tokens served from the prompt cache
+            cache_write_tokens: Input tokens written to the prompt cache
+            stop_reason: Why generation stopped ("stop", "length",
+                         "end_turn", "max_tokens", ...)
+            request_id: Provider request ID (the x-request-id header)
+            response_id: ID of the response object
+            latency: Seconds spent waiting for the response
+            cached: True if served from a ResponseCache without a request
+
+        """
+        self.text = text
+        self.provider = provider
+        self.model = model
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_tokens = cache_read_tokens
+        self.cache_write_tokens = cache_write_tokens
+        self.stop_reason = stop_reason
+        self.request_id = request_id
+        self.response_id = response_id
+        self.latency = latency
+        self.cached = cached
+
+    @classmethod
+    def from_response(cls, response, provider, model, text, latency=None):
+        """Build a result from a provider response object."""
+        if provider == "openai":
+            choice = response.choices[0] if response.choices else None
+            stop_reason = choice.finish_reason if choice else None
+        else:
+            stop_reason = response.stop_reason
+        return cls(
+            text,
+            provider,
+            model,
+            **extract_usage(response, provider),
+            stop_reason=stop_reason,
+            request_id=getattr(response, "_request_id", None),
+            response_id=response.id,
+            latency=latency,
+        )
+
+    @property
+    def truncated(self):
+        """True if generation stopped at the token limit."""
+        return self.stop_reason in ("length", "max_tokens")
+
+    def __str__(self):
+        return self.text or ""
+
+    def __repr__(self):
+        return (
+            f"CompletionResult(provider={self.provider!r}, model={self.model!r}, "
+            f"input_tokens={self.input_tokens}, output_tokens={self.output_tokens}, "
+            f"stop_reason={self.stop_reason!r}, cached={self.cached})"
+        )
+
+
+def _account(response, provider, model, text, started, on_usage, ledger):
+    """Report a response's usage and build its CompletionResult."""
+    result = CompletionResult.from_response(
+        response, provider, model, text, time.perf_counter() - started
+    )
+    if on_usage is not None:
+        on_usage(extract_usage(response, provider))
+    if ledger is not None:
+        ledger.record(result)
+    return result
+
+
+def _cached_result(text, provider, model, ledger):
+    """Build (and record) the result for a response served from the cache."""
+    result = CompletionResult(text, provider, model, latency=0.0, cached=True)
+    if ledger is not None:
+        ledger.record(result)
+    return result
+
+
+def _send(retry, provider, fn, **params):
+    """Send a request, going through the retry policy when one is given."""
+    if retry is None:
+        return fn(**params)
+    return retry.call(provider, fn, **params)
+
+
+async def _asend(retry, provider, fn, **params):
+    """Async version of _send()."""
+    if retry is None:
+        return await fn(**params)
+    return await retry.acall(provider, fn, **params)
+
+
+def _should_use_cache(cache, kwargs, cache_sampled):
+    """Decide whether a request may be answered from the cache.
+
+    Deterministic requests (temperature=0) are always cacheable. Sampled
+    requests would normally return a different answer each time, so they
+    only use the cache when the caller opts in with cache_sampled=True.
+    Both providers default to temperature 1 when none is given.
+    """
+    if cache is None:
+        return False
+    return cache_sampled or kwargs.get("temperature", 1) == 0
+
+
+def _flight_key(client, provider, model, messages, **params):
+    """Key identifying a request for single-flight sharing.
+
+    Includes the client, since clients may point at different endpoints.
+    """
+    return make_cache_key(provider, model, messages, client=id(client), **params)
+
+
+def create_completion(
+    client,
+    provider,
+    model,
+    messages,
+    *,
+    cache=None,
+    cache_sampled=False,
+    retry=None,
+    prompt_cache=False,
+    prompt_cache_messages=0,
+    on_usage=None,
+    return_result=False,
+    ledger=None,
+    single_flight=None,
+    **kwargs,
+):
     """Create a chat completion with provider-specific handling.
 
     Args:
@@ -164,40 +904,116 @@ def create_completion(client, provider, model, messages, **kwargs):
         provider: Provider name ("openai" or "anthropic")
         model: Model name (provider-specific)
         messages: List of message dicts with "role" and "content"
+        cache: Optional ResponseCache; repeated requests are served from it
+        cache_sampled: Also use the cache when temperature > 0 (by default
+                       only temperature=0 requests are cached)
+        retry: Optional RetryPolicy for transient failures (see src/retry.py)
+        prompt_cache: Anthropic only: cache the system prompt and tool
+                      definitions so repeated calls reuse them
+        prompt_cache_messages: Anthropic only: also cache this many leading
+                               conversation messages as a shared prefix
+        on_usage: Optional callback receiving the extract_usage() dict,
+                  including prompt-cache read/write token counts
+        return_result: Return a CompletionResult (text plus tokens, stop
+                       reason, request ID and latency) instead of the text
+        ledger: Optional UsageLedger recording every call (see
+                src/usage_ledger.py)
+        single_flight: Optional SingleFlight; identical calls made while
+                       this one is in flight share its response (see
+                       src/single_flight.py)
         **kwargs: Additional parameters (temperature, etc.)
 
     Returns:
-        str: The response text content
+        str: The response text content (CompletionResult if return_result)
 
     """
-    if provider == "openai":
-        response = client.chat.completions.create(
-            model=model, messages=messages, **kwargs
+    if single_flight is not None:
+        key = _flight_key(
+            client,
+            provider,
+            model,
+            messages,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+            return_result=return_result,
+            **kwargs,
+        )
+        return single_flight.do(
+            key,
+            lambda: create_completion(
+                client,
+                provider,
+                model,
+                messages,
+                cache=cache,
+                cache_sampled=cache_sampled,
+                retry=retry,
+                prompt_cache=prompt_cache,
+                prompt_cache_messages=prompt_cache_messages,
+                on_usage=on_usage,
+                return_result=return_result,
+                ledger=ledger,
+                **kwargs,
+            ),
         )
-        return response.choices[0].message.content
 
-    if provider == "anthropic":
-        # Extract system message
-        system_content, filtered_messages = _extract_system_message(messages)
-
-        # Build request parameters
-        request_params = {
-            "model": model,
-            "messages": filtered_messages,
-            "max_tokens": kwargs.pop("max_tokens", 1024),
+    cache_key = None
+    if _should_use_cache(cache, kwargs, cache_sampled):
+        cache_key = make_cache_key(provider, model, messages, **kwargs)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            if return_result or ledger is not None:
+                result = _cached_result(cached, provider, model, ledger)
+                if return_result:
+                    return result
+            return cached
+
+    started = time.perf_counter()
+    if provider == "openai":
+        response = _send(
+            retry,
+            provider,
+            client.chat.completions.create,
+            model=model,
+            messages=messages,
             **kwargs,
-        }
-
-        if system_content:
-            request_params["system"] = system_content
-
-        response = client.messages.create(**request_params)
-        return response.content[0].text
+        )
+        text = response.choices[0].message.content
 
-    raise ValueError(f"Invalid provider: {provider}")
+    elif provider == "anthropic":
+        request_params = _build_anthropic_request(
+            model,
+            messages,
+            kwargs,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+        )
+        response = _send(retry, provider, client.messages.create, **request_params)
+        text = response.content[0].text
 
+    else:
+        raise ValueError(f"Invalid provider: {provider}")
 
-def create_streaming_completion(client, provider, model, messages, **kwargs):
+    result = _account(response, provider, model, text, started, on_usage, ledger)
+    if cache_key is not None and text is not None:
+        cache.set(cache_key, text)
+    return result if return_result else text
+
+
+def create_streaming_completion(
+    client,
+    provider,
+    model,
+    messages,
+    *,
+    retry=None,
+    prompt_cache=False,
+    prompt_cache_messages=0,
+    on_usage=None,
+    on_stop=None,
+    single_flight=None,
+    **kwargs,
+):
     """Create a streaming chat completion with provider-specific handling.
 
     Yields text chunks uniformly regardless of provider.
@@ -207,43 +1023,423 @@ def create_streaming_completion(client, provider, model, messages, **kwargs):
         provider: Provider name ("openai" or "anthropic")
         model: Model name (provider-specific)
         messages: List of message dicts with "role" and "content"
+        retry: Optional RetryPolicy; failures are retried only until the
+               first chunk arrives, so text is never duplicated
+        prompt_cache: Anthropic only: cache the system prompt and tool
+                      definitions so repeated calls reuse them
+        prompt_cache_messages: Anthropic only: also cache this many leading
+                               conversation messages as a shared prefix
+        on_usage: Optional callback receiving the extract_usage() dict,
+                  including prompt-cache read/write token counts
+        on_stop: Optional callback receiving the provider's stop reason
+                 once the stream ends (e.g. "length" or "max_tokens" when
+                 cut off at the token limit)
+        single_flight: Optional SingleFlight; identical streams started
+                       while this one is in flight receive its chunks
+                       (see src/single_flight.py)
         **kwargs: Additional parameters (temperature, etc.)
 
     Yields:
         str: Text chunks as they arrive
 
     """
+    if single_flight is not None:
+        key = _flight_key(
+            client,
+            provider,
+            model,
+            messages,
+            stream=True,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+            **kwargs,
+        )
+        yield from single_flight.stream(
+            key,
+            lambda: create_streaming_completion(
+                client,
+                provider,
+                model,
+                messages,
+                retry=retry,
+                prompt_cache=prompt_cache,
+                prompt_cache_messages=prompt_cache_messages,
+                on_usage=on_usage,
+                on_stop=on_stop,
+                **kwargs,
+            ),
+        )
+        return
+
+    if retry is not None:
+        yield from retry.iterate(
+            provider,
+            lambda: create_streaming_completion(
+                client,
+                provider,
+                model,
+                messages,
+                prompt_cache=prompt_cache,
+                prompt_cache_messages=prompt_cache_messages,
+                on_usage=on_usage,
+                on_stop=on_stop,
+                **kwargs,
+            ),
+        )
+        return
+
     if provider == "openai":
+        if on_usage is not None:
+            # Ask for a final chunk carrying the token usage
+            kwargs.setdefault("stream_options", {"include_usage": True})
         stream = client.chat.completions.create(
             model=model, messages=messages, stream=True, **kwargs
         )
-        for event in stream:
-            if event.choices and event.choices[0].delta.content:
-                yield event.choices[0].delta.content
+        # Closing the stream releases its connection if the caller stops early
+        with stream:
+            for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+                if on_stop is not None and event.choices:
+                    finish_reason = event.choices[0].finish_reason
+                    if finish_reason:
+                        on_stop(finish_reason)
+                if on_usage is not None and event.usage is not None:
+                    on_usage(extract_usage(event, provider))
 
     elif provider == "anthropic":
-        # Extract system message
-        system_content, filtered_messages = _extract_system_message(messages)
-
-        # Build request parameters
-        request_params = {
-            "model": model,
-            "messages": filtered_messages,
-            "max_tokens": kwargs.pop("max_tokens", 1024),
-            **kwargs,
-        }
-
-        if system_content:
-            request_params["system"] = system_content
-
+        request_params = _build_anthropic_request(
+            model,
+            messages,
+            kwargs,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+        )
         with client.messages.stream(**request_params) as stream:
             yield from stream.text_stream
+            if on_usage is not None or on_stop is not None:
+                message = stream.get_final_message()
+                if on_usage is not None:
+                    on_usage(extract_usage(message, provider))
+                if on_stop is not None:
+                    on_stop(message.stop_reason)
 
     else:
         raise ValueError(f"Invalid provider: {provider}")
 
 
-def create_completion_with_tools(client, provider, model, messages, tools, **kwargs):
+class _ToolCallStream:
+    """Turn streamed chunks into text and tool-call events.
+
+    Shared by the sync and async streaming adapters. Argument fragments are
+    accumulated per call and marked ready as soon as they are complete:
+    when they parse as a JSON object (OpenAI, which has no end-of-call
+    marker) or when the content block stops (Anthropic).
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.text = []
+        self.calls = {}
+        self.blocks = {}
+        self.stop_reason = None
+        self.usage = None
+
+    def feed(self, chunk):
+        """Process one stream chunk and return the events it produces."""
+        if self.provider == "openai":
+            return self._feed_openai(chunk)
+        return self._feed_anthropic(chunk)
+
+    def _feed_openai(self, chunk):
+        events = []
+        if chunk.usage is not None:
+            self.usage = chunk
+        if not chunk.choices:
+            return events
+        choice = chunk.choices[0]
+        delta = choice.delta
+        if delta.content:
+            self.text.append(delta.content)
+            events.append({"type": "text", "text": delta.content})
+        for fragment in delta.tool_calls or ():
+            call = self.calls.get(fragment.index)
+            if call is None:
+                # Calls are streamed one after another: a new one means the
+                # previous calls are complete
+                events.extend(self._ready_all())
+                call = self.calls[fragment.index] = {
+                    "index": fragment.index,
+                    "id": fragment.id,
+                    "name": fragment.function.name if fragment.function else None,
+                    "fragments": [],
+                    "ready": False,
+                }
+                events.append(_tool_event("tool_started", call))
+            arguments = fragment.function.arguments if fragment.function else None
+            if arguments:
+                call["fragments"].append(arguments)
+                # A JSON object is complete once it parses; only try when
+                # the text could have just closed it
+                if not call["ready"] and arguments.rstrip().endswith("}"):
+                    call["arguments"] = "".join(call["fragments"])
+                    try:
+                        json_loads(call["arguments"])
+                    except ValueError:
+                        pass
+                    else:
+                        events.append(self._ready(call))
+        if choice.finish_reason:
+            self.stop_reason = choice.finish_reason
+            events.extend(self._ready_all())
+        return events
+
+    def _feed_anthropic(self, event):
+        events = []
+        if event.type == "message_start":
+            self.usage = event.message
+        elif event.type == "content_block_start":
+            block = event.content_block
+            if block.type == "tool_use":
+                call = self.calls[event.index] = {
+                    "index": event.index,
+                    "id": block.id,
+                    "name": block.name,
+                    "fragments": [],
+                    "ready": False,
+                }
+                self.blocks[event.index] = call
+                events.append(_tool_event("tool_started", call))
+            elif block.type in ("text", "thinking"):
+                self.blocks[event.index] = block.model_dump(exclude_none=True)
+                self.blocks[event.index][block.type] = [getattr(block, block.type)]
+            else:
+                self.blocks[event.index] = block.model_dump(exclude_none=True)
+        elif event.type == "content_block_delta":
+            delta = event.delta
+            block = self.blocks.get(event.index)
+            if delta.type == "text_delta":
+                block["text"].append(delta.text)
+                self.text.append(delta.text)
+                events.append({"type": "text", "text": delta.text})
+            elif delta.type == "input_json_delta":
+                block["fragments"].append(delta.partial_json)
+            elif delta.type == "thinking_delta":
+                block["thinking"].append(delta.thinking)
+            elif delta.type == "signature_delta":
+                block["signature"] = delta.signature
+        elif event.type == "content_block_stop":
+            call = self.calls.get(event.index)
+            if call is not None:
+                arguments = "".join(call["fragments"]) or "{}"
+                try:
+                    call["arguments"] = json_loads(arguments)
+                except ValueError:
+                    # Left for the caller's argument parsing to report
+                    call["arguments"] = arguments
+                events.append(self._ready(call))
+        elif event.type == "message_delta":
+            self.stop_reason = event.delta.stop_reason
+            if self.usage is not None and event.usage is not None:
+                self.usage.usage.output_tokens = event.usage.output_tokens
+        return events
+
+    def _ready(self, call):
+        call["ready"] = True
+        if self.provider == "openai":
+            call["arguments"] = "".join(call["fragments"]) or "{}"
+        return _tool_event("tool_ready", call)
+
+    def _ready_all(self):
+        return [self._ready(call) for call in self.calls.values() if not call["ready"]]
+
+    def finish(self, on_usage):
+        """Return the events after the last chunk, ending with "done"."""
+        events = self._ready_all()
+        if on_usage is not None and self.usage is not None:
+            on_usage(extract_usage(self.usage, self.provider))
+        text = "".join(self.text) or None
+        tool_calls = [
+            {"id": call["id"], "name": call["name"], "arguments": call["arguments"]}
+            for call in self.calls.values()
+        ]
+        events.append(
+            {
+                "type": "done",
+                "text": text,
+                "tool_calls": tool_calls,
+                "message": self._message(text, tool_calls),
+                "stop_reason": self.stop_reason,
+            }
+        )
+        return events
+
+    def _message(self, text, tool_calls):
+        """Build the assistant message, as response_to_message() would."""
+        if self.provider == "openai":
+            message = {"role": "assistant", "content": text}
+            if tool_calls:
+                message["tool_calls"] = [
+                    {
+                        "id": call["id"],
+                        "type": "function",
+                        "function": {
+                            "name": call["name"],
+                            "arguments": call["arguments"],
+                        },
+                    }
+                    for call in tool_calls
+                ]
+            return message
+
+        content = []
+        for index in sorted(self.blocks):
+            block = self.blocks[index]
+            if index in self.calls:
+                arguments = block["arguments"]
+                content.append(
+                    {
+                        "type": "tool_use",
+                        "id": block["id"],
+                        "name": block["name"],
+                        "input": arguments if isinstance(arguments, dict) else {},
+                    }
+                )
+            elif block["type"] in ("text", "thinking"):
+                content.append({**block, block["type"]: "".join(block[block["type"]])})
+            else:
+                content.append(block)
+        return {"role": "assistant", "content": content}
+
+
+def _tool_event(event_type, call):
+    event = {
+        "type": event_type,
+        "index": call["index"],
+        "id": call["id"],
+        "name": call["name"],
+    }
+    if event_type == "tool_ready":
+        event["arguments"] = call["arguments"]
+    return event
+
+
+def create_streaming_completion_with_tools(
+    client,
+    provider,
+    model,
+    messages,
+    tools,
+    *,
+    retry=None,
+    prompt_cache=False,
+    prompt_cache_messages=0,
+    on_usage=None,
+    **kwargs,
+):
+    """Stream a completion with function calling, as events.
+
+    Tool calls are reported while the response is still being generated:
+    "tool_started" when the model begins a call, and "tool_ready" as soon
+    as its arguments are complete, so the tool can run while the model is
+    still writing the next call.
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        messages: List of message dicts with "role" and "content"
+        tools: List of tool/function definitions (OpenAI format) or a
+               ToolRegistry (see src/tools.py)
+        retry: Optional RetryPolicy; failures are retried only until the
+               first event arrives, so events are never duplicated
+        prompt_cache: Anthropic only: cache the system prompt and tool
+                      definitions so repeated calls reuse them
+        prompt_cache_messages: Anthropic only: also cache this many leading
+                               conversation messages as a shared prefix
+        on_usage: Optional callback receiving the extract_usage() dict,
+                  including prompt-cache read/write token counts
+        **kwargs: Additional parameters (temperature, tool_choice, etc.)
+
+    Yields:
+        dict: Events with a "type" key:
+              {"type": "text", "text": chunk}
+              {"type": "tool_started", "index", "id", "name"}
+              {"type": "tool_ready", "index", "id", "name", "arguments"}
+              with arguments as in extract_tool_calls(), then finally
+              {"type": "done", "text": full text or None, "tool_calls":
+              list as from extract_tool_calls(), "message": assistant
+              message as from response_to_message(), "stop_reason"}
+
+    """
+    if retry is not None:
+        yield from retry.iterate(
+            provider,
+            lambda: create_streaming_completion_with_tools(
+                client,
+                provider,
+                model,
+                messages,
+                tools,
+                prompt_cache=prompt_cache,
+                prompt_cache_messages=prompt_cache_messages,
+                on_usage=on_usage,
+                **kwargs,
+            ),
+        )
+        return
+
+    if provider == "openai":
+        if on_usage is not None:
+            # Ask for a final chunk carrying the token usage
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            tools=_tool_definitions(tools, provider),
+            stream=True,
+            **kwargs,
+        )
+
+    elif provider == "anthropic":
+        request_params = _build_anthropic_request(
+            model,
+            messages,
+            kwargs,
+            tools,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+        )
+        # The raw event stream: messages.stream() would re-parse the
+        # partial tool input on every fragment
+        stream = client.messages.create(stream=True, **request_params)
+
+    else:
+        raise ValueError(f"Invalid provider: {provider}")
+
+    state = _ToolCallStream(provider)
+    with stream:
+        for chunk in stream:
+            yield from state.feed(chunk)
+    yield from state.finish(on_usage)
+
+
+def create_completion_with_tools(
+    client,
+    provider,
+    model,
+    messages,
+    tools,
+    *,
+    cache=None,
+    cache_sampled=False,
+    retry=None,
+    prompt_cache=False,
+    prompt_cache_messages=0,
+    on_usage=None,
+    ledger=None,
+    **kwargs,
+):
     """Create a chat completion with function calling support.
 
     Args:
@@ -251,54 +1447,187 @@ def create_completion_with_tools(client, provider, model, messages, tools, **kwa
         provider: Provider name ("openai" or "anthropic")
         model: Model name (provider-specific)
         messages: List of message dicts with "role" and "content"
-        tools: List of tool/function definitions (OpenAI format)
+        tools: List of tool/function definitions (OpenAI format) or a
+               ToolRegistry (see src/tools.py)
+        cache: Optional ResponseCache; repeated requests are served from it
+        cache_sampled: Also use the cache when temperature > 0 (by default
+                       only temperature=0 requests are cached)
+        retry: Optional RetryPolicy for transient failures (see src/retry.py)
+        prompt_cache: Anthropic only: cache the system prompt and tool
+                      definitions so repeated calls reuse them
+        prompt_cache_messages: Anthropic only: also cache this many leading
+                               conversation messages as a shared prefix
+        on_usage: Optional callback receiving the extract_usage() dict,
+                  including prompt-cache read/write token counts
+        ledger: Optional UsageLedger recording every call (see
+                src/usage_ledger.py)
         **kwargs: Additional parameters (temperature, tool_choice, etc.)
 
     Returns:
         object: Provider-specific response object with tool calls
 
     """
-    if provider == "openai":
-        return client.chat.completions.create(
-            model=model, messages=messages, tools=tools, **kwargs
+    cache_key = None
+    if _should_use_cache(cache, kwargs, cache_sampled):
+        cache_key = make_cache_key(
+            provider,
+            model,
+            messages,
+            tools=_tool_definitions(tools, "openai"),
+            **kwargs,
         )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            if ledger is not None:
+                _cached_result(None, provider, model, ledger)
+            return _load_response(provider, cached)
 
-    if provider == "anthropic":
-        # Extract system message
-        system_content, filtered_messages = _extract_system_message(messages)
-
-        # Convert tools to Anthropic format
-        anthropic_tools = _convert_tools_to_anthropic(tools)
-
-        # Build request parameters
-        request_params = {
-            "model": model,
-            "messages": filtered_messages,
-            "tools": anthropic_tools,
-            "max_tokens": kwargs.pop("max_tokens", 1024),
+    started = time.perf_counter()
+    if provider == "openai":
+        response = _send(
+            retry,
+            provider,
+            client.chat.completions.create,
+            model=model,
+            messages=messages,
+            tools=_tool_definitions(tools, provider),
             **kwargs,
-        }
+        )
+
+    elif provider == "anthropic":
+        request_params = _build_anthropic_request(
+            model,
+            messages,
+            kwargs,
+            tools,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+        )
+        response = _send(retry, provider, client.messages.create, **request_params)
 
-        if system_content:
-            request_params["system"] = system_content
+    else:
+        raise ValueError(f"Invalid provider: {provider}")
 
-        # Remove tool_choice if present (different format in Anthropic)
-        request_params.pop("tool_choice", None)
+    _account(response, provider, model, None, started, on_usage, ledger)
+    if cache_key is not None:
+        cache.set(cache_key, response.model_dump_json())
+    return response
 
-        return client.messages.create(**request_params)
 
-    raise ValueError(f"Invalid provider: {provider}")
+def _load_response(provider, data):
+    """Rebuild a provider response object from its cached JSON."""
+    if provider == "openai":
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate_json(data)
+
+    from anthropic.types import Message
+
+    return Message.model_validate_json(data)
+
+
+def create_completions_batch(
+    client,
+    provider,
+    model,
+    message_lists,
+    max_concurrency=8,
+    ordered=True,
+    **kwargs,
+):
+    """Run create_completion() over many conversations in parallel.
+
+    Requests run on a pool of ``max_concurrency`` threads that share the
+    client's connection pool. A failed request does not stop the batch: its
+    exception is captured in the result and the remaining items continue.
+    ``message_lists`` may be a generator; items are pulled lazily so very
+    large inputs are never fully materialized.
+
+    Example:
+        for result in create_completions_batch(client, provider, model, convos):
+            if result["error"] is None:
+                print(result["index"], result["response"])
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        message_lists: Iterable of message lists, one per request
+        max_concurrency: Maximum number of requests in flight at once
+        ordered: If True, yield results in input order; if False, yield each
+                 result as soon as it completes
+        **kwargs: Additional parameters passed to every request
+
+    Yields:
+        dict: {"index": position in message_lists,
+               "response": response text (None on failure),
+               "error": the exception raised (None on success)}
+
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+
+    def _run(index, messages):
+        try:
+            response = create_completion(client, provider, model, messages, **kwargs)
+        except Exception as error:
+            return {"index": index, "response": None, "error": error}
+        return {"index": index, "response": response, "error": None}
+
+    items = enumerate(message_lists)
+    # Bound in-flight plus buffered results so memory stays flat for huge
+    # inputs even when an early item is slow in ordered mode
+    window = max_concurrency * 4
+    pending = set()
+    finished = {}
+    next_index = 0
+    exhausted = False
+
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    try:
+        while True:
+            while not exhausted and len(pending) + len(finished) < window:
+                try:
+                    index, messages = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(_run, index, messages))
+
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if ordered:
+                    finished[result["index"]] = result
+                else:
+                    yield result
+
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+    finally:
+        # If the consumer stops early, drop queued requests instead of paying
+        # for them; requests already running finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def extract_tool_calls(response, provider):
     """Extract tool call information from response.
 
+    Works for responses from both create_completion_with_tools() and
+    acreate_completion_with_tools(); the async clients return the same
+    response types, so no separate async variant is needed.
+
     Args:
         response: Provider-specific response object
         provider: Provider name ("openai" or "anthropic")
 
     Returns:
-        list: List of dicts with "name" and "arguments" keys
+        list: List of dicts with "id", "name" and "arguments" keys
+              ("id" links a tool result back to its call)
               Returns empty list if no tool calls
 
     """
@@ -308,6 +1637,7 @@ def extract_tool_calls(response, provider):
             for tool_call in response.choices[0].message.tool_calls:
                 tool_calls.append(
                     {
+                        "id": tool_call.id,
                         "name": tool_call.function.name,
                         "arguments": tool_call.function.arguments,
                     }
@@ -319,7 +1649,478 @@ def extract_tool_calls(response, provider):
         tool_calls = []
         for block in response.content:
             if block.type == "tool_use":
-                tool_calls.append({"name": block.name, "arguments": block.input})
+                tool_calls.append(
+                    {"id": block.id, "name": block.name, "arguments": block.input}
+                )
         return tool_calls
 
     raise ValueError(f"Invalid provider: {provider}")
+
+
+def response_to_message(response, provider):
+    """Convert a response into an assistant message for the conversation.
+
+    Append it to the messages before the tool results, so the model sees
+    its own tool calls on the next turn.
+
+    Args:
+        response: Provider-specific response object
+        provider: Provider name ("openai" or "anthropic")
+
+    Returns:
+        dict: Assistant message in the provider's format
+
+    """
+    if provider == "openai":
+        message = response.choices[0].message
+        result = {"role": "assistant", "content": message.content}
+        if message.tool_calls:
+            result["tool_calls"] = [
+                {
+                    "id": tool_call.id,
+                    "type": "function",
+                    "function": {
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments,
+                    },
+                }
+                for tool_call in message.tool_calls
+            ]
+        return result
+
+    if provider == "anthropic":
+        content = []
+        for block in response.content:
+            if block.type == "text":
+                content.append({"type": "text", "text": block.text})
+            elif block.type == "tool_use":
+                content.append(
+                    {
+                        "type": "tool_use",
+                        "id": block.id,
+                        "name": block.name,
+                        "input": block.input,
+                    }
+                )
+            else:
+                # e.g. thinking blocks, which must be sent back unchanged
+                content.append(block.model_dump(exclude_none=True))
+        return {"role": "assistant", "content": content}
+
+    raise ValueError(f"Invalid provider: {provider}")
+
+
+def tool_results_to_messages(results, provider):
+    """Build the messages that return tool results to the model.
+
+    OpenAI expects one "tool" message per call; Anthropic expects a single
+    user message containing a tool_result block per call.
+
+    Args:
+        results: List of dicts with "id" (from extract_tool_calls), "content"
+                 (str) and optionally "is_error"
+        provider: Provider name ("openai" or "anthropic")
+
+    Returns:
+        list: Messages to append after response_to_message()
+
+    """
+    if provider == "openai":
+        return [
+            {"role": "tool", "tool_call_id": result["id"], "content": result["content"]}
+            for result in results
+        ]
+
+    if provider == "anthropic":
+        blocks = []
+        for result in results:
+            block = {
+                "type": "tool_result",
+                "tool_use_id": result["id"],
+                "content": result["content"],
+            }
+            if result.get("is_error"):
+                block["is_error"] = True
+            blocks.append(block)
+        return [{"role": "user", "content": blocks}]
+
+    raise ValueError(f"Invalid provider: {provider}")
+
+
+# Async adapters: these mirror the functions above but take an
+# AsyncOpenAI/AsyncAnthropic client from get_async_client(), so many requests
+# can run concurrently on one event loop (including Jupyter's) without a
+# thread per request.
+
+
+async def acreate_completion(
+    client,
+    provider,
+    model,
+    messages,
+    *,
+    retry=None,
+    prompt_cache=False,
+    prompt_cache_messages=0,
+    on_usage=None,
+    return_result=False,
+    ledger=None,
+    single_flight=None,
+    **kwargs,
+):
+    """Async version of create_completion().
+
+    Args:
+        client: Authenticated async client (AsyncOpenAI or AsyncAnthropic)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        messages: List of message dicts with "role" and "content"
+        retry: Optional RetryPolicy for transient failures (see src/retry.py)
+        prompt_cache: Anthropic only: cache the system prompt and tool
+                      definitions so repeated calls reuse them
+        prompt_cache_messages: Anthropic only: also cache this many leading
+                               conversation messages as a shared prefix
+        on_usage: Optional callback receiving the extract_usage() dict,
+                  including prompt-cache read/write token counts
+        return_result: Return a CompletionResult (text plus tokens, stop
+                       reason, request ID and latency) instead of the text
+        ledger: Optional UsageLedger recording every call (see
+                src/usage_ledger.py)
+        single_flight: Optional SingleFlight; identical calls on the same
+                       event loop share one request
+        **kwargs: Additional parameters (temperature, etc.)
+
+    Returns:
+        str: The response text content (CompletionResult if return_result)
+
+    """
+    if single_flight is not None:
+        key = _flight_key(
+            client,
+            provider,
+            model,
+            messages,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+            return_result=return_result,
+            **kwargs,
+        )
+        return await single_flight.ado(
+            key,
+            lambda: acreate_completion(
+                client,
+                provider,
+                model,
+                messages,
+                retry=retry,
+                prompt_cache=prompt_cache,
+                prompt_cache_messages=prompt_cache_messages,
+                on_usage=on_usage,
+                return_result=return_result,
+                ledger=ledger,
+                **kwargs,
+            ),
+        )
+
+    started = time.perf_counter()
+    if provider == "openai":
+        response = await _asend(
+            retry,
+            provider,
+            client.chat.completions.create,
+            model=model,
+            messages=messages,
+            **kwargs,
+        )
+        text = response.choices[0].message.content
+
+    elif provider == "anthropic":
+        request_params = _build_anthropic_request(
+            model,
+            messages,
+            kwargs,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+        )
+        response = await _asend(
+            retry, provider, client.messages.create, **request_params
+        )
+        text = response.content[0].text
+
+    else:
+        raise ValueError(f"Invalid provider: {provider}")
+
+    result = _account(response, provider, model, text, started, on_usage, ledger)
+    return result if return_result else text
+
+
+async def acreate_streaming_completion(
+    client,
+    provider,
+    model,
+    messages,
+    *,
+    retry=None,
+    prompt_cache=False,
+    prompt_cache_messages=0,
+    on_usage=None,
+    on_stop=None,
+    single_flight=None,
+    **kwargs,
+):
+    """Async version of create_streaming_completion().
+
+    Use with ``async for chunk in acreate_streaming_completion(...)``.
+
+    Args:
+        client: Authenticated async client (AsyncOpenAI or AsyncAnthropic)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        messages: List of message dicts with "role" and "content"
+        retry: Optional RetryPolicy; failures are retried only until the
+               first chunk arrives, so text is never duplicated
+        prompt_cache: Anthropic only: cache the system prompt and tool
+                      definitions so repeated calls reuse them
+        prompt_cache_messages: Anthropic only: also cache this many leading
+                               conversation messages as a shared prefix
+        on_usage: Optional callback receiving the extract_usage() dict,
+                  including prompt-cache read/write token counts
+        on_stop: Optional callback receiving the provider's stop reason
+                 once the stream ends (e.g. "length" or "max_tokens" when
+                 cut off at the token limit)
+        single_flight: Optional SingleFlight; identical streams on the
+                       same event loop share one request
+        **kwargs: Additional parameters (temperature, etc.)
+
+    Yields:
+        str: Text chunks as they arrive
+
+    """
+    if single_flight is not None:
+        key = _flight_key(
+            client,
+            provider,
+            model,
+            messages,
+            stream=True,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+            **kwargs,
+        )
+        async for chunk in single_flight.astream(
+            key,
+            lambda: acreate_streaming_completion(
+                client,
+                provider,
+                model,
+                messages,
+                retry=retry,
+                prompt_cache=prompt_cache,
+                prompt_cache_messages=prompt_cache_messages,
+                on_usage=on_usage,
+                on_stop=on_stop,
+                **kwargs,
+            ),
+        ):
+            yield chunk
+        return
+
+    if retry is not None:
+        async for chunk in retry.aiterate(
+            provider,
+            lambda: acreate_streaming_completion(
+                client,
+                provider,
+                model,
+                messages,
+                prompt_cache=prompt_cache,
+                prompt_cache_messages=prompt_cache_messages,
+                on_usage=on_usage,
+                on_stop=on_stop,
+                **kwargs,
+            ),
+        ):
+            yield chunk
+        return
+
+    if provider == "openai":
+        if on_usage is not None:
+            # Ask for a final chunk carrying the token usage
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        stream = await client.chat.completions.create(
+            model=model, messages=messages, stream=True, **kwargs
+        )
+        # Closing the stream releases its connection if the caller stops early
+        async with stream:
+            async for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+                if on_stop is not None and event.choices:
+                    finish_reason = event.choices[0].finish_reason
+                    if finish_reason:
+                        on_stop(finish_reason)
+                if on_usage is not None and event.usage is not None:
+                    on_usage(extract_usage(event, provider))
+
+    elif provider == "anthropic":
+        request_params = _build_anthropic_request(
+            model,
+            messages,
+            kwargs,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+        )
+        async with client.messages.stream(**request_params) as stream:
+            async for text in stream.text_stream:
+                yield text
+            if on_usage is not None or on_stop is not None:
+                message = await stream.get_final_message()
+                if on_usage is not None:
+                    on_usage(extract_usage(message, provider))
+                if on_stop is not None:
+                    on_stop(message.stop_reason)
+
+    else:
+        raise ValueError(f"Invalid provider: {provider}")
+
+
+async def acreate_streaming_completion_with_tools(
+    client,
+    provider,
+    model,
+    messages,
+    tools,
+    *,
+    retry=None,
+    prompt_cache=False,
+    prompt_cache_messages=0,
+    on_usage=None,
+    **kwargs,
+):
+    """Async version of create_streaming_completion_with_tools().
+
+    Use with ``async for event in acreate_streaming_completion_with_tools(...)``.
+    Takes an async client from get_async_client(); the events are the same.
+    """
+    if retry is not None:
+        async for event in retry.aiterate(
+            provider,
+            lambda: acreate_streaming_completion_with_tools(
+                client,
+                provider,
+                model,
+                messages,
+                tools,
+                prompt_cache=prompt_cache,
+                prompt_cache_messages=prompt_cache_messages,
+                on_usage=on_usage,
+                **kwargs,
+            ),
+        ):
+            yield event
+        return
+
+    if provider == "openai":
+        if on_usage is not None:
+            # Ask for a final chunk carrying the token usage
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            tools=_tool_definitions(tools, provider),
+            stream=True,
+            **kwargs,
+        )
+
+    elif provider == "anthropic":
+        request_params = _build_anthropic_request(
+            model,
+            messages,
+            kwargs,
+            tools,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+        )
+        stream = await client.messages.create(stream=True, **request_params)
+
+    else:
+        raise ValueError(f"Invalid provider: {provider}")
+
+    state = _ToolCallStream(provider)
+    async with stream:
+        async for chunk in stream:
+            for event in state.feed(chunk):
+                yield event
+    for event in state.finish(on_usage):
+        yield event
+
+
+async def acreate_completion_with_tools(
+    client,
+    provider,
+    model,
+    messages,
+    tools,
+    *,
+    retry=None,
+    prompt_cache=False,
+    prompt_cache_messages=0,
+    on_usage=None,
+    ledger=None,
+    **kwargs,
+):
+    """Async version of create_completion_with_tools().
+
+    Args:
+        client: Authenticated async client (AsyncOpenAI or AsyncAnthropic)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        messages: List of message dicts with "role" and "content"
+        tools: List of tool/function definitions (OpenAI format) or a
+               ToolRegistry (see src/tools.py)
+        retry: Optional RetryPolicy for transient failures (see src/retry.py)
+        prompt_cache: Anthropic only: cache the system prompt and tool
+                      definitions so repeated calls reuse them
+        prompt_cache_messages: Anthropic only: also cache this many leading
+                               conversation messages as a shared prefix
+        on_usage: Optional callback receiving the extract_usage() dict,
+                  including prompt-cache read/write token counts
+        ledger: Optional UsageLedger recording every call (see
+                src/usage_ledger.py)
+        **kwargs: Additional parameters (temperature, tool_choice, etc.)
+
+    Returns:
+        object: Provider-specific response object with tool calls; pass it to
+                extract_tool_calls() as usual
+
+    """
+    started = time.perf_counter()
+    if provider == "openai":
+        response = await _asend(
+            retry,
+            provider,
+            client.chat.completions.create,
+            model=model,
+            messages=messages,
+            tools=_tool_definitions(tools, provider),
+            **kwargs,
+        )
+
+    elif provider == "anthropic":
+        request_params = _build_anthropic_request(
+            model,
+            messages,
+            kwargs,
+            tools,
+            prompt_cache=prompt_cache,
+            prompt_cache_messages=prompt_cache_messages,
+        )
+        response = await _asend(
+            retry, provider, client.messages.create, **request_params
+        )
+
+    else:
+        raise ValueError(f"Invalid provider: {provider}")
+
+    _account(response, provider, model, None, started, on_usage, ledger)
+    return response
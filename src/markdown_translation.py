@@ -0,0 +1,499 @@
+"""Translate long markdown documents section by section, in parallel.
+
+Sending a whole document in one request is slow (output is generated one
+token at a time) and is capped by max_tokens. Instead, the document is split
+at structure-safe boundaries (headings and blank lines, never inside a
+table, list or code block), the chunks are translated concurrently with the
+same instructions, and the results are stitched back together in order.
+
+Front matter and fenced code blocks are copied through untranslated, and the
+whitespace around every chunk is kept exactly as in the source, so the
+output has the same layout as the input.
+
+    spanish = translate_markdown(english, client, provider, model)
+
+For documents that are edited continuously, translate_markdown_file() keeps
+a manifest next to the output with a hash and translation for every source
+section, so a re-run only sends new or changed sections to the LLM.
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from src.llm_client import create_completions_batch
+
+# Chunks are kept under this many characters (~2000 tokens), which leaves
+# plenty of room in DEFAULT_MAX_TOKENS for the translated text
+DEFAULT_MAX_CHARS = 8000
+
+# A heading starts a new chunk once the current one has at least this much
+# text, so sections are not split into many tiny requests
+DEFAULT_MIN_CHARS = 1500
+
+DEFAULT_MAX_TOKENS = 4096
+
+SYSTEM_PROMPT = (
+    "You are a professional translator specializing in academic and policy "
+    "documents. Translate the markdown you are given from {source_language} "
+    "to {target_language}. It is one section of a longer document. Keep the "
+    "markdown formatting exactly as it appears, including headings, lists, "
+    "tables, links and emphasis. Use formal, professional language "
+    "appropriate for policy and research documents, and preserve technical "
+    "terms and proper nouns appropriately. Reply with the translated markdown "
+    "only, without any comments or explanations."
+)
+
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s")
+_TABLE_ROW = re.compile(r"^\s*\|")
+
+
+def _parse_blocks(text):
+    """Split markdown into (kind, text) blocks that must not be broken up.
+
+    Kinds are "front_matter", "code", "blank", "heading", "table" and
+    "text" (paragraphs and lists). Concatenating the block texts gives back
+    the original document exactly.
+    """
+    lines = text.splitlines(keepends=True)
+    blocks = []
+    i = 0
+
+    # YAML front matter only counts at the very start of the document
+    if lines and lines[0].strip() == "---":
+        for j in range(1, len(lines)):
+            if lines[j].strip() in ("---", "..."):
+                blocks.append(("front_matter", "".join(lines[: j + 1])))
+                i = j + 1
+                break
+
+    while i < len(lines):
+        line = lines[i]
+        fence = _FENCE.match(line)
+
+        if fence:
+            marker = fence.group(1)
+            j = i + 1
+            while j < len(lines) and not lines[j].lstrip().startswith(marker):
+                j += 1
+            j = min(j + 1, len(lines))
+            blocks.append(("code", "".join(lines[i:j])))
+            i = j
+
+        elif not line.strip():
+            j = i
+            while j < len(lines) and not lines[j].strip():
+                j += 1
+            blocks.append(("blank", "".join(lines[i:j])))
+            i = j
+
+        elif _HEADING.match(line):
+            blocks.append(("heading", line))
+            i += 1
+
+        elif _TABLE_ROW.match(line):
+            j = i
+            while j < len(lines) and _TABLE_ROW.match(lines[j]):
+                j += 1
+            blocks.append(("table", "".join(lines[i:j])))
+            i = j
+
+        else:
+            j = i + 1
+            while (
+                j < len(lines)
+                and lines[j].strip()
+                and not _FENCE.match(lines[j])
+                and not _HEADING.match(lines[j])
+                and not _TABLE_ROW.match(lines[j])
+            ):
+                j += 1
+            blocks.append(("text", "".join(lines[i:j])))
+            i = j
+
+    return blocks
+
+
+def split_markdown(text, max_chars=DEFAULT_MAX_CHARS, min_chars=DEFAULT_MIN_CHARS):
+    """Split a markdown document into segments for translation.
+
+    Segments never cut through a paragraph, list, table or code block. A new
+    segment starts at a heading once the current one holds at least
+    min_chars, or whenever adding the next block would exceed max_chars.
+    A single block longer than max_chars becomes its own segment.
+
+    Args:
+        text: Markdown document
+        max_chars: Soft upper limit on the size of a segment
+        min_chars: Minimum segment size before a heading starts a new one
+
+    Returns:
+        list: Dicts with "text" and "translate" keys. Segments with
+              translate=False (front matter, code blocks) are copied as-is.
+              Joining all "text" values reproduces the input exactly.
+
+    """
+    segments = []
+    current = []
+    current_size = 0
+
+    def _flush():
+        nonlocal current, current_size
+        if current:
+            segment_text = "".join(current)
+            segments.append(
+                {"text": segment_text, "translate": bool(segment_text.strip())}
+            )
+        current = []
+        current_size = 0
+
+    for kind, block in _parse_blocks(text):
+        if kind in ("front_matter", "code"):
+            _flush()
+            segments.append({"text": block, "translate": False})
+            continue
+
+        if kind != "blank":
+            starts_section = kind == "heading" and current_size >= min_chars
+            too_big = current_size and current_size + len(block) > max_chars
+            if starts_section or too_big:
+                _flush()
+
+        current.append(block)
+        current_size += len(block)
+
+    _flush()
+    return segments
+
+
+def _split_whitespace(text):
+    """Return (leading, core, trailing) whitespace parts of text."""
+    core = text.strip()
+    if not core:
+        return text, "", ""
+    start = text.index(core)
+    return text[:start], core, text[start + len(core) :]
+
+
+def _translate_pending(
+    segments,
+    client,
+    provider,
+    model,
+    target_language,
+    source_language,
+    max_concurrency,
+    **kwargs,
+):
+    """Translate the translatable segments, collecting failures.
+
+    Returns:
+        tuple: (outputs, errors) where outputs holds the text for each
+               segment, or None for one that failed, and errors lists the
+               failures in segment order
+
+    """
+    system_prompt = SYSTEM_PROMPT.format(
+        source_language=source_language, target_language=target_language
+    )
+    kwargs.setdefault("max_tokens", DEFAULT_MAX_TOKENS)
+
+    outputs = [segment["text"] for segment in segments]
+    pending = [
+        (index, _split_whitespace(segment["text"]))
+        for index, segment in enumerate(segments)
+        if segment["translate"]
+    ]
+    message_lists = [
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": core},
+        ]
+        for _, (_, core, _) in pending
+    ]
+
+    results = create_completions_batch(
+        client,
+        provider,
+        model,
+        message_lists,
+        max_concurrency=max_concurrency,
+        **kwargs,
+    )
+    errors = []
+    for (index, (leading, _, trailing)), result in zip(pending, results, strict=True):
+        error = result["error"]
+        if error is None and result["response"] is None:
+            # E.g. a refusal: no text came back for this section
+            error = ValueError(f"No translation returned for segment {index}")
+        if error is not None:
+            outputs[index] = None
+            errors.append(error)
+            continue
+        outputs[index] = leading + result["response"].strip() + trailing
+
+    return outputs, errors
+
+
+def translate_segments(
+    segments,
+    client,
+    provider,
+    model,
+    target_language="Spanish",
+    source_language="English",
+    max_concurrency=8,
+    **kwargs,
+):
+    """Translate the translatable segments concurrently.
+
+    Args:
+        segments: Segments from split_markdown()
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        target_language: Language to translate into
+        source_language: Language of the document
+        max_concurrency: Maximum number of chunks translated at once
+        **kwargs: Additional parameters for create_completion()
+                  (temperature, cache, retry, etc.)
+
+    Returns:
+        list: Translated text for each segment, in order. Untranslated
+              segments are returned unchanged, and surrounding whitespace
+              is preserved.
+
+    Raises:
+        Exception: The first error if any chunk fails to translate
+
+    """
+    outputs, errors = _translate_pending(
+        segments,
+        client,
+        provider,
+        model,
+        target_language,
+        source_language,
+        max_concurrency,
+        **kwargs,
+    )
+    if errors:
+        raise errors[0]
+    return outputs
+
+
+def translate_markdown(
+    text,
+    client,
+    provider,
+    model,
+    target_language="Spanish",
+    source_language="English",
+    max_chars=DEFAULT_MAX_CHARS,
+    max_concurrency=8,
+    **kwargs,
+):
+    """Translate a markdown document, translating its sections in parallel.
+
+    Args:
+        text: Markdown document to translate
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        target_language: Language to translate into
+        source_language: Language of the document
+        max_chars: Soft upper limit on the size of each chunk
+        max_concurrency: Maximum number of chunks translated at once
+        **kwargs: Additional parameters for create_completion()
+                  (temperature, cache, retry, etc.)
+
+    Returns:
+        str: The translated document
+
+    """
+    segments = split_markdown(text, max_chars=max_chars)
+    translated = translate_segments(
+        segments,
+        client,
+        provider,
+        model,
+        target_language=target_language,
+        source_language=source_language,
+        max_concurrency=max_concurrency,
+        **kwargs,
+    )
+    return "".join(translated)
+
+
+MANIFEST_VERSION = 1
+
+
+def _segment_hash(text):
+    """Hash a segment's content, ignoring surrounding whitespace."""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+def _load_manifest(path, settings):
+    """Return {hash: translation} from a manifest, or {} if unusable.
+
+    A manifest written for a different language pair or model is ignored,
+    since its translations would not match what this run would produce.
+    """
+    if not path.exists():
+        return {}
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if (
+        manifest.get("version") != MANIFEST_VERSION
+        or manifest.get("settings") != settings
+    ):
+        return {}
+    return {
+        segment["hash"]: segment["translation"]
+        for segment in manifest.get("segments", [])
+    }
+
+
+def _write_manifest(path, settings, translations):
+    """Atomically write the manifest so an interrupted run cannot corrupt it."""
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "settings": settings,
+        "segments": [
+            {"hash": segment_hash, "translation": translation}
+            for segment_hash, translation in translations.items()
+        ],
+    }
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8"
+    )
+    os.replace(temporary, path)
+
+
+def translate_markdown_file(
+    source_path,
+    output_path,
+    client,
+    provider,
+    model,
+    target_language="Spanish",
+    source_language="English",
+    max_chars=DEFAULT_MAX_CHARS,
+    max_concurrency=8,
+    manifest_path=None,
+    **kwargs,
+):
+    """Translate a markdown file, re-translating only what changed.
+
+    The source is split at every heading (and within long sections at
+    max_chars), so an edit only changes the hashes of the sections it
+    touches. Sections whose hash is already in the manifest reuse their
+    stored translation; only new or changed sections are sent to the LLM.
+    The manifest is then rewritten to match the current source.
+
+    Args:
+        source_path: Markdown file to translate
+        output_path: Where to write the translation
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        target_language: Language to translate into
+        source_language: Language of the document
+        max_chars: Soft upper limit on the size of each section
+        max_concurrency: Maximum number of sections translated at once
+        manifest_path: Manifest location; defaults to the output path with
+                       ".manifest.json" appended
+        **kwargs: Additional parameters for create_completion()
+                  (temperature, cache, retry, etc.)
+
+    Returns:
+        dict: {"segments": translatable sections in the source,
+               "translated": sections sent to the LLM,
+               "reused": sections taken from the manifest}
+
+    Raises:
+        Exception: The first error if any section fails to translate.
+                   Sections that succeeded are saved to the manifest first,
+                   so a re-run only retries the failed ones.
+
+    """
+    source_path = Path(source_path)
+    output_path = Path(output_path)
+    if manifest_path is None:
+        manifest_path = output_path.with_name(output_path.name + ".manifest.json")
+    manifest_path = Path(manifest_path)
+
+    settings = {
+        "source_language": source_language,
+        "target_language": target_language,
+        "provider": provider,
+        "model": model,
+    }
+    known = _load_manifest(manifest_path, settings)
+
+    text = source_path.read_text(encoding="utf-8")
+    # min_chars=0 starts a segment at every heading, so boundaries depend
+    # only on local content and an edit cannot shift later sections
+    segments = split_markdown(text, max_chars=max_chars, min_chars=0)
+    hashes = [
+        _segment_hash(segment["text"]) if segment["translate"] else None
+        for segment in segments
+    ]
+
+    # Translate each distinct missing section once
+    missing = {}
+    for segment, segment_hash in zip(segments, hashes, strict=True):
+        if segment_hash is not None and segment_hash not in known:
+            missing.setdefault(segment_hash, segment)
+    fresh, errors = _translate_pending(
+        list(missing.values()),
+        client,
+        provider,
+        model,
+        target_language,
+        source_language,
+        max_concurrency,
+        **kwargs,
+    )
+    for segment_hash, translation in zip(missing, fresh, strict=True):
+        if translation is not None:
+            known[segment_hash] = translation.strip()
+    if errors:
+        # Keep the sections that did translate so a re-run does not pay
+        # for them again; the output file is left as it was
+        translations = {
+            segment_hash: known[segment_hash]
+            for segment_hash in hashes
+            if segment_hash in known
+        }
+        _write_manifest(manifest_path, settings, translations)
+        raise errors[0]
+
+    # Splice stored and fresh translations back into the source layout
+    outputs = []
+    translations = {}
+    for segment, segment_hash in zip(segments, hashes, strict=True):
+        if segment_hash is None:
+            outputs.append(segment["text"])
+            continue
+        leading, _, trailing = _split_whitespace(segment["text"])
+        outputs.append(leading + known[segment_hash] + trailing)
+        translations[segment_hash] = known[segment_hash]
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text("".join(outputs), encoding="utf-8")
+    _write_manifest(manifest_path, settings, translations)
+
+    translatable = sum(segment_hash is not None for segment_hash in hashes)
+    return {
+        "segments": translatable,
+        "translated": len(missing),
+        "reused": translatable
+        - sum(segment_hash in missing for segment_hash in hashes),
+    }
@@ -0,0 +1,304 @@
+"""Micro-batching: answer many small items with one request.
+
+Classifying or translating short strings one request at a time is dominated
+by per-request overhead: the system prompt is resent and billed for every
+item, and each item waits a full round trip. create_packed_completions()
+packs many items into one prompt as a JSON array and asks for a JSON array
+of results back:
+
+    def check_label(label):
+        if label not in {"positive", "negative", "neutral"}:
+            raise ValueError(f"Unknown label: {label!r}")
+        return label
+
+    labels = create_packed_completions(
+        client, provider, model, answers,
+        "Classify the sentiment of each text as positive, negative or neutral.",
+        validate=check_label,
+    )
+
+Batch sizes are chosen from estimated token counts, so long items travel in
+smaller batches and every reply fits max_tokens. Each reply is split back
+per item and checked; items whose result is missing, malformed or rejected
+by validate are retried in smaller batches, while the rest of the batch is
+kept. A reply cut off at the token limit still yields its complete entries.
+"""
+
+import json
+import re
+
+from src.llm_client import create_completions_batch
+from src.rate_limit import CHARS_PER_TOKEN
+from src.tools import loads
+
+DEFAULT_MAX_ITEMS = 50
+DEFAULT_MAX_INPUT_TOKENS = 4000
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+DEFAULT_OUTPUT_TOKENS_PER_ITEM = 50
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Approximate tokens of the JSON wrapper around each item and result
+ITEM_OVERHEAD_TOKENS = 8
+
+CONTRACT = (
+    'The user message is a JSON array of items, each with an "id" and a '
+    '"text". Apply the instructions above to every item independently. '
+    "Reply with only a JSON array holding one object per item, in the same "
+    'order: {"id": <the item\'s id>, "result": <your answer for that item>}. '
+    "Do not skip or merge items and do not add any other text."
+)
+
+
+# Start of the reply's array of entry objects: "[" followed by "{" (or an
+# empty array), so a bracket in leading prose such as "[JSON]" is skipped
+_ARRAY_START = re.compile(r"\[\s*[{\]]")
+
+
+class PackedResponseError(ValueError):
+    """Raised when some items have no valid result after every attempt.
+
+    Attributes:
+        indices: Positions of the items without a result
+        results: Results for all items (None for the failed ones), so the
+                 work already done is not lost
+
+    """
+
+    def __init__(self, message, indices, results):
+        """Create the error.
+
+        Args:
+            message: Error message
+            indices: Positions of the items without a result
+            results: Results for all items, None where missing
+
+        """
+        super().__init__(message)
+        self.indices = indices
+        self.results = results
+
+
+def _as_text(item):
+    return item if isinstance(item, str) else json.dumps(item, ensure_ascii=False)
+
+
+def pack_items(
+    texts,
+    max_items=DEFAULT_MAX_ITEMS,
+    max_input_tokens=DEFAULT_MAX_INPUT_TOKENS,
+    max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS,
+    output_tokens_per_item=DEFAULT_OUTPUT_TOKENS_PER_ITEM,
+):
+    """Group items into batches that fit the token budgets.
+
+    Args:
+        texts: List of (index, text) pairs, in order
+        max_items: Maximum items per batch
+        max_input_tokens: Estimated input tokens per batch; an item larger
+                          than this gets a batch of its own
+        max_output_tokens: Output tokens available per request
+        output_tokens_per_item: Expected output tokens per item
+
+    Returns:
+        list: Batches as lists of indices
+
+    """
+    limit = max(1, min(max_items, max_output_tokens // output_tokens_per_item))
+    batches = []
+    current = []
+    tokens = 0
+    for index, text in texts:
+        cost = len(text) // CHARS_PER_TOKEN + ITEM_OVERHEAD_TOKENS
+        if current and (len(current) >= limit or tokens + cost > max_input_tokens):
+            batches.append(current)
+            current = []
+            tokens = 0
+        current.append(index)
+        tokens += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_packed_messages(instruction, items):
+    """Build the messages for one batch; ids are positions in the batch."""
+    payload = [{"id": local, "text": item} for local, item in enumerate(items)]
+    return [
+        {"role": "system", "content": f"{instruction}\n\n{CONTRACT}"},
+        {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+    ]
+
+
+def parse_packed_response(text, count, truncated=False, validate=None):
+    """Split a packed reply into per-item results.
+
+    Args:
+        text: Reply text, expected to contain a JSON array (surrounding
+              prose or code fences are ignored)
+        count: Number of items in the batch
+        truncated: The reply stopped at the token limit; its last entry may
+                   be incomplete and is discarded
+        validate: Optional callable(result) -> value; raising ValueError,
+                  TypeError or KeyError rejects the result
+
+    Returns:
+        dict: Batch position -> result, for the items with a valid result
+
+    """
+    match = _ARRAY_START.search(text)
+    if match is None:
+        return {}
+    start = match.start()
+    end = text.rfind("]")
+    try:
+        entries = loads(text[start : end + 1])
+    except ValueError:
+        try:
+            # Truncated or followed by text: keep the complete entries
+            entries = loads(text[start:], partial=True)
+        except ValueError:
+            return {}
+        truncated = True
+    if not isinstance(entries, list):
+        return {}
+    if truncated:
+        entries = entries[:-1]
+
+    results = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or "result" not in entry:
+            continue
+        local = entry.get("id")
+        if (
+            not isinstance(local, int)
+            or isinstance(local, bool)
+            or not 0 <= local < count
+            or local in results
+        ):
+            continue
+        value = entry["result"]
+        if validate is not None:
+            try:
+                value = validate(value)
+            except (ValueError, TypeError, KeyError):
+                continue
+        results[local] = value
+    return results
+
+
+def create_packed_completions(
+    client,
+    provider,
+    model,
+    items,
+    instruction,
+    *,
+    validate=None,
+    max_items=DEFAULT_MAX_ITEMS,
+    max_input_tokens=DEFAULT_MAX_INPUT_TOKENS,
+    max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS,
+    output_tokens_per_item=DEFAULT_OUTPUT_TOKENS_PER_ITEM,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    max_concurrency=8,
+    errors="raise",
+    **kwargs,
+):
+    """Answer many small items, packing several into each request.
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        items: List of strings (or JSON-serializable values)
+        instruction: What to do with each item; the JSON contract is
+                     appended to it as the system prompt
+        validate: Optional callable(result) -> value that checks or
+                  converts each result; raise ValueError, TypeError or
+                  KeyError to reject it and retry the item
+        max_items: Maximum items per request
+        max_input_tokens: Estimated input tokens per request
+        max_output_tokens: max_tokens for each request (unless given in
+                           kwargs); limits the batch size together with
+                           output_tokens_per_item
+        output_tokens_per_item: Expected output tokens per item
+        max_attempts: Rounds of requests; each retry round packs the
+                      remaining items in batches half as large
+        max_concurrency: Maximum number of requests in flight at once
+        errors: "raise" to raise on a failed request or on items still
+                without a result after max_attempts, or "null" to leave
+                their results as None
+        **kwargs: Additional parameters for create_completion()
+                  (temperature, cache, retry, ledger, etc.)
+
+    Returns:
+        list: One result per item, in order
+
+    Raises:
+        PackedResponseError: With errors="raise", if items have no valid
+                             result after max_attempts
+        Exception: With errors="raise", a failed request's error
+
+    """
+    if errors not in ("raise", "null"):
+        raise ValueError(f"errors must be 'raise' or 'null', got {errors!r}")
+    kwargs.setdefault("max_tokens", max_output_tokens)
+    kwargs["return_result"] = True
+
+    results = [None] * len(items)
+    texts = [_as_text(item) for item in items]
+    pending = list(range(len(items)))
+    limit = max_items
+
+    for _ in range(max_attempts):
+        if not pending:
+            break
+        batches = pack_items(
+            [(index, texts[index]) for index in pending],
+            max_items=limit,
+            max_input_tokens=max_input_tokens,
+            max_output_tokens=kwargs["max_tokens"],
+            output_tokens_per_item=output_tokens_per_item,
+        )
+        message_lists = (
+            build_packed_messages(instruction, [items[index] for index in batch])
+            for batch in batches
+        )
+        failed = []
+        for result in create_completions_batch(
+            client,
+            provider,
+            model,
+            message_lists,
+            max_concurrency=max_concurrency,
+            ordered=False,
+            **kwargs,
+        ):
+            batch = batches[result["index"]]
+            if result["error"] is not None:
+                if errors == "raise":
+                    raise result["error"]
+                # Retry the items in smaller batches, which may succeed
+                # where this request did not (e.g. too long for the model)
+                failed.extend(batch)
+                continue
+            response = result["response"]
+            parsed = parse_packed_response(
+                response.text or "", len(batch), response.truncated, validate
+            )
+            for local, index in enumerate(batch):
+                if local in parsed:
+                    results[index] = parsed[local]
+                else:
+                    failed.append(index)
+        pending = sorted(failed)
+        # Smaller batches are less likely to be truncated or garbled
+        limit = max(1, limit // 2)
+
+    if pending and errors == "raise":
+        raise PackedResponseError(
+            f"{len(pending)} of {len(items)} items had no valid result after "
+            f"{max_attempts} attempts",
+            pending,
+            results,
+        )
+    return results
@@ -0,0 +1,338 @@
+"""Client-side rate limiting driven by provider rate-limit headers.
+
+Sending requests faster than the provider allows results in 429 errors that
+waste a whole round-trip each. A RateLimiter paces requests on the client
+side instead, using one token bucket for requests per minute (RPM) and one
+for estimated tokens per minute (TPM) per provider and model.
+
+Limits do not have to be known up front: every response carries the current
+limits in its headers (``x-ratelimit-*`` for OpenAI, ``anthropic-ratelimit-*``
+for Anthropic) and the buckets are recalibrated from them.
+
+    limiter = RateLimiter()
+    client = get_client(rate_limiter=limiter)
+
+The limiter is attached to the client's HTTP layer, so every adapter
+(create_completion, streaming, tools, batches) consults it before sending.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from datetime import datetime
+
+# Rough average for English text; good enough for pacing purposes
+CHARS_PER_TOKEN = 4
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def estimate_request_tokens(body):
+    """Estimate the tokens a request will count against the TPM limit.
+
+    Counts the prompt at roughly four characters per token plus the
+    requested maximum output, which providers reserve up front.
+
+    Args:
+        body: Decoded JSON request body
+
+    Returns:
+        int: Estimated token count
+
+    """
+    prompt = json.dumps(
+        [body.get("system"), body.get("messages"), body.get("tools")],
+        ensure_ascii=False,
+    )
+    max_output = body.get("max_tokens") or body.get("max_completion_tokens") or 0
+    return len(prompt) // CHARS_PER_TOKEN + max_output
+
+
+def _parse_reset(value, now):
+    """Convert a reset header into seconds from now.
+
+    OpenAI sends durations such as "1s" or "6m0s"; Anthropic sends an
+    RFC 3339 timestamp.
+    """
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(f"{number}{unit}" for number, unit in parts) == value:
+        return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(reset_at.timestamp() - now, 0.0)
+
+
+def _to_int(value):
+    """Parse an integer header value, returning None if absent or invalid."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """A token bucket refilled continuously up to a per-minute capacity.
+
+    Reservations may take the bucket below zero; the caller then waits until
+    the debt is refilled. This keeps waiting outside the lock and serves
+    callers in arrival order.
+    """
+
+    def __init__(self, per_minute):
+        """Create a full bucket.
+
+        Args:
+            per_minute: Capacity, refilled evenly over 60 seconds
+
+        """
+        self.capacity = per_minute
+        self.available = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self.available = min(
+            self.capacity, self.available + elapsed * self.capacity / 60
+        )
+
+    def reserve(self, amount, now):
+        """Take amount from the bucket.
+
+        Returns:
+            float: Seconds to wait before the reservation is covered
+
+        """
+        self._refill(now)
+        # A single request larger than the bucket could never be satisfied
+        amount = min(amount, self.capacity)
+        self.available -= amount
+        if self.available >= 0:
+            return 0.0
+        return -self.available * 60 / self.capacity
+
+    def recalibrate(self, limit, remaining, reset_seconds, now):
+        """Align the bucket with the provider's view of the limit."""
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            # The server's count is authoritative when it is stricter
+            self.available = min(self.available, float(remaining))
+            if remaining <= 0 and reset_seconds:
+                # Exhausted: hold further requests until the server resets
+                self.available = min(
+                    self.available, -reset_seconds * self.capacity / 60
+                )
+
+
+class RateLimiter:
+    """Paces requests per provider and model using RPM and TPM buckets.
+
+    Thread-safe; one limiter can be shared by every client in the process.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        """Create a limiter.
+
+        Args:
+            requests_per_minute: Initial RPM limit, or None to wait for
+                                 the first response headers
+            tokens_per_minute: Initial TPM limit, or None to wait for
+                               the first response headers
+
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _buckets_for(self, provider, model):
+        """Return the (requests, tokens) buckets for a route, creating them."""
+        key = (provider, model)
+        buckets = self._buckets.get(key)
+        if buckets is None:
+            buckets = [
+                TokenBucket(self.requests_per_minute)
+                if self.requests_per_minute
+                else None,
+                TokenBucket(self.tokens_per_minute) if self.tokens_per_minute else None,
+            ]
+            self._buckets[key] = buckets
+        return buckets
+
+    def reserve(self, provider, model, estimated_tokens=0):
+        """Reserve capacity for one request without waiting.
+
+        Returns:
+            float: Seconds the caller must wait before sending
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            requests, tokens = self._buckets_for(provider, model)
+            wait = 0.0
+            if requests is not None:
+                wait = max(wait, requests.reserve(1, now))
+            if tokens is not None and estimated_tokens:
+                wait = max(wait, tokens.reserve(estimated_tokens, now))
+            return wait
+
+    def acquire(self, provider, model, estimated_tokens=0):
+        """Block until a request may be sent."""
+        wait = self.reserve(provider, model, estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, provider, model, estimated_tokens=0):
+        """Wait (without blocking the event loop) until a request may be sent."""
+        wait = self.reserve(provider, model, estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def update_from_headers(self, provider, model, headers):
+        """Recalibrate the buckets from a response's rate-limit headers.
+
+        Args:
+            provider: Provider name ("openai" or "anthropic")
+            model: Model the request was sent to
+            headers: Response headers (any case-insensitive mapping)
+
+        """
+        if provider == "openai":
+            names = {
+                "requests": (
+                    "x-ratelimit-limit-requests",
+                    "x-ratelimit-remaining-requests",
+                    "x-ratelimit-reset-requests",
+                ),
+                "tokens": (
+                    "x-ratelimit-limit-tokens",
+                    "x-ratelimit-remaining-tokens",
+                    "x-ratelimit-reset-tokens",
+                ),
+            }
+        elif provider == "anthropic":
+            names = {
+                "requests": (
+                    "anthropic-ratelimit-requests-limit",
+                    "anthropic-ratelimit-requests-remaining",
+                    "anthropic-ratelimit-requests-reset",
+                ),
+                "tokens": (
+                    "anthropic-ratelimit-tokens-limit",
+                    "anthropic-ratelimit-tokens-remaining",
+                    "anthropic-ratelimit-tokens-reset",
+                ),
+            }
+        else:
+            raise ValueError(f"Invalid provider: {provider}")
+
+        now = time.monotonic()
+        wall_now = time.time()
+        with self._lock:
+            buckets = self._buckets_for(provider, model)
+            for position, kind in enumerate(("requests", "tokens")):
+                limit_name, remaining_name, reset_name = names[kind]
+                limit = _to_int(headers.get(limit_name))
+                remaining = _to_int(headers.get(remaining_name))
+                if limit is None and remaining is None:
+                    continue
+                if buckets[position] is None:
+                    if not limit:
+                        continue
+                    buckets[position] = TokenBucket(limit)
+                buckets[position].recalibrate(
+                    limit,
+                    remaining,
+                    _parse_reset(headers.get(reset_name), wall_now),
+                    now,
+                )
+
+    def limits(self, provider, model):
+        """Return the current limits and remaining capacity for a route.
+
+        Returns:
+            dict: {"requests_per_minute", "requests_available",
+                   "tokens_per_minute", "tokens_available"}; values are None
+                   while a limit is unknown
+
+        """
+        with self._lock:
+            requests, tokens = self._buckets_for(provider, model)
+            if requests is not None:
+                requests._refill(time.monotonic())
+            if tokens is not None:
+                tokens._refill(time.monotonic())
+            return {
+                "requests_per_minute": requests.capacity if requests else None,
+                "requests_available": requests.available if requests else None,
+                "tokens_per_minute": tokens.capacity if tokens else None,
+                "tokens_available": tokens.available if tokens else None,
+            }
+
+    def event_hooks(self, provider):
+        """Build httpx event hooks that apply this limiter to a sync client.
+
+        Used by get_client(rate_limiter=...); you rarely need to call it.
+        """
+
+        def on_request(request):
+            route = _describe_request(request)
+            if route is None:
+                return
+            model, estimated_tokens = route
+            request.extensions["llm_model"] = model
+            self.acquire(provider, model, estimated_tokens)
+
+        def on_response(response):
+            model = response.request.extensions.get("llm_model")
+            if model is not None:
+                self.update_from_headers(provider, model, response.headers)
+
+        return {"request": [on_request], "response": [on_response]}
+
+    def async_event_hooks(self, provider):
+        """Build httpx event hooks that apply this limiter to an async client.
+
+        Used by get_async_client(rate_limiter=...); you rarely need to call it.
+        """
+
+        async def on_request(request):
+            route = _describe_request(request)
+            if route is None:
+                return
+            model, estimated_tokens = route
+            request.extensions["llm_model"] = model
+            await self.aacquire(provider, model, estimated_tokens)
+
+        async def on_response(response):
+            model = response.request.extensions.get("llm_model")
+            if model is not None:
+                self.update_from_headers(provider, model, response.headers)
+
+        return {"request": [on_request], "response": [on_response]}
+
+
+def _describe_request(request):
+    """Return (model, estimated_tokens) for a model request, else None.
+
+    Only JSON POST requests naming a model are rate limited; file uploads,
+    polling and warm-up requests pass straight through.
+    """
+    if request.method != "POST":
+        return None
+    try:
+        body = json.loads(request.content)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(body, dict) or "model" not in body:
+        return None
+    return body["model"], estimate_request_tokens(body)
@@ -0,0 +1,465 @@
+"""Record and replay provider traffic for deterministic, offline reruns.
+
+Set LLM_PROVIDER=replay and every client from get_client() or
+get_async_client() talks to the API through a cassette: a JSON Lines file
+of recorded request/response pairs, including streamed chunk sequences and
+tool calls. Later runs are answered from the cassette, so notebooks and CI
+pipelines rerun in seconds, without API keys or network access.
+
+Configuration (environment variables):
+
+- LLM_REPLAY_MODE: "auto" (default) plays back recorded requests and
+  records new ones; "playback" never touches the network and fails on an
+  unrecorded request; "record" starts a fresh cassette and records every
+  request.
+- LLM_REPLAY_CASSETTE: cassette path (default ".llm_cassette.jsonl"; a
+  ".gz" suffix compresses it).
+- LLM_REPLAY_TIMING: "instant" (default) or "original" to reproduce the
+  recorded latency and chunk pacing.
+- LLM_REPLAY_PROVIDER: provider the recordings are for. Defaults to the
+  provider detected from API keys, then to the one in the cassette.
+
+Requests are matched on method, path and request body, so any change to
+the model, messages or parameters is treated as a new request. Identical
+requests recorded several times are played back in recorded order. Only
+successful responses are recorded.
+"""
+
+import asyncio
+import codecs
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+DEFAULT_CASSETTE = ".llm_cassette.jsonl"
+MODES = ("auto", "playback", "record")
+TIMINGS = ("instant", "original")
+
+# Response headers worth keeping: the body format and the request IDs
+_KEPT_HEADERS = ("content-type", "x-request-id", "request-id")
+
+# Final server-sent events of an OpenAI and an Anthropic stream
+_STREAM_END_MARKERS = ("data: [DONE]", "event: message_stop")
+
+# Cassettes shared by every client in the process, by path
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+class CassetteMissError(LookupError):
+    """Raised in playback mode for a request that was never recorded."""
+
+
+def replay_settings():
+    """Read the replay configuration from the environment.
+
+    Returns:
+        tuple: (mode, cassette_path, timing)
+
+    Raises:
+        ValueError: If LLM_REPLAY_MODE or LLM_REPLAY_TIMING is invalid
+
+    """
+    mode = os.getenv("LLM_REPLAY_MODE", "auto").lower()
+    if mode not in MODES:
+        raise ValueError(
+            f"Invalid LLM_REPLAY_MODE: {mode}. Must be one of {', '.join(MODES)}"
+        )
+    timing = os.getenv("LLM_REPLAY_TIMING", "instant").lower()
+    if timing not in TIMINGS:
+        raise ValueError(
+            f"Invalid LLM_REPLAY_TIMING: {timing}. Must be one of {', '.join(TIMINGS)}"
+        )
+    path = os.path.abspath(os.getenv("LLM_REPLAY_CASSETTE", DEFAULT_CASSETTE))
+    return mode, path, timing
+
+
+def replay_provider():
+    """Return the provider to replay ("openai" or "anthropic").
+
+    Raises:
+        ValueError: If no provider can be determined
+
+    """
+    provider = os.getenv("LLM_REPLAY_PROVIDER", "").lower()
+    if provider:
+        if provider not in ("openai", "anthropic"):
+            raise ValueError(
+                f"Invalid LLM_REPLAY_PROVIDER: {provider}. "
+                "Must be 'openai' or 'anthropic'"
+            )
+        return provider
+
+    if os.getenv("ANTHROPIC_API_KEY"):
+        return "anthropic"
+    if os.getenv("OPENAI_API_KEY"):
+        return "openai"
+
+    _, path, _ = replay_settings()
+    providers = get_cassette(path, "playback").providers
+    if len(providers) == 1:
+        return next(iter(providers))
+    raise ValueError(
+        "LLM_PROVIDER=replay needs LLM_REPLAY_PROVIDER, an API key, or a "
+        f"cassette recorded for a single provider ({path})"
+    )
+
+
+def get_cassette(path, mode):
+    """Return the process-wide Cassette for a path, opening it if needed."""
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = Cassette(path, truncate=mode == "record")
+            _cassettes[path] = cassette
+        return cassette
+
+
+def request_key(request):
+    """Return the key a request is matched on: method, path and body."""
+    body = request.read()
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        canonical = body.decode("utf-8", "replace")
+    target = request.url.raw_path.decode("ascii")
+    digest = hashlib.sha256(f"{request.method} {target}\n{canonical}".encode())
+    return digest.hexdigest()
+
+
+class Cassette:
+    """Recorded request/response pairs in a JSON Lines file. Thread-safe."""
+
+    def __init__(self, path, truncate=False):
+        """Open a cassette, loading its recordings.
+
+        Args:
+            path: Cassette file (".gz" for a gzip-compressed cassette)
+            truncate: Discard existing recordings (record mode)
+
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._served = {}
+        self.providers = set()
+        if truncate:
+            self.path.unlink(missing_ok=True)
+        elif self.path.exists():
+            with self._open("rt") as file:
+                for line in file:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def _open(self, mode):
+        if self.path.suffix == ".gz":
+            return gzip.open(self.path, mode, encoding="utf-8")
+        return self.path.open(mode, encoding="utf-8")
+
+    def _add(self, entry):
+        self._entries.setdefault(entry["key"], []).append(entry)
+        self.providers.add(entry["provider"])
+
+    def next_entry(self, key, reuse_last=True):
+        """Return the next recording for a key.
+
+        Identical requests are answered with their recordings in order.
+        When those run out, the last one is served again if reuse_last,
+        otherwise None is returned so the request can be recorded.
+        """
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            served = self._served.get(key, 0)
+            if served >= len(entries) and not reuse_last:
+                return None
+            self._served[key] = served + 1
+            return entries[min(served, len(entries) - 1)]
+
+    def append(self, entry):
+        """Add a recording and write it to the file."""
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._add(entry)
+            # Count it as served: this run has already seen the response
+            self._served[entry["key"]] = len(self._entries[entry["key"]])
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._open("at") as file:
+                file.write(line + "\n")
+
+
+def _make_entry(provider, key, request, response, latency):
+    """Start a cassette entry for a live response (body added later)."""
+    return {
+        "provider": provider,
+        "key": key,
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        "headers": {
+            name: response.headers[name]
+            for name in _KEPT_HEADERS
+            if name in response.headers
+        },
+        "latency": round(latency, 4),
+    }
+
+
+def _is_stream(response):
+    return response.headers.get("content-type", "").startswith("text/event-stream")
+
+
+def _playback_response(entry, stream):
+    return httpx.Response(entry["status"], headers=entry["headers"], stream=stream)
+
+
+def _miss(request, cassette):
+    return CassetteMissError(
+        f"No recorded response for {request.method} {request.url.path} in "
+        f"{cassette.path} (LLM_REPLAY_MODE=playback). Rerun with "
+        "LLM_REPLAY_MODE=auto and an API key to record it."
+    )
+
+
+class _ChunkRecorder:
+    """Collect decoded chunks and their offsets from the response start."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.chunks = []
+        self.complete = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._tail = ""
+
+    def add(self, data):
+        text = self._decoder.decode(data)
+        offset = round(time.perf_counter() - self.started, 4)
+        self.chunks.append([offset, text])
+        self._tail = (self._tail + text)[-64:]
+        # The SDKs stop reading at the final event and close the response
+        # without draining it, so a stream is complete once that event is in
+        if any(marker in self._tail for marker in _STREAM_END_MARKERS):
+            self.complete = True
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Pass a live response body through, recording it once fully read."""
+
+    def __init__(self, stream, entry, cassette):
+        self._stream = stream
+        self._entry = entry
+        self._cassette = cassette
+        self._recorder = _ChunkRecorder()
+
+    def __iter__(self):
+        for data in self._stream:
+            self._recorder.add(data)
+            yield data
+        self._recorder.complete = True
+
+    def close(self):
+        self._stream.close()
+        _save(self._entry, self._recorder, self._cassette)
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    """Async version of _RecordingStream."""
+
+    def __init__(self, stream, entry, cassette):
+        self._stream = stream
+        self._entry = entry
+        self._cassette = cassette
+        self._recorder = _ChunkRecorder()
+
+    async def __aiter__(self):
+        async for data in self._stream:
+            self._recorder.add(data)
+            yield data
+        self._recorder.complete = True
+
+    async def aclose(self):
+        await self._stream.aclose()
+        _save(self._entry, self._recorder, self._cassette)
+
+
+def _save(entry, recorder, cassette):
+    """Write a fully read response to the cassette (partial reads are not)."""
+    if not recorder.complete:
+        return
+    recorder.complete = False
+    if entry.pop("stream"):
+        entry["chunks"] = recorder.chunks
+    else:
+        entry["body"] = "".join(text for _, text in recorder.chunks)
+    cassette.append(entry)
+
+
+class _PlaybackStream(httpx.SyncByteStream):
+    """Serve a recorded body, optionally at its original pace."""
+
+    def __init__(self, entry, timing):
+        self._entry = entry
+        self._timing = timing
+
+    def __iter__(self):
+        if "body" in self._entry:
+            yield self._entry["body"].encode()
+            return
+        elapsed = 0.0
+        for offset, text in self._entry["chunks"]:
+            if self._timing == "original" and offset > elapsed:
+                time.sleep(offset - elapsed)
+                elapsed = offset
+            yield text.encode()
+
+
+class _AsyncPlaybackStream(httpx.AsyncByteStream):
+    """Async version of _PlaybackStream."""
+
+    def __init__(self, entry, timing):
+        self._entry = entry
+        self._timing = timing
+
+    async def __aiter__(self):
+        if "body" in self._entry:
+            yield self._entry["body"].encode()
+            return
+        elapsed = 0.0
+        for offset, text in self._entry["chunks"]:
+            if self._timing == "original" and offset > elapsed:
+                await asyncio.sleep(offset - elapsed)
+                elapsed = offset
+            yield text.encode()
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that plays back and records through a Cassette."""
+
+    def __init__(self, provider, cassette, mode, timing, live=None):
+        """Create the transport.
+
+        Args:
+            provider: Provider the traffic belongs to
+            cassette: Cassette to play back from and record into
+            mode: "auto", "playback" or "record"
+            timing: "instant" or "original"
+            live: Transport for real requests (unused in playback mode)
+
+        """
+        self.provider = provider
+        self.cassette = cassette
+        self.mode = mode
+        self.timing = timing
+        self.live = live
+
+    def handle_request(self, request):
+        """Answer from the cassette, or send the request live and record it."""
+        key = request_key(request)
+        if self.mode != "record":
+            entry = self.cassette.next_entry(key, reuse_last=self.mode == "playback")
+            if entry is not None:
+                if self.timing == "original":
+                    time.sleep(entry["latency"])
+                return _playback_response(entry, _PlaybackStream(entry, self.timing))
+            if self.mode == "playback":
+                raise _miss(request, self.cassette)
+
+        # Plain bodies keep the cassette readable and streams chunked as sent
+        request.headers["Accept-Encoding"] = "identity"
+        started = time.perf_counter()
+        response = self.live.handle_request(request)
+        if not response.is_success:
+            return response
+        entry = _make_entry(
+            self.provider, key, request, response, time.perf_counter() - started
+        )
+        entry["stream"] = _is_stream(response)
+        stream = _RecordingStream(response.stream, entry, self.cassette)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=stream,
+            extensions=response.extensions,
+        )
+
+    def close(self):
+        """Close the live connection pool."""
+        if self.live is not None:
+            self.live.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """Async version of CassetteTransport."""
+
+    def __init__(self, provider, cassette, mode, timing, live=None):
+        """Create the transport (arguments as for CassetteTransport)."""
+        self.provider = provider
+        self.cassette = cassette
+        self.mode = mode
+        self.timing = timing
+        self.live = live
+
+    async def handle_async_request(self, request):
+        """Answer from the cassette, or send the request live and record it."""
+        key = request_key(request)
+        if self.mode != "record":
+            entry = self.cassette.next_entry(key, reuse_last=self.mode == "playback")
+            if entry is not None:
+                if self.timing == "original":
+                    await asyncio.sleep(entry["latency"])
+                stream = _AsyncPlaybackStream(entry, self.timing)
+                return _playback_response(entry, stream)
+            if self.mode == "playback":
+                raise _miss(request, self.cassette)
+
+        request.headers["Accept-Encoding"] = "identity"
+        started = time.perf_counter()
+        response = await self.live.handle_async_request(request)
+        if not response.is_success:
+            return response
+        entry = _make_entry(
+            self.provider, key, request, response, time.perf_counter() - started
+        )
+        entry["stream"] = _is_stream(response)
+        stream = _AsyncRecordingStream(response.stream, entry, self.cassette)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=stream,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        """Close the live connection pool."""
+        if self.live is not None:
+            await self.live.aclose()
+
+
+def make_transport(provider, settings, limits, use_async=False):
+    """Build the cassette transport for a client created by get_client().
+
+    Args:
+        provider: Provider the client talks to
+        settings: (mode, cassette_path, timing) from replay_settings()
+        limits: httpx.Limits for the live connection pool
+        use_async: Build an AsyncCassetteTransport
+
+    Returns:
+        CassetteTransport or AsyncCassetteTransport
+
+    """
+    mode, path, timing = settings
+    cassette = get_cassette(path, mode)
+    live = None
+    if mode != "playback":
+        live_cls = httpx.AsyncHTTPTransport if use_async else httpx.HTTPTransport
+        live = live_cls(limits=limits)
+    transport_cls = AsyncCassetteTransport if use_async else CassetteTransport
+    return transport_cls(provider, cassette, mode, timing, live)
@@ -0,0 +1,199 @@
+"""Persistent on-disk cache for LLM responses.
+
+Re-running a script or notebook usually sends exactly the same requests as
+last time. With a cache, those repeated requests are answered from a local
+SQLite file in microseconds instead of paying for another API call:
+
+    cache = ResponseCache("data/.llm_cache.sqlite")
+    text = create_completion(client, provider, model, messages,
+                             temperature=0, cache=cache)
+
+Responses are keyed on a hash of everything that affects the output
+(provider, model, messages, tools and sampling parameters). Old entries are
+evicted by age and by total count.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+def make_cache_key(provider, model, messages, tools=None, **kwargs):
+    """Build a canonical hash for a request.
+
+    Dict keys are sorted so logically identical requests always produce the
+    same key regardless of how they were built.
+
+    Args:
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name
+        messages: List of message dicts
+        tools: Optional list of tool definitions
+        **kwargs: Sampling and other request parameters
+
+    Returns:
+        str: Hex SHA-256 digest identifying the request
+
+    """
+    payload = {
+        "provider": provider,
+        "model": model,
+        "messages": messages,
+        "tools": tools,
+        "kwargs": kwargs,
+    }
+    canonical = json.dumps(
+        payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with size and age based eviction.
+
+    The cache is safe to share between threads (e.g. with
+    create_completions_batch). Hits do not write to disk; access times are
+    buffered in memory and saved with the next write, so lookups stay fast.
+    """
+
+    def __init__(self, path=".llm_cache.sqlite", max_entries=100_000, max_age=None):
+        """Open (or create) a cache file.
+
+        Args:
+            path: Path of the SQLite file (created if missing). Use ":memory:"
+                  for a cache that lives only as long as the process.
+            max_entries: Maximum number of stored responses; the least recently
+                         used ones are evicted beyond this
+            max_age: Optional maximum age in seconds; older entries are treated
+                     as misses and removed
+
+        """
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._count = self._count_entries()
+        self.evict()
+
+    def __len__(self):
+        return self._count
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is None:
+                self.misses += 1
+                return None
+            if self.max_age is not None and now - row[1] > self.max_age:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._touched.pop(key, None)
+                self._count -= 1
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        """Store a value (a string) under key."""
+        now = time.time()
+        with self._lock:
+            self._flush_touched()
+            exists = self._conn.execute(
+                "SELECT 1 FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, "
+                "accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._conn.commit()
+            if exists is None:
+                self._count += 1
+            needs_eviction = self._count > self.max_entries
+        if needs_eviction:
+            # Trim a little below the limit so eviction is not rerun on
+            # every following write
+            self.evict(keep=max(1, self.max_entries - max(1, self.max_entries // 10)))
+
+    def evict(self, keep=None):
+        """Remove expired entries and trim the cache to max_entries.
+
+        Args:
+            keep: Number of most recently used entries to keep
+                  (defaults to max_entries)
+
+        Returns:
+            int: Number of entries removed
+
+        """
+        with self._lock:
+            self._flush_touched()
+            removed = 0
+            if self.max_age is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?",
+                    (time.time() - self.max_age,),
+                ).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries if keep is None else keep,),
+            ).rowcount
+            self._conn.commit()
+            self._count = self._count_entries()
+            return removed
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._count = 0
+
+    def close(self):
+        """Save pending access times and close the database."""
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+    def _count_entries(self):
+        """Count stored entries."""
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _flush_touched(self):
+        """Write buffered access times (caller must hold the lock)."""
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._touched.items()],
+        )
+        self._touched.clear()
@@ -0,0 +1,364 @@
+"""Retries with jittered backoff and per-provider circuit breakers.
+
+Transient failures (rate limits, overloaded servers, timeouts) are common in
+long batch jobs. A RetryPolicy retries them with exponential backoff and
+"full jitter" (a random delay between zero and the backoff cap), so many
+workers that fail at the same moment do not all retry at the same moment.
+A ``Retry-After`` header from the provider always takes precedence.
+
+When a provider is clearly degraded, retrying only adds load. Each provider
+therefore has a CircuitBreaker: after several consecutive failures it
+"opens" and calls fail immediately with CircuitOpenError until a cool-down
+has passed, after which a single trial request decides whether to close it.
+
+    policy = RetryPolicy(max_attempts=6, max_elapsed=600)
+    text = create_completion(client, provider, model, messages, retry=policy)
+
+Pair a policy with get_client(max_retries=0) so the SDK's own retries do not
+multiply with these.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, server errors
+# and Anthropic's "overloaded" (529)
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+# SDK exception classes (from both openai and anthropic) for network failures
+_RETRYABLE_ERROR_NAMES = frozenset({"APIConnectionError", "APITimeoutError"})
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+def is_retryable(error):
+    """Return True if an exception is a transient API failure.
+
+    Works with exceptions from both the openai and anthropic SDKs.
+    """
+    if type(error.__cause__).__name__ == "CassetteMissError":
+        # A request missing from a replay cassette will stay missing
+        return False
+    if isinstance(error, TimeoutError | ConnectionError):
+        return True
+    if any(cls.__name__ in _RETRYABLE_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(error):
+    """Return the delay requested by a Retry-After header, if any.
+
+    Supports ``retry-after-ms``, ``retry-after`` in seconds and
+    ``retry-after`` as an HTTP date.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Fail fast while a provider is degraded.
+
+    States: "closed" (normal), "open" (calls rejected) and "half_open"
+    (one trial call allowed after recovery_time).
+    """
+
+    def __init__(self, failure_threshold=5, recovery_time=30.0):
+        """Create a closed breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_time: Seconds to stay open before allowing a trial call
+
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Check whether a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open":
+                remaining = self._opened_at + self.recovery_time - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(
+                        f"Circuit open after {self.failures} consecutive "
+                        f"failures; retrying in {remaining:.1f}s"
+                    )
+                self.state = "half_open"
+            if self._trial_in_flight:
+                raise CircuitOpenError("Circuit half-open; trial call in progress")
+            self._trial_in_flight = True
+
+    def available(self):
+        """Return True if before_call() would let a call through now.
+
+        Unlike before_call(), this does not claim the half-open trial slot.
+        """
+        with self._lock:
+            if self._trial_in_flight:
+                return False
+            if self.state == "open":
+                return time.monotonic() >= self._opened_at + self.recovery_time
+            return True
+
+    def record_success(self):
+        """Close the circuit after a successful call."""
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_cancelled(self):
+        """Release the trial slot of a call abandoned before it finished."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Count a transient failure, opening the circuit if needed."""
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider, failure_threshold=5, recovery_time=30.0):
+    """Return the process-wide circuit breaker for a provider.
+
+    The settings only apply when the breaker is first created.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(failure_threshold, recovery_time)
+            _breakers[provider] = breaker
+        return breaker
+
+
+class RetryPolicy:
+    """Retry transient failures with exponential backoff and full jitter.
+
+    A policy is thread-safe and can be shared by all workers. Retry counts
+    are tracked in ``stats``: totals plus a histogram of retries per call.
+    """
+
+    def __init__(
+        self,
+        max_attempts=5,
+        base_delay=0.5,
+        max_delay=30.0,
+        max_elapsed=300.0,
+        use_circuit_breaker=True,
+        on_retry=None,
+    ):
+        """Create a policy.
+
+        Args:
+            max_attempts: Total attempts per call, including the first
+            base_delay: Backoff cap in seconds for the first retry; doubles
+                        with every further retry
+            max_delay: Upper bound for a single backoff delay
+            max_elapsed: Give up when the next retry would start later than
+                         this many seconds after the call started
+            use_circuit_breaker: Consult the provider's CircuitBreaker
+            on_retry: Optional callback(attempt, error, delay) invoked before
+                      each retry, e.g. for logging
+
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.use_circuit_breaker = use_circuit_breaker
+        self.on_retry = on_retry
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "retries_per_call": Counter(),
+        }
+
+    def backoff(self, retry_number):
+        """Return a full-jitter delay for the given retry (1-based)."""
+        cap = min(self.max_delay, self.base_delay * 2 ** (retry_number - 1))
+        return random.uniform(0, cap)
+
+    def _next_delay(self, error, attempt, started):
+        """Return the delay before the next attempt, or None to give up."""
+        if attempt >= self.max_attempts or not is_retryable(error):
+            return None
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = self.backoff(attempt)
+        if time.monotonic() - started + delay > self.max_elapsed:
+            return None
+        return delay
+
+    def _record(self, retries, failed):
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["retries"] += retries
+            self.stats["failures"] += int(failed)
+            self.stats["retries_per_call"][retries] += 1
+
+    def call(self, provider, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs), retrying transient failures.
+
+        Args:
+            provider: Provider name, used to pick the circuit breaker
+            fn: Function performing the request
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            object: Whatever fn returns
+
+        Raises:
+            CircuitOpenError: If the provider's circuit is open
+            Exception: The last error once retries are exhausted
+
+        """
+        breaker = get_circuit_breaker(provider) if self.use_circuit_breaker else None
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as error:
+                delay = self._after_failure(breaker, error, attempt, started)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled or interrupted: free a half-open trial slot
+                if breaker is not None:
+                    breaker.record_cancelled()
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            self._record(attempt - 1, failed=False)
+            return result
+
+    async def acall(self, provider, fn, *args, **kwargs):
+        """Async version of call(); fn must return an awaitable."""
+        breaker = get_circuit_breaker(provider) if self.use_circuit_breaker else None
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as error:
+                delay = self._after_failure(breaker, error, attempt, started)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled or interrupted: free a half-open trial slot
+                if breaker is not None:
+                    breaker.record_cancelled()
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            self._record(attempt - 1, failed=False)
+            return result
+
+    def iterate(self, provider, make_iter):
+        """Yield from make_iter(), retrying failures before the first item.
+
+        Once a stream has produced output, retrying would duplicate text, so
+        errors after the first item are raised as-is.
+        """
+
+        def _start():
+            iterator = iter(make_iter())
+            return iterator, next(iterator, _END)
+
+        iterator, item = self.call(provider, _start)
+        while item is not _END:
+            yield item
+            item = next(iterator, _END)
+
+    async def aiterate(self, provider, make_iter):
+        """Async version of iterate() for async generators."""
+
+        async def _start():
+            iterator = aiter(make_iter())
+            return iterator, await anext(iterator, _END)
+
+        iterator, item = await self.acall(provider, _start)
+        while item is not _END:
+            yield item
+            item = await anext(iterator, _END)
+
+    def _after_failure(self, breaker, error, attempt, started):
+        """Update breaker and stats after an error; return delay or None."""
+        if breaker is not None:
+            if is_retryable(error):
+                breaker.record_failure()
+            else:
+                # The provider answered (e.g. a 400), so it is not degraded
+                breaker.record_success()
+        delay = self._next_delay(error, attempt, started)
+        if delay is None:
+            self._record(attempt - 1, failed=True)
+            return None
+        if self.on_retry is not None:
+            self.on_retry(attempt, error, delay)
+        return delay
+
+
+# Sentinel marking the end of an iterator
+_END = object()
@@ -0,0 +1,489 @@
+"""Route requests across providers by measured latency, with failover.
+
+get_provider() picks one provider for the whole process, so an outage or a
+slow spell at that provider hits every request. A Router holds clients for
+every provider with an API key and a mapping of equivalent models:
+
+    router = Router({
+        "fast": {"openai": "gpt-4o-mini", "anthropic": "claude-haiku-4-5"},
+        "smart": {"openai": "gpt-4o", "anthropic": "claude-sonnet-4-5"},
+    })
+    text = router.create_completion(messages, model="fast")
+
+Each (provider, model) route tracks an exponentially weighted moving
+average (EWMA) of its latency and error rate. A request goes to the fastest
+healthy route; if it fails with a transient error (or the route's circuit
+breaker is open), the next route is tried at once. Errors that would fail
+anywhere, such as a 400 for a malformed request, are raised directly.
+
+A degraded route is not written off: its error rate decays over time (it
+halves every recovery_time), and once its circuit breaker's cool-down has
+passed it gets a trial request. A success clears its error rate, so traffic
+fails back to a faster provider once it has recovered.
+
+With hedge=True, a request that has not finished after its route's p95
+latency gets a backup request on the next route, and the first answer
+wins. The async router cancels the losing request; the sync router cannot
+interrupt a request in its thread, so the loser finishes in the background
+and its answer is discarded. Hedging trims the latency tail at the cost of
+some duplicate requests (about 5% with the p95 trigger).
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.llm_client import (
+    acreate_completion,
+    create_completion,
+    get_async_client,
+    get_client,
+)
+from src.retry import CircuitBreaker, CircuitOpenError, is_retryable
+from src.stream_metrics import percentile
+
+DEFAULT_ALPHA = 0.2
+DEFAULT_MAX_ERROR_RATE = 0.5
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+
+# Recent latencies kept per route for the hedge percentile
+LATENCY_WINDOW = 200
+
+
+class Route:
+    """One provider and model, with its latency and error statistics.
+
+    Thread-safe. Latency is only measured on successful calls.
+    """
+
+    def __init__(
+        self,
+        provider,
+        model,
+        alpha=DEFAULT_ALPHA,
+        failure_threshold=5,
+        recovery_time=30.0,
+    ):
+        """Create a route with no history.
+
+        Args:
+            provider: Provider name ("openai" or "anthropic")
+            model: Model name (provider-specific)
+            alpha: EWMA weight of the newest observation (0-1)
+            failure_threshold: Consecutive failures that open the route's
+                               circuit breaker
+            recovery_time: Seconds before an open route is tried again;
+                           also the half-life of the error-rate EWMA
+
+        """
+        self.provider = provider
+        self.model = model
+        self.alpha = alpha
+        self.recovery_time = recovery_time
+        self.latency = None
+        self._error_rate = 0.0
+        self._error_time = time.monotonic()
+        self.calls = 0
+        self.failures = 0
+        self.breaker = CircuitBreaker(failure_threshold, recovery_time)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        """Route name, "provider:model"."""
+        return f"{self.provider}:{self.model}"
+
+    @property
+    def error_rate(self):
+        """Error-rate EWMA, halving every recovery_time without calls."""
+        with self._lock:
+            return self._decayed_error_rate()
+
+    def _decayed_error_rate(self):
+        """Return the error rate decayed to now (lock held)."""
+        if not self.recovery_time:
+            return self._error_rate
+        elapsed = time.monotonic() - self._error_time
+        return self._error_rate * 0.5 ** (elapsed / self.recovery_time)
+
+    def _set_error_rate(self, value):
+        self._error_rate = value
+        self._error_time = time.monotonic()
+
+    def record_success(self, latency):
+        """Fold a successful call's latency (seconds) into the statistics.
+
+        A success on a route whose breaker was open or half-open (a trial
+        call) clears its error rate, so the route is healthy again at once.
+        """
+        recovered = self.breaker.state != "closed"
+        with self._lock:
+            self.calls += 1
+            self._latencies.append(latency)
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+            if recovered:
+                self._set_error_rate(0.0)
+            else:
+                error_rate = self._decayed_error_rate()
+                self._set_error_rate(error_rate - self.alpha * error_rate)
+        self.breaker.record_success()
+
+    def record_failure(self):
+        """Count a transient failure."""
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            error_rate = self._decayed_error_rate()
+            self._set_error_rate(error_rate + self.alpha * (1.0 - error_rate))
+        self.breaker.record_failure()
+
+    def latency_percentile(self, q, min_samples=1):
+        """Return the q-th percentile of recent latencies, or None."""
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            return percentile(list(self._latencies), q)
+
+    def stats(self):
+        """Return the route's statistics as a dict."""
+        return {
+            "route": self.name,
+            "provider": self.provider,
+            "model": self.model,
+            "latency": self.latency,
+            "p95_latency": self.latency_percentile(95),
+            "error_rate": self.error_rate,
+            "calls": self.calls,
+            "failures": self.failures,
+            "circuit": self.breaker.state,
+        }
+
+
+def _is_failover_error(error):
+    """Return True if another route may succeed where this one failed."""
+    return isinstance(error, CircuitOpenError) or is_retryable(error)
+
+
+class Router:
+    """Send each request to the fastest healthy equivalent model."""
+
+    def __init__(
+        self,
+        models,
+        clients=None,
+        async_clients=None,
+        *,
+        alpha=DEFAULT_ALPHA,
+        max_error_rate=DEFAULT_MAX_ERROR_RATE,
+        hedge=False,
+        hedge_percentile=DEFAULT_HEDGE_PERCENTILE,
+        hedge_min_samples=DEFAULT_HEDGE_MIN_SAMPLES,
+        failure_threshold=5,
+        recovery_time=30.0,
+        max_workers=32,
+    ):
+        """Create a router.
+
+        Args:
+            models: Dict mapping a model alias to {provider: model name}
+            clients: Optional dict of provider -> client. By default a
+                     client is made with get_client(provider, max_retries=0)
+                     for every provider with an API key; providers without
+                     one get no routes.
+            async_clients: Optional dict of provider -> async client for
+                           acreate_completion(); by default taken from
+                           get_async_client(provider, max_retries=0)
+            alpha: EWMA weight of the newest latency and error observation
+            max_error_rate: Routes whose error-rate EWMA is above this are
+                            only used when no healthy route is left
+            hedge: Default for hedging requests (see create_completion)
+            hedge_percentile: Latency percentile of the primary route after
+                              which the backup request is sent
+            hedge_min_samples: Latencies a route needs before it is hedged
+            failure_threshold: Consecutive failures that open a route
+            recovery_time: Seconds before an open route is tried again
+            max_workers: Threads for hedged sync requests
+
+        """
+        if clients is None:
+            clients = {}
+            providers = {
+                provider for mapping in models.values() for provider in mapping
+            }
+            for provider in sorted(providers):
+                try:
+                    clients[provider] = get_client(provider, max_retries=0)
+                except ValueError:
+                    # No API key for this provider
+                    continue
+        self.clients = clients
+        self.async_clients = async_clients
+        self.max_error_rate = max_error_rate
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_workers = max_workers
+        self.hedges = 0
+        self.hedge_wins = 0
+
+        self.routes = {
+            alias: [
+                Route(provider, model, alpha, failure_threshold, recovery_time)
+                for provider, model in mapping.items()
+                if provider in clients or async_clients and provider in async_clients
+            ]
+            for alias, mapping in models.items()
+        }
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def ranked_routes(self, model):
+        """Return a model alias's routes in the order they would be tried.
+
+        Healthy routes come first, fastest first (routes without a latency
+        yet count as fastest, so each gets measured); then the others, the
+        least failing first. An open route whose cool-down has passed counts
+        as healthy, so it gets the trial call that can close its breaker.
+        """
+        routes = self.routes.get(model)
+        if not routes:
+            raise ValueError(f"No routes for model {model!r}")
+        healthy = []
+        degraded = []
+        for route in routes:
+            error_rate = route.error_rate
+            if route.breaker.available() and error_rate <= self.max_error_rate:
+                healthy.append((route.latency or 0.0, route))
+            else:
+                degraded.append((error_rate, route))
+        healthy.sort(key=lambda pair: pair[0])
+        degraded.sort(key=lambda pair: pair[0])
+        return [route for _, route in healthy + degraded]
+
+    def stats(self):
+        """Return every route's statistics, keyed by model alias."""
+        return {
+            alias: [route.stats() for route in routes]
+            for alias, routes in self.routes.items()
+        }
+
+    def _hedge_delay(self, route, hedge, routes):
+        """Seconds to wait before hedging route, or None for no hedge."""
+        if not hedge or len(routes) < 2:
+            return None
+        return route.latency_percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    def _attempt(self, route, messages, kwargs):
+        """Send one request on a route, recording the outcome."""
+        route.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            result = create_completion(
+                self.clients[route.provider],
+                route.provider,
+                route.model,
+                messages,
+                **kwargs,
+            )
+        except Exception as error:
+            if is_retryable(error):
+                route.record_failure()
+            else:
+                # The provider answered (e.g. a 400), so it is not degraded
+                route.breaker.record_success()
+            raise
+        route.record_success(time.perf_counter() - started)
+        return result
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="router-hedge"
+                )
+            return self._executor
+
+    def create_completion(self, messages, model, *, hedge=None, **kwargs):
+        """Create a completion on the best route for a model alias.
+
+        Args:
+            messages: List of message dicts with "role" and "content"
+            model: Model alias (a key of the models mapping)
+            hedge: Send a backup request on the next route if this one is
+                   slower than its p95 latency (default: the router's hedge)
+            **kwargs: Additional parameters for create_completion()
+                      (temperature, max_tokens, return_result, etc.)
+
+        Returns:
+            str: The response text content (CompletionResult if
+                 return_result; its provider and model tell the route)
+
+        Raises:
+            Exception: A non-transient error at once, or the first
+                       transient error if every route failed
+
+        """
+        routes = [
+            route
+            for route in self.ranked_routes(model)
+            if route.provider in self.clients
+        ]
+        if not routes:
+            raise ValueError(f"No sync clients for model {model!r}")
+        hedge = self.hedge if hedge is None else hedge
+        delay = self._hedge_delay(routes[0], hedge, routes)
+        if delay is not None:
+            return self._hedged(routes, delay, messages, kwargs)
+
+        errors = []
+        for route in routes:
+            try:
+                return self._attempt(route, messages, kwargs)
+            except Exception as error:
+                if not _is_failover_error(error):
+                    raise
+                errors.append(error)
+        raise _first_real_error(errors)
+
+    def _hedged(self, routes, delay, messages, kwargs):
+        """Race the primary route against backups started after delay."""
+        executor = self._get_executor()
+        remaining = list(routes)
+        futures = {}
+
+        def launch():
+            route = remaining.pop(0)
+            futures[executor.submit(self._attempt, route, messages, kwargs)] = route
+
+        launch()
+        timeout = delay
+        hedged = False
+        errors = []
+        while futures:
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            timeout = None
+            if not done:
+                # The primary is slower than usual: hedge on the next route
+                self.hedges += 1
+                hedged = True
+                launch()
+                continue
+            for future in done:
+                route = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as error:
+                    if not _is_failover_error(error):
+                        raise
+                    errors.append(error)
+                    continue
+                if hedged and route is not routes[0]:
+                    self.hedge_wins += 1
+                # A thread cannot be interrupted: the loser's answer is dropped
+                return result
+            if remaining and not futures:
+                launch()
+        raise _first_real_error(errors)
+
+    def _async_client(self, provider):
+        if self.async_clients is not None:
+            return self.async_clients[provider]
+        return get_async_client(provider, max_retries=0)
+
+    async def _aattempt(self, route, messages, kwargs):
+        """Async version of _attempt()."""
+        route.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            result = await acreate_completion(
+                self._async_client(route.provider),
+                route.provider,
+                route.model,
+                messages,
+                **kwargs,
+            )
+        except asyncio.CancelledError:
+            # Lost a hedge race: says nothing about the route's health
+            route.breaker.record_cancelled()
+            raise
+        except Exception as error:
+            if is_retryable(error):
+                route.record_failure()
+            else:
+                route.breaker.record_success()
+            raise
+        route.record_success(time.perf_counter() - started)
+        return result
+
+    async def acreate_completion(self, messages, model, *, hedge=None, **kwargs):
+        """Async version of create_completion().
+
+        When hedging, the losing request is cancelled, which closes its
+        connection and stops the generation being billed further.
+        """
+        routes = self.ranked_routes(model)
+        if self.async_clients is not None:
+            routes = [route for route in routes if route.provider in self.async_clients]
+        if not routes:
+            raise ValueError(f"No async clients for model {model!r}")
+        hedge = self.hedge if hedge is None else hedge
+        delay = self._hedge_delay(routes[0], hedge, routes)
+
+        remaining = list(routes)
+        tasks = set()
+        errors = []
+
+        def launch():
+            route = remaining.pop(0)
+            task = asyncio.ensure_future(self._aattempt(route, messages, kwargs))
+            tasks.add(task)
+            return task
+
+        primary = launch()
+        timeout = delay
+        hedged = False
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                timeout = None
+                if not done:
+                    self.hedges += 1
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if hedged and primary not in done:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if not _is_failover_error(error):
+                        raise error
+                    errors.append(error)
+                if remaining and not tasks:
+                    launch()
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise _first_real_error(errors)
+
+
+def _first_real_error(errors):
+    """Pick the error to raise when every route failed.
+
+    A provider error says more than the CircuitOpenError of a route that
+    was skipped.
+    """
+    for error in errors:
+        if not isinstance(error, CircuitOpenError):
+            return error
+    return errors[0]
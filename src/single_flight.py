@@ -0,0 +1,241 @@
+"""Single-flight: identical concurrent requests share one API call.
+
+When many workers send the exact same request at the same time (a popular
+FAQ question, duplicated rows in a batch), each would otherwise be sent and
+billed separately. With a SingleFlight, the first caller's request goes out
+and every identical caller that arrives while it is in flight waits for it
+and gets the same result:
+
+    flights = SingleFlight()
+    text = create_completion(client, provider, model, messages,
+                             single_flight=flights)
+
+Streams are fanned out: every caller receives all chunks, from the first
+one, as they arrive, including callers that join mid-stream. A caller that
+stops reading early does not affect the others.
+
+Unlike a ResponseCache, nothing is kept once the request completes: the
+next identical request goes to the API again. Usage callbacks and ledgers
+see one call, made with the options of the caller whose request went out.
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    """One in-flight request and the callers waiting for it."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """Chunks of one stream, read independently by every consumer.
+
+    A background thread pumps the source stream, so the request runs to the
+    end at the pace of the API whatever the consumers do. Chunks are kept
+    until the stream ends so that late consumers can replay them.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.changed = threading.Condition()
+
+    def pump(self, make_iter, on_finish):
+        """Read the source stream (in its own thread)."""
+        try:
+            for chunk in make_iter():
+                with self.changed:
+                    self.chunks.append(chunk)
+                    self.changed.notify_all()
+        except Exception as error:
+            self.error = error
+        finally:
+            on_finish()
+            with self.changed:
+                self.finished = True
+                self.changed.notify_all()
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self.changed:
+                self.changed.wait_for(
+                    lambda: position < len(self.chunks) or self.finished
+                )
+                new = self.chunks[position:]
+                if not new and self.error is not None:
+                    raise self.error
+            if not new:
+                return
+            position += len(new)
+            yield from new
+
+
+class _AsyncBroadcast:
+    """Async version of _Broadcast; the source is pumped by a task."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.changed = asyncio.Condition()
+        self.task = None
+
+    async def pump(self, make_iter, on_finish):
+        """Read the source stream (as its own task)."""
+        try:
+            async for chunk in make_iter():
+                async with self.changed:
+                    self.chunks.append(chunk)
+                    self.changed.notify_all()
+        except Exception as error:
+            self.error = error
+        finally:
+            on_finish()
+            async with self.changed:
+                self.finished = True
+                self.changed.notify_all()
+
+    async def __aiter__(self):
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(
+                    lambda: position < len(self.chunks) or self.finished
+                )
+                new = self.chunks[position:]
+                if not new and self.error is not None:
+                    raise self.error
+            if not new:
+                return
+            position += len(new)
+            for chunk in new:
+                yield chunk
+
+
+class SingleFlight:
+    """Registry of in-flight requests, keyed by request. Thread-safe.
+
+    One SingleFlight is usually shared by the whole process. Async requests
+    are only shared with callers on the same event loop.
+    """
+
+    def __init__(self):
+        """Create an empty registry."""
+        self.requests = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self._tasks = {}
+        self._async_streams = {}
+
+    def _join(self, flights, key, create):
+        """Return (flight, is_new), registering create() if key is free."""
+        with self._lock:
+            flight = flights.get(key)
+            if flight is not None:
+                self.shared += 1
+                return flight, False
+            flight = flights[key] = create()
+            self.requests += 1
+            return flight, True
+
+    def _forget(self, flights, key):
+        with self._lock:
+            flights.pop(key, None)
+
+    def do(self, key, fn):
+        """Call fn(), or wait for the identical call already in flight.
+
+        Args:
+            key: Request key (see make_cache_key)
+            fn: Callable sending the request
+
+        Returns:
+            object: fn()'s result, shared by every caller with this key
+
+        Raises:
+            Exception: fn()'s error, raised to every caller with this key
+
+        """
+        call, is_new = self._join(self._calls, key, _Call)
+        if not is_new:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            self._forget(self._calls, key)
+            call.done.set()
+        return call.result
+
+    def stream(self, key, make_iter):
+        """Iterate make_iter()'s stream, shared with identical callers.
+
+        Args:
+            key: Request key (see make_cache_key)
+            make_iter: Callable returning the stream's iterator
+
+        Yields:
+            object: Every chunk of the stream, from the first one
+
+        """
+        broadcast, is_new = self._join(self._streams, key, _Broadcast)
+        if is_new:
+            threading.Thread(
+                target=broadcast.pump,
+                args=(make_iter, lambda: self._forget(self._streams, key)),
+                name="single-flight-stream",
+                daemon=True,
+            ).start()
+        yield from broadcast
+
+    async def ado(self, key, make_awaitable):
+        """Async version of do().
+
+        The request runs as its own task, so a caller being cancelled does
+        not cancel the request for the others.
+        """
+        slot = (asyncio.get_running_loop(), key)
+
+        def finish(task):
+            self._forget(self._tasks, slot)
+            if not task.cancelled():
+                # Mark the error retrieved even if every caller gave up
+                task.exception()
+
+        def create():
+            task = asyncio.ensure_future(make_awaitable())
+            task.add_done_callback(finish)
+            return task
+
+        task, _ = self._join(self._tasks, slot, create)
+        return await asyncio.shield(task)
+
+    async def astream(self, key, make_iter):
+        """Async version of stream(); make_iter returns an async iterator."""
+        slot = (asyncio.get_running_loop(), key)
+        broadcast, is_new = self._join(self._async_streams, slot, _AsyncBroadcast)
+        if is_new:
+            broadcast.task = asyncio.ensure_future(
+                broadcast.pump(
+                    make_iter, lambda: self._forget(self._async_streams, slot)
+                )
+            )
+        async for chunk in broadcast:
+            yield chunk
@@ -0,0 +1,291 @@
+"""Latency instrumentation for streaming completions.
+
+For chat interfaces, what users perceive is time-to-first-token (TTFT) and
+the pace at which text arrives afterwards, not total request time. The
+instrumented stream records, for every call:
+
+- time-to-first-token,
+- the arrival time of each chunk and the gaps between chunks,
+- total duration and output tokens per second.
+
+Metrics are handed to an optional callback and/or aggregated per provider
+and model in a LatencyHistogram, so models can be compared on real
+distributions:
+
+    histogram = LatencyHistogram()
+    for chunk in create_instrumented_streaming_completion(
+        client, provider, model, messages, histogram=histogram
+    ):
+        print(chunk, end="")
+    print(histogram.summary())
+"""
+
+import threading
+import time
+from collections import deque
+
+from src.llm_client import acreate_streaming_completion, create_streaming_completion
+from src.rate_limit import CHARS_PER_TOKEN
+
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of values, interpolating linearly.
+
+    Returns None for an empty sequence.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    fraction = position - lower
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+
+
+class StreamMetrics:
+    """Timing measurements for a single streamed completion.
+
+    Times are seconds from time.perf_counter(); derived values are exposed
+    as properties.
+    """
+
+    __slots__ = (
+        "provider",
+        "model",
+        "started_at",
+        "chunk_times",
+        "finished_at",
+        "output_chars",
+        "output_tokens",
+        "error",
+    )
+
+    def __init__(self, provider, model):
+        """Start measuring a stream now."""
+        self.provider = provider
+        self.model = model
+        self.started_at = time.perf_counter()
+        self.chunk_times = []
+        self.finished_at = None
+        self.output_chars = 0
+        self.output_tokens = None
+        self.error = None
+
+    @property
+    def time_to_first_token(self):
+        """Seconds from the request to the first chunk (None if no chunks)."""
+        if not self.chunk_times:
+            return None
+        return self.chunk_times[0] - self.started_at
+
+    @property
+    def duration(self):
+        """Seconds from the request to the end of the stream."""
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    @property
+    def gaps(self):
+        """Seconds between consecutive chunks."""
+        times = self.chunk_times
+        return [later - earlier for earlier, later in zip(times, times[1:])]
+
+    def gap_percentile(self, q):
+        """Return the q-th percentile of inter-chunk gaps."""
+        return percentile(self.gaps, q)
+
+    @property
+    def token_count(self):
+        """Output tokens: reported by the provider, else estimated from text."""
+        if self.output_tokens is not None:
+            return self.output_tokens
+        return self.output_chars // CHARS_PER_TOKEN
+
+    @property
+    def tokens_per_second(self):
+        """Output tokens per second while generating (after the first token)."""
+        if len(self.chunk_times) < 2:
+            return None
+        generating = self.chunk_times[-1] - self.chunk_times[0]
+        if generating <= 0:
+            return None
+        return self.token_count / generating
+
+    def as_dict(self):
+        """Return the headline numbers as a plain dict."""
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "time_to_first_token": self.time_to_first_token,
+            "duration": self.duration,
+            "chunks": len(self.chunk_times),
+            "output_tokens": self.token_count,
+            "tokens_per_second": self.tokens_per_second,
+            "gap_p50": self.gap_percentile(50),
+            "gap_p95": self.gap_percentile(95),
+            "gap_max": max(self.gaps, default=None),
+            "error": None if self.error is None else repr(self.error),
+        }
+
+
+class LatencyHistogram:
+    """Aggregate stream metrics per (provider, model).
+
+    Keeps the most recent max_samples values of each measurement, so memory
+    stays bounded in long-running services. Thread-safe.
+    """
+
+    def __init__(self, max_samples=10_000):
+        """Create an empty histogram.
+
+        Args:
+            max_samples: Samples kept per measurement and model
+
+        """
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, metrics):
+        """Add one stream's metrics."""
+        key = (metrics.provider, metrics.model)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = {
+                    name: deque(maxlen=self.max_samples)
+                    for name in ("ttft", "duration", "tokens_per_second", "gap")
+                }
+                self._samples[key] = samples
+            if metrics.time_to_first_token is not None:
+                samples["ttft"].append(metrics.time_to_first_token)
+            samples["duration"].append(metrics.duration)
+            if metrics.tokens_per_second is not None:
+                samples["tokens_per_second"].append(metrics.tokens_per_second)
+            samples["gap"].extend(metrics.gaps)
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """Summarize the recorded distributions.
+
+        Returns:
+            dict: {(provider, model): {measurement: {"count", "p50", ...}}}
+
+        """
+        with self._lock:
+            snapshot = {
+                key: {name: list(values) for name, values in samples.items()}
+                for key, samples in self._samples.items()
+            }
+        return {
+            key: {
+                name: {
+                    "count": len(values),
+                    **{f"p{q}": percentile(values, q) for q in percentiles},
+                }
+                for name, values in samples.items()
+            }
+            for key, samples in snapshot.items()
+        }
+
+
+def _finish(metrics, on_metrics, histogram):
+    """Close out a stream's metrics and hand them to the consumers."""
+    metrics.finished_at = time.perf_counter()
+    if histogram is not None:
+        histogram.record(metrics)
+    if on_metrics is not None:
+        on_metrics(metrics)
+
+
+def _usage_recorder(metrics, on_usage):
+    """Build an on_usage callback that stores the real output token count."""
+
+    def record_usage(usage):
+        metrics.output_tokens = usage["output_tokens"]
+        if on_usage is not None:
+            on_usage(usage)
+
+    return record_usage
+
+
+def create_instrumented_streaming_completion(
+    client,
+    provider,
+    model,
+    messages,
+    *,
+    on_metrics=None,
+    histogram=None,
+    on_usage=None,
+    **kwargs,
+):
+    """Stream a completion like create_streaming_completion(), with timings.
+
+    Args:
+        client: Authenticated client (OpenAI or Anthropic instance)
+        provider: Provider name ("openai" or "anthropic")
+        model: Model name (provider-specific)
+        messages: List of message dicts with "role" and "content"
+        on_metrics: Optional callback receiving the StreamMetrics when the
+                    stream ends (also called if it fails part-way)
+        histogram: Optional LatencyHistogram to aggregate into
+        on_usage: Optional usage callback, as for create_streaming_completion
+        **kwargs: Additional parameters for create_streaming_completion()
+
+    Yields:
+        str: Text chunks as they arrive
+
+    """
+    metrics = StreamMetrics(provider, model)
+    chunks = create_streaming_completion(
+        client,
+        provider,
+        model,
+        messages,
+        on_usage=_usage_recorder(metrics, on_usage),
+        **kwargs,
+    )
+    try:
+        for chunk in chunks:
+            metrics.chunk_times.append(time.perf_counter())
+            metrics.output_chars += len(chunk)
+            yield chunk
+    except Exception as error:
+        metrics.error = error
+        raise
+    finally:
+        _finish(metrics, on_metrics, histogram)
+
+
+async def acreate_instrumented_streaming_completion(
+    client,
+    provider,
+    model,
+    messages,
+    *,
+    on_metrics=None,
+    histogram=None,
+    on_usage=None,
+    **kwargs,
+):
+    """Async version of create_instrumented_streaming_completion()."""
+    metrics = StreamMetrics(provider, model)
+    chunks = acreate_streaming_completion(
+        client,
+        provider,
+        model,
+        messages,
+        on_usage=_usage_recorder(metrics, on_usage),
+        **kwargs,
+    )
+    try:
+        async for chunk in chunks:
+            metrics.chunk_times.append(time.perf_counter())
+            metrics.output_chars += len(chunk)
+            yield chunk
+    except Exception as error:
+        metrics.error = error
+        raise
+    finally:
+        _finish(metrics, on_metrics, histogram)
@@ -0,0 +1,415 @@
+"""Tool registry: Python functions as tools, with cached schemas.
+
+Writing JSON schemas by hand is tedious, and converting them for each
+provider on every request adds up with dozens of tools. A ToolRegistry
+derives each tool's schema once from the function's signature, type hints
+and docstring, builds the OpenAI and Anthropic payloads once, and decodes
+and validates the model's arguments with validators compiled at
+registration:
+
+    tools = ToolRegistry()
+
+    @tools.tool
+    def lookup_weather(city_name: str, units: Literal["C", "F"] = "C"):
+        \"\"\"Lookup the current weather for a city.
+
+        Args:
+            city_name: The city name
+            units: Temperature units
+
+        \"\"\"
+        ...
+
+    response = create_completion_with_tools(client, provider, model,
+                                            messages, tools)
+    for call in extract_tool_calls(response, provider):
+        kwargs = tools.parse_arguments(call["name"], call["arguments"])
+
+A registry can be passed anywhere a list of tool definitions is accepted,
+and to run_agent() without a separate functions dict.
+
+Supported parameter types: str, int, float, bool, list[...], dict,
+Literal[...], Enum subclasses and ``X | None``. Unannotated parameters are
+described as strings (or by the type of their default) and not checked.
+
+"""  # noqa: D214
+
+import enum
+import inspect
+import json
+import re
+import types
+import typing
+
+try:
+    # Rust JSON parser that ships with the openai and anthropic SDKs
+    from jiter import from_json as _jiter_from_json
+except ImportError:  # pragma: no cover
+    _jiter_from_json = None
+
+
+class ToolArgumentError(ValueError):
+    """Raised when a model's tool arguments do not match the tool's schema."""
+
+
+def loads(data, partial=False):
+    """Decode JSON with jiter when available, else the json module.
+
+    Args:
+        data: JSON text (str or bytes)
+        partial: Also accept truncated JSON, returning the complete values
+                 it contains (and ignoring trailing text). Needs jiter;
+                 with the json module only complete JSON is accepted.
+
+    Raises:
+        ValueError: If data is not valid JSON
+
+    """
+    if _jiter_from_json is None:
+        return json.loads(data)
+    if isinstance(data, str):
+        data = data.encode()
+    return _jiter_from_json(data, partial_mode=partial)
+
+
+# Schema and validator for each basic annotation
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+
+
+def _check_type(expected, type_name):
+    """Build a validator accepting instances of expected."""
+
+    def validate(value, path):
+        # bool is a subclass of int, but true is not a valid integer
+        if isinstance(value, bool) and expected is not bool:
+            raise ToolArgumentError(f"{path}: expected {type_name}, got boolean")
+        if not isinstance(value, expected):
+            raise ToolArgumentError(
+                f"{path}: expected {type_name}, got {type(value).__name__}"
+            )
+        return value
+
+    return validate
+
+
+def _validate_float(value, path):
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        raise ToolArgumentError(f"{path}: expected number, got {type(value).__name__}")
+    return float(value)
+
+
+def _passthrough(value, path):
+    return value
+
+
+def _compile(annotation):
+    """Return (json_schema, validator) for a type annotation.
+
+    The validator takes (value, path) and returns the decoded value, raising
+    ToolArgumentError if it does not match.
+    """
+    if annotation is inspect.Parameter.empty or annotation is typing.Any:
+        return {}, _passthrough
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin in (typing.Union, types.UnionType):
+        options = [arg for arg in args if arg is not type(None)]
+        schema, validate = (
+            _compile(options[0]) if len(options) == 1 else ({}, _passthrough)
+        )
+
+        def validate_optional(value, path):
+            return None if value is None else validate(value, path)
+
+        return schema, validate_optional
+
+    if origin is typing.Literal:
+        choices = list(args)
+
+        def validate_literal(value, path):
+            if value not in choices:
+                raise ToolArgumentError(f"{path}: expected one of {choices!r}")
+            return value
+
+        return {"enum": choices}, validate_literal
+
+    if inspect.isclass(annotation) and issubclass(annotation, enum.Enum):
+        members = {member.value: member for member in annotation}
+
+        def validate_enum(value, path):
+            try:
+                return members[value]
+            except (KeyError, TypeError):
+                raise ToolArgumentError(
+                    f"{path}: expected one of {list(members)!r}"
+                ) from None
+
+        return {"enum": list(members)}, validate_enum
+
+    if origin is list and args:
+        item_schema, validate_item = _compile(args[0])
+        check_list = _check_type(list, "array")
+
+        def validate_list(value, path):
+            check_list(value, path)
+            return [
+                validate_item(item, f"{path}[{index}]")
+                for index, item in enumerate(value)
+            ]
+
+        return {"type": "array", "items": item_schema}, validate_list
+
+    base = origin or annotation
+    if base is float:
+        return {"type": "number"}, _validate_float
+    if base in _JSON_TYPES:
+        type_name = _JSON_TYPES[base]
+        return {"type": type_name}, _check_type(base, type_name)
+
+    # Anything else (custom classes, TypedDicts, ...) is passed through as-is
+    return {}, _passthrough
+
+
+def _parse_docstring(docstring):
+    """Split a Google-style docstring into (description, {param: text})."""
+    docstring = inspect.cleandoc(docstring or "")
+    description = docstring.split("\n\n", 1)[0].replace("\n", " ").strip()
+
+    params = {}
+    match = re.search(r"^Args:\s*\n((?:[ \t]+.*\n?|\s*\n)*)", docstring, re.MULTILINE)
+    if match:
+        current = None
+        for line in match.group(1).splitlines():
+            entry = re.match(r"^\s{1,8}(\*{0,2}\w+)(?:\s*\(.*?\))?:\s*(.*)$", line)
+            if entry:
+                current = entry.group(1).lstrip("*")
+                params[current] = entry.group(2).strip()
+            elif current and line.strip():
+                params[current] = f"{params[current]} {line.strip()}"
+    return description, params
+
+
+class Tool:
+    """One registered function with its schema and argument validators."""
+
+    __slots__ = (
+        "name",
+        "function",
+        "description",
+        "parameters",
+        "_validators",
+        "_required",
+        "_accepts_any",
+    )
+
+    def __init__(self, function, name=None, description=None):
+        """Derive the schema and validators of a function.
+
+        Args:
+            function: The Python callable to expose
+            name: Tool name (defaults to the function name)
+            description: Tool description (defaults to the docstring summary)
+
+        """
+        doc_description, doc_params = _parse_docstring(function.__doc__)
+        self.name = name or function.__name__
+        self.function = function
+        self.description = description or doc_description
+
+        try:
+            hints = typing.get_type_hints(function)
+        except (NameError, TypeError):
+            hints = {}
+
+        properties = {}
+        required = []
+        self._validators = {}
+        self._accepts_any = False
+        for parameter in inspect.signature(function).parameters.values():
+            if parameter.kind is inspect.Parameter.VAR_KEYWORD:
+                self._accepts_any = True
+                continue
+            if parameter.kind is inspect.Parameter.VAR_POSITIONAL:
+                continue
+            annotation = hints.get(parameter.name, parameter.annotation)
+            schema, validate = _compile(annotation)
+            if not schema:
+                # Unannotated: describe it by its default's type, else as text
+                default = parameter.default
+                default_type = type(default) if default is not None else str
+                schema = {"type": _JSON_TYPES.get(default_type, "string")}
+            schema = dict(schema)
+            if parameter.name in doc_params:
+                schema["description"] = doc_params[parameter.name]
+            properties[parameter.name] = schema
+            self._validators[parameter.name] = validate
+            if parameter.default is inspect.Parameter.empty:
+                required.append(parameter.name)
+
+        self._required = tuple(required)
+        self.parameters = {
+            "type": "object",
+            "properties": properties,
+            "required": required,
+            "additionalProperties": self._accepts_any,
+        }
+
+    def openai_schema(self):
+        """Return the tool definition in OpenAI format."""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            },
+        }
+
+    def anthropic_schema(self):
+        """Return the tool definition in Anthropic format."""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "input_schema": self.parameters,
+        }
+
+    def parse_arguments(self, arguments):
+        """Decode and validate arguments from the model.
+
+        Args:
+            arguments: JSON string (OpenAI) or dict (Anthropic)
+
+        Returns:
+            dict: Keyword arguments with decoded values (e.g. Enum members)
+
+        Raises:
+            ToolArgumentError: If the arguments are not valid JSON or do not
+                               match the schema
+
+        """
+        if isinstance(arguments, str | bytes):
+            try:
+                arguments = loads(arguments or b"{}")
+            except ValueError as error:
+                raise ToolArgumentError(
+                    f"{self.name}: invalid JSON arguments: {error}"
+                ) from None
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError(f"{self.name}: arguments must be an object")
+
+        kwargs = {}
+        for key, value in arguments.items():
+            validate = self._validators.get(key)
+            if validate is None:
+                if not self._accepts_any:
+                    raise ToolArgumentError(f"{self.name}: unexpected argument {key!r}")
+                kwargs[key] = value
+            else:
+                kwargs[key] = validate(value, f"{self.name}.{key}")
+        for key in self._required:
+            if key not in kwargs:
+                raise ToolArgumentError(f"{self.name}: missing argument {key!r}")
+        return kwargs
+
+    def __call__(self, **kwargs):
+        """Call the underlying function."""
+        return self.function(**kwargs)
+
+
+class ToolRegistry:
+    """A set of tools with provider payloads built once and cached."""
+
+    def __init__(self, functions=()):
+        """Create a registry.
+
+        Args:
+            functions: Optional functions to register right away
+
+        """
+        self._tools = {}
+        self._payloads = {}
+        for function in functions:
+            self.register(function)
+
+    def register(self, function, name=None, description=None):
+        """Register a function as a tool and return the Tool."""
+        tool = Tool(function, name=name, description=description)
+        self._tools[tool.name] = tool
+        self._payloads.clear()
+        return tool
+
+    def tool(self, function=None, *, name=None, description=None):
+        """Register a function; usable as @registry.tool or @registry.tool(...).
+
+        Returns the function unchanged.
+        """
+
+        def decorator(function):
+            self.register(function, name=name, description=description)
+            return function
+
+        if function is None:
+            return decorator
+        return decorator(function)
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def __len__(self):
+        return len(self._tools)
+
+    def __iter__(self):
+        return iter(self._tools.values())
+
+    def __getitem__(self, name):
+        return self._tools[name]
+
+    def get(self, name):
+        """Return the Tool called name, or None."""
+        return self._tools.get(name)
+
+    @property
+    def functions(self):
+        """Dict of tool names to callables, as run_agent() expects."""
+        return {name: tool.function for name, tool in self._tools.items()}
+
+    def payload(self, provider):
+        """Return the tool definitions for a provider (built once, cached).
+
+        The returned list is shared; copy it before modifying it.
+        """
+        payload = self._payloads.get(provider)
+        if payload is None:
+            if provider == "openai":
+                payload = [tool.openai_schema() for tool in self._tools.values()]
+            elif provider == "anthropic":
+                payload = [tool.anthropic_schema() for tool in self._tools.values()]
+            else:
+                raise ValueError(f"Invalid provider: {provider}")
+            self._payloads[provider] = payload
+        return payload
+
+    def parse_arguments(self, name, arguments):
+        """Decode and validate a tool call's arguments (see Tool.parse_arguments).
+
+        Raises:
+            ToolArgumentError: If the tool is unknown or the arguments invalid
+
+        """
+        tool = self._tools.get(name)
+        if tool is None:
+            raise ToolArgumentError(f"Unknown tool: {name}")
+        return tool.parse_arguments(arguments)
+
+    def call(self, name, arguments):
+        """Validate a tool call's arguments and run the tool."""
+        return self._tools[name](**self.parse_arguments(name, arguments))
@@ -0,0 +1,189 @@
+"""Local ledger of per-call token usage, stored in DuckDB.
+
+Provider dashboards are slow to update and cannot be joined with your own
+job metadata. A UsageLedger records one row per completion (tokens, prompt
+cache activity, stop reason, latency, request ID) in a local DuckDB file
+that can be queried with SQL or exported to Parquet:
+
+    ledger = UsageLedger("data/usage.duckdb", job="translate-best-bets")
+    create_completion(client, provider, model, messages, ledger=ledger)
+    ledger.summary()  # tokens and calls by day, job and model
+
+Rows are buffered in memory and written in batches, so recording a call
+adds almost nothing to its latency. Call close() (or use the ledger as a
+context manager) to write the remaining rows.
+"""
+
+import threading
+from datetime import UTC, datetime
+
+import duckdb
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    recorded_at TIMESTAMP,
+    day DATE,
+    job VARCHAR,
+    provider VARCHAR,
+    model VARCHAR,
+    request_id VARCHAR,
+    response_id VARCHAR,
+    input_tokens BIGINT,
+    output_tokens BIGINT,
+    cache_read_tokens BIGINT,
+    cache_write_tokens BIGINT,
+    stop_reason VARCHAR,
+    latency_ms DOUBLE,
+    cached BOOLEAN
+)
+"""
+
+_COLUMNS = (
+    "recorded_at",
+    "day",
+    "job",
+    "provider",
+    "model",
+    "request_id",
+    "response_id",
+    "input_tokens",
+    "output_tokens",
+    "cache_read_tokens",
+    "cache_write_tokens",
+    "stop_reason",
+    "latency_ms",
+    "cached",
+)
+
+_GROUPABLE = {"day", "job", "provider", "model", "stop_reason", "cached"}
+
+
+class UsageLedger:
+    """Append-only DuckDB table of completion usage. Thread-safe."""
+
+    def __init__(self, path="data/usage.duckdb", job=None, flush_every=100):
+        """Open (or create) a ledger.
+
+        Args:
+            path: DuckDB database file (":memory:" for a temporary ledger)
+            job: Default job name stored with every row, used to group costs
+            flush_every: Number of buffered rows that triggers a write
+
+        """
+        self.path = str(path)
+        self.job = job
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._rows = []
+        self._conn = duckdb.connect(self.path)
+        self._conn.execute(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, result, job=None):
+        """Buffer one CompletionResult for writing.
+
+        Args:
+            result: CompletionResult from an adapter
+            job: Optional job name overriding the ledger default
+
+        """
+        now = datetime.now(UTC).replace(tzinfo=None)
+        row = (
+            now,
+            now.date(),
+            job or self.job,
+            result.provider,
+            result.model,
+            result.request_id,
+            result.response_id,
+            result.input_tokens,
+            result.output_tokens,
+            result.cache_read_tokens,
+            result.cache_write_tokens,
+            result.stop_reason,
+            None if result.latency is None else result.latency * 1000,
+            result.cached,
+        )
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        """Write buffered rows to the database."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        """Write buffered rows (caller must hold the lock)."""
+        if not self._rows:
+            return
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        self._conn.executemany(
+            f"INSERT INTO usage ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+            self._rows,
+        )
+        self._rows = []
+
+    def query(self, sql, params=None):
+        """Run SQL against the ledger (the table is called "usage").
+
+        Returns:
+            pandas.DataFrame: The query result
+
+        """
+        with self._lock:
+            self._flush()
+            return self._conn.execute(sql, params or []).df()
+
+    def summary(self, group_by=("day", "job", "model")):
+        """Total calls, tokens and latency grouped by the given columns.
+
+        Args:
+            group_by: Columns to group by; any of day, job, provider, model,
+                      stop_reason and cached
+
+        Returns:
+            pandas.DataFrame: One row per group
+
+        """
+        unknown = set(group_by) - _GROUPABLE
+        if unknown:
+            raise ValueError(f"Cannot group by: {', '.join(sorted(unknown))}")
+        columns = ", ".join(group_by)
+        return self.query(
+            f"""
+            SELECT {columns},
+                   COUNT(*) AS calls,
+                   SUM(input_tokens) AS input_tokens,
+                   SUM(output_tokens) AS output_tokens,
+                   SUM(cache_read_tokens) AS cache_read_tokens,
+                   SUM(cache_write_tokens) AS cache_write_tokens,
+                   SUM(CASE WHEN stop_reason IN ('length', 'max_tokens')
+                       THEN 1 ELSE 0 END) AS truncated,
+                   MEDIAN(latency_ms) AS median_latency_ms
+            FROM usage
+            GROUP BY {columns}
+            ORDER BY {columns}
+            """
+        )
+
+    def export_parquet(self, path):
+        """Write the whole ledger to a Parquet file."""
+        with self._lock:
+            self._flush()
+            self._conn.execute(
+                "COPY usage TO ? (FORMAT parquet)",
+                [str(path)],
+            )
+
+    def close(self):
+        """Write buffered rows and close the database."""
+        with self._lock:
+            self._flush()
+            self._conn.close()
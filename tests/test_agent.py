@@ -0,0 +1,55 @@
+"""Tool execution in the agent loop."""
+
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.agent import _arun_tool, _execute, _ToolRun
+
+
+def slow_tool(seconds):
+    """Sleep, then report how long."""
+    time.sleep(seconds)
+    return seconds
+
+
+async def add(a, b):
+    """Add two numbers."""
+    return a + b
+
+
+class ToolExecutionTest(unittest.TestCase):
+    """Timeouts and errors of tool calls."""
+
+    def test_queued_calls_do_not_use_up_their_timeout(self):
+        """A call waiting for a worker is timed from when it starts."""
+        run = _ToolRun([], {"slow": slow_tool}, 0.3, None, False)
+        jobs = {key: ("slow", {"seconds": 0.2}) for key in ("a", "b")}
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            outcomes = _execute(run, executor, jobs)
+        self.assertFalse(outcomes["a"]["is_error"])
+        self.assertFalse(outcomes["b"]["is_error"])
+
+    def test_slow_call_times_out(self):
+        """A call running longer than its timeout is reported as an error."""
+        run = _ToolRun([], {"slow": slow_tool}, 0.05, None, False)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            outcomes = _execute(run, executor, {"a": ("slow", {"seconds": 0.2})})
+        self.assertTrue(outcomes["a"]["is_error"])
+        self.assertIn("timed out", outcomes["a"]["content"])
+
+    def test_async_tool_with_bad_arguments(self):
+        """Bad arguments to an async tool come back as an error result."""
+        run = _ToolRun([], {"add": add}, 1.0, None, False)
+
+        async def main():
+            return await _arun_tool(run, asyncio.Semaphore(1), "add", {"a": 1})
+
+        outcome = asyncio.run(main())
+        self.assertTrue(outcome["is_error"])
+        self.assertIn("TypeError", outcome["content"])
+
+
+if __name__ == "__main__":
+    unittest.main()
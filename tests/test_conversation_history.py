@@ -0,0 +1,68 @@
+"""Compaction and summarization in ConversationHistory."""
+
+import unittest
+
+from src.conversation_history import ConversationHistory, starts_turn
+
+
+class CompactionTest(unittest.TestCase):
+    """Dropping old turns to stay within the token budget."""
+
+    def test_never_starts_at_a_tool_result(self):
+        """A tool result cut off from its call is dropped with its turn."""
+        history = ConversationHistory(max_tokens=60)
+        history.add("user", "q" * 40)
+        history.add("assistant", [{"type": "tool_use", "id": "1", "name": "f"}])
+        history.add(
+            "user", [{"type": "tool_result", "tool_use_id": "1", "content": "x" * 200}]
+        )
+        history.add("assistant", "a" * 100)
+        history.add("user", "next")
+        self.assertEqual(history.messages, [{"role": "user", "content": "next"}])
+
+    def test_starts_turn(self):
+        """Text user messages start a turn; tool results do not."""
+        self.assertTrue(starts_turn({"role": "user", "content": "hi"}))
+        self.assertTrue(
+            starts_turn({"role": "user", "content": [{"type": "text", "text": "hi"}]})
+        )
+        self.assertFalse(starts_turn({"role": "assistant", "content": "hi"}))
+        self.assertFalse(
+            starts_turn(
+                {"role": "user", "content": [{"type": "tool_result", "content": ""}]}
+            )
+        )
+
+
+class SummarizationTest(unittest.TestCase):
+    """Folding dropped turns into a running summary."""
+
+    def test_failed_summary_is_reported_and_retried(self):
+        """A failure is raised once and its turns are summarized later."""
+        calls = []
+
+        def summarize(previous, messages):
+            calls.append([message["content"] for message in messages])
+            if len(calls) == 1:
+                raise RuntimeError("summarizer down")
+            return "summary"
+
+        history = ConversationHistory(max_tokens=40, summarize=summarize)
+        history.add("user", "first " * 20)
+        history.add("user", "second " * 20)
+        history.wait()
+        with self.assertRaises(RuntimeError):
+            history.messages
+        self.assertIsNone(history.summary)
+
+        history.add("user", "third " * 20)
+        history.wait()
+        history.close()
+        self.assertEqual(history.summary, "summary")
+        # The turn from the failed attempt was summarized on the retry
+        self.assertEqual(calls[1][0], calls[0][0])
+        self.assertEqual(len(calls[1]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Request handling in the OpenAI-compatible gateway."""
+
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from src.gateway import Gateway
+from src.router import Router
+
+
+async def fake_stream(client, provider, model, messages, *, on_usage, on_stop, **kw):
+    """Stream two chunks, then report usage and a max_tokens stop."""
+    yield "hel"
+    yield "lo"
+    if on_usage is not None:
+        on_usage({"input_tokens": 3, "output_tokens": 2})
+    on_stop("max_tokens")
+
+
+async def request(gateway, body):
+    """POST body to the gateway; return (status, response body text)."""
+    reader, writer = await asyncio.open_connection(gateway.host, gateway.port)
+    data = json.dumps(body).encode()
+    writer.write(
+        b"POST /v1/chat/completions HTTP/1.1\r\nHost: test\r\n"
+        b"Connection: close\r\nContent-Type: application/json\r\n"
+        b"Content-Length: %d\r\n\r\n%s" % (len(data), data)
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload.decode()
+
+
+def serve_and_request(body, **kwargs):
+    """Start a gateway on a free port and send it one request."""
+
+    async def main():
+        gateway = Gateway(
+            port=0, clients={"openai": object(), "anthropic": object()}, **kwargs
+        )
+        await gateway.start()
+        try:
+            return await request(gateway, body)
+        finally:
+            await gateway.stop()
+
+    return asyncio.run(main())
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class GatewayTest(unittest.TestCase):
+    """Validation, errors and streaming of /v1/chat/completions."""
+
+    def test_unsupported_fields_are_rejected(self):
+        """Fields the adapters cannot honor get a 400 naming them."""
+        status, payload = serve_and_request(
+            {"model": "gpt-4o-mini", "messages": MESSAGES, "tools": [{}]}
+        )
+        self.assertEqual(status, 400)
+        self.assertIn("tools", payload)
+
+    def test_malformed_messages_are_rejected(self):
+        """Messages of the wrong shape get a 400, not an upstream error."""
+        status, payload = serve_and_request(
+            {"model": "gpt-4o-mini", "messages": ["hi"]}
+        )
+        self.assertEqual(status, 400)
+        self.assertIn("messages[0]", payload)
+
+    def test_router_alias_without_routes(self):
+        """An alias with no configured provider gets a 503."""
+        router = Router({"fast": {"openai": "gpt-4o-mini"}}, clients={})
+        status, _ = serve_and_request(
+            {"model": "fast", "messages": MESSAGES, "stream": True}, router=router
+        )
+        self.assertEqual(status, 503)
+
+    def test_unexpected_errors_get_a_500(self):
+        """A bug in the gateway still answers the client."""
+        with mock.patch("src.gateway._validate_messages", side_effect=KeyError):
+            status, payload = serve_and_request(
+                {"model": "gpt-4o-mini", "messages": MESSAGES}
+            )
+        self.assertEqual(status, 500)
+        self.assertIn("server_error", payload)
+
+    def test_stream_reports_stop_reason_and_usage(self):
+        """The last chunk carries the finish reason; usage has no choices."""
+        with mock.patch("src.gateway.acreate_streaming_completion", fake_stream):
+            status, payload = serve_and_request(
+                {
+                    "model": "claude-haiku-4-5",
+                    "messages": MESSAGES,
+                    "stream": True,
+                    "stream_options": {"include_usage": True},
+                }
+            )
+        self.assertEqual(status, 200)
+        events = [
+            json.loads(line.removeprefix("data: "))
+            for line in payload.splitlines()
+            if line.startswith("data: {")
+        ]
+        self.assertEqual(events[-2]["choices"][0]["finish_reason"], "length")
+        self.assertEqual(events[-1]["choices"], [])
+        self.assertEqual(events[-1]["usage"]["total_tokens"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Parallel completions with create_completions_batch()."""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from src.llm_client import create_completions_batch
+
+
+class CompletionsBatchTest(unittest.TestCase):
+    """Bounded parallel completions."""
+
+    def test_closing_early_cancels_queued_requests(self):
+        """Requests still queued when the consumer stops are never sent."""
+        calls = []
+        lock = threading.Lock()
+
+        def create_completion(client, provider, model, messages, **kwargs):
+            with lock:
+                calls.append(messages)
+            time.sleep(0.01)
+            return "answer"
+
+        with mock.patch("src.llm_client.create_completion", create_completion):
+            results = create_completions_batch(
+                None, "openai", "model", ([] for _ in range(40)), max_concurrency=2
+            )
+            next(results)
+            results.close()
+            time.sleep(0.05)
+        # At most the requests running when the consumer stopped
+        self.assertLessEqual(len(calls), 4)
+
+    def test_errors_are_captured_per_item(self):
+        """A failed request does not stop the rest of the batch."""
+
+        def create_completion(client, provider, model, messages, **kwargs):
+            if messages == ["bad"]:
+                raise ValueError("bad request")
+            return "answer"
+
+        with mock.patch("src.llm_client.create_completion", create_completion):
+            results = list(
+                create_completions_batch(
+                    None, "openai", "model", [["ok"], ["bad"], ["ok"]]
+                )
+            )
+        responses = [result["response"] for result in results]
+        self.assertEqual(responses, ["answer", None, "answer"])
+        self.assertIsInstance(results[1]["error"], ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
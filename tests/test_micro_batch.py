@@ -0,0 +1,77 @@
+"""Parsing packed replies and packing items into batches."""
+
+import importlib.util
+import unittest
+
+from src.micro_batch import pack_items, parse_packed_response
+
+
+def check_label(label):
+    """Accept only the known sentiment labels."""
+    if label not in {"positive", "negative", "neutral"}:
+        raise ValueError(f"Unknown label: {label!r}")
+    return label
+
+
+class ParsePackedResponseTest(unittest.TestCase):
+    """Splitting a reply back into per-item results."""
+
+    def test_plain_array(self):
+        """Each entry's result is returned under its id."""
+        text = '[{"id": 0, "result": "a"}, {"id": 1, "result": "b"}]'
+        self.assertEqual(parse_packed_response(text, 2), {0: "a", 1: "b"})
+
+    def test_code_fence(self):
+        """A fenced code block around the array is ignored."""
+        text = '```json\n[{"id": 0, "result": "a"}]\n```'
+        self.assertEqual(parse_packed_response(text, 1), {0: "a"})
+
+    def test_prose_with_brackets_before_the_array(self):
+        """A bracket in leading prose does not hide the array."""
+        text = 'Here are the labels [JSON]:\n[{"id": 0, "result": "a"}]'
+        self.assertEqual(parse_packed_response(text, 1), {0: "a"})
+
+    @unittest.skipIf(
+        importlib.util.find_spec("jiter") is None, "partial JSON needs jiter"
+    )
+    def test_truncated_reply_keeps_complete_entries(self):
+        """The incomplete last entry of a cut-off reply is dropped."""
+        text = '[{"id": 0, "result": "a"}, {"id": 1, "result": "b"}, {"id": 2, "res'
+        self.assertEqual(parse_packed_response(text, 3), {0: "a", 1: "b"})
+
+    def test_invalid_ids_are_skipped(self):
+        """Ids out of range, repeated or not integers are ignored."""
+        text = (
+            '[{"id": 0, "result": "a"}, {"id": 0, "result": "x"},'
+            ' {"id": 5, "result": "y"}, {"id": true, "result": "z"}]'
+        )
+        self.assertEqual(parse_packed_response(text, 2), {0: "a"})
+
+    def test_validate_rejects_results(self):
+        """A result the validator rejects is left out."""
+        text = '[{"id": 0, "result": "positive"}, {"id": 1, "result": "happy"}]'
+        self.assertEqual(
+            parse_packed_response(text, 2, validate=check_label), {0: "positive"}
+        )
+
+    def test_no_array(self):
+        """A reply without an array yields no results."""
+        self.assertEqual(parse_packed_response("Sorry, I can't help.", 1), {})
+
+
+class PackItemsTest(unittest.TestCase):
+    """Grouping items into batches."""
+
+    def test_respects_max_items(self):
+        """No batch holds more than max_items items."""
+        texts = [(index, "short") for index in range(5)]
+        self.assertEqual(pack_items(texts, max_items=2), [[0, 1], [2, 3], [4]])
+
+    def test_large_item_gets_its_own_batch(self):
+        """An item over the input budget travels alone."""
+        texts = [(0, "short"), (1, "x" * 10_000), (2, "short")]
+        self.assertEqual(pack_items(texts, max_input_tokens=100), [[0], [1], [2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Eviction and expiry in ResponseCache."""
+
+import time
+import unittest
+
+from src.response_cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """Size and age limits of the response cache."""
+
+    def test_hit_and_miss(self):
+        """A stored value is returned, and hits and misses are counted."""
+        cache = ResponseCache(":memory:")
+        cache.set("a", "answer")
+        self.assertEqual(cache.get("a"), "answer")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        """Beyond max_entries, the least recently used entries go first."""
+        cache = ResponseCache(":memory:", max_entries=3)
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+            time.sleep(0.001)
+        cache.get("a")
+        time.sleep(0.001)
+        cache.set("d", "d")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("a"), "a")
+        self.assertEqual(cache.get("d"), "d")
+        self.assertIsNone(cache.get("b"))
+
+    def test_single_entry_cache_keeps_latest(self):
+        """With max_entries=1 the value just written is kept."""
+        cache = ResponseCache(":memory:", max_entries=1)
+        cache.set("a", "first")
+        cache.set("b", "second")
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get("b"), "second")
+
+    def test_expired_entry_is_removed(self):
+        """An entry older than max_age is a miss and is deleted."""
+        cache = ResponseCache(":memory:", max_age=0.01)
+        cache.set("a", "answer")
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
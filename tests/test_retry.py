@@ -0,0 +1,124 @@
+"""Circuit breaker transitions and retries in RetryPolicy."""
+
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from src.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class ServiceUnavailable(Exception):
+    """Stand-in for a provider's 503 error."""
+
+    status_code = 503
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    """Closed, open and half-open states of CircuitBreaker."""
+
+    def test_opens_after_consecutive_failures(self):
+        """The circuit opens at failure_threshold and rejects calls."""
+        breaker = CircuitBreaker(failure_threshold=2, recovery_time=60)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.available())
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_success_resets_failure_count(self):
+        """Failures must be consecutive to open the circuit."""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_half_open_allows_one_trial(self):
+        """After recovery_time one trial call is let through."""
+        breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        self.assertTrue(breaker.available())
+        breaker.before_call()
+        self.assertEqual(breaker.state, "half_open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self):
+        """A failed trial call opens the circuit again."""
+        breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_cancelled_trial_frees_the_slot(self):
+        """A cancelled trial call lets the next call be the trial."""
+        breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        breaker.before_call()
+        breaker.record_cancelled()
+        breaker.before_call()
+        self.assertEqual(breaker.state, "half_open")
+
+
+class RetryPolicyTest(unittest.TestCase):
+    """Retries and breaker bookkeeping in RetryPolicy."""
+
+    def test_retries_transient_errors(self):
+        """A transient error is retried until the call succeeds."""
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ServiceUnavailable("unavailable")
+            return "ok"
+
+        policy = RetryPolicy(base_delay=0, use_circuit_breaker=False)
+        self.assertEqual(policy.call("test", flaky), "ok")
+        self.assertEqual(policy.stats["retries"], 2)
+
+    def test_does_not_retry_other_errors(self):
+        """A non-transient error is raised at once."""
+        attempts = []
+
+        def broken():
+            attempts.append(1)
+            raise ValueError("bad request")
+
+        policy = RetryPolicy(base_delay=0, use_circuit_breaker=False)
+        with self.assertRaises(ValueError):
+            policy.call("test", broken)
+        self.assertEqual(len(attempts), 1)
+
+    def test_cancelled_call_releases_the_trial_slot(self):
+        """A cancelled half-open trial does not leave the breaker stuck."""
+        policy = RetryPolicy()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+
+        async def slow():
+            await asyncio.sleep(10)
+
+        async def main():
+            with self.assertRaises(TimeoutError):
+                await asyncio.wait_for(policy.acall("test-cancel", slow), 0.01)
+
+        with mock.patch.dict("src.retry._breakers", {"test-cancel": breaker}):
+            asyncio.run(main())
+        self.assertTrue(breaker.available())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Failover and failback of Router between providers."""
+
+import time
+import unittest
+from unittest import mock
+
+from src.router import Router
+
+
+class ServiceUnavailable(Exception):
+    """Stand-in for a provider's 503 error."""
+
+    status_code = 503
+
+
+class FailbackTest(unittest.TestCase):
+    """Routes that degrade and then recover."""
+
+    def test_primary_wins_traffic_back_after_recovering(self):
+        """A failed primary gets a trial call and takes traffic back."""
+        router = Router(
+            {"fast": {"openai": "primary", "anthropic": "backup"}},
+            clients={"openai": object(), "anthropic": object()},
+            failure_threshold=1,
+            recovery_time=0.05,
+        )
+        primary, backup = router.routes["fast"]
+        primary.latency = 0.1
+        backup.latency = 0.5
+        primary_down = True
+
+        def create_completion(client, provider, model, messages, **kwargs):
+            if model == "primary" and primary_down:
+                raise ServiceUnavailable("unavailable")
+            return model
+
+        with mock.patch("src.router.create_completion", create_completion):
+            # The primary fails and the request fails over to the backup
+            self.assertEqual(router.create_completion([], model="fast"), "backup")
+            self.assertEqual(primary.breaker.state, "open")
+            self.assertEqual(router.ranked_routes("fast")[0], backup)
+            self.assertEqual(router.create_completion([], model="fast"), "backup")
+
+            # After the cool-down the recovered primary gets a trial call
+            primary_down = False
+            time.sleep(0.06)
+            self.assertEqual(router.ranked_routes("fast")[0], primary)
+            self.assertEqual(router.create_completion([], model="fast"), "primary")
+            self.assertEqual(primary.breaker.state, "closed")
+            self.assertEqual(primary.error_rate, 0.0)
+            self.assertEqual(router.create_completion([], model="fast"), "primary")
+
+    def test_error_rate_decays_without_calls(self):
+        """The error rate halves every recovery_time."""
+        router = Router(
+            {"fast": {"openai": "primary"}},
+            clients={"openai": object()},
+            recovery_time=0.05,
+        )
+        (route,) = router.routes["fast"]
+        for _ in range(3):
+            route.record_failure()
+        rate = route.error_rate
+        time.sleep(0.05)
+        self.assertLess(route.error_rate, rate * 0.6)
+
+
+if __name__ == "__main__":
+    unittest.main()